@@ -0,0 +1,108 @@
+"""Benchmark sensor frame ingestion and the aggregator's window write.
+
+Usage::
+
+    python benchmarks/bench_ingest.py [--sensors 8] [--frames 2000] [--devices 40]
+
+Starts an aggregator on a local Unix socket, runs ``--sensors`` simulated
+sensors that each send ``--frames`` frames of ``--devices`` devices (half of
+them also seen by the neighbouring sensor) as fast as they can, and reports
+frames/sec. The merged window is then written through a ``PresenceTracker``.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fablab_visitor_logger import ingest  # noqa: E402
+from fablab_visitor_logger.config import Config  # noqa: E402
+from fablab_visitor_logger.database import Database  # noqa: E402
+from fablab_visitor_logger.scanner import PresenceTracker  # noqa: E402
+
+
+def sensor_frames(sensor: int, frames: int, devices: int):
+    rng = random.Random(sensor)
+    # Devices overlap with the next sensor's, as in neighbouring rooms
+    macs = [
+        f"02:00:00:00:{(sensor * devices // 2 + i) // 256:02X}:"
+        f"{(sensor * devices // 2 + i) % 256:02X}"
+        for i in range(devices)
+    ]
+    now = time.time()
+    return [
+        ingest.encode_frame(
+            f"sensor-{sensor}",
+            now + n,
+            [
+                {
+                    "mac_address": mac,
+                    "rssi": rng.randint(-95, -40),
+                    "tx_power": None,
+                    "manufacturer_data": {0x004C: "1005031c0e3d5a"},
+                }
+                for mac in macs
+            ],
+        )
+        for n in range(frames)
+    ]
+
+
+async def run(args, tmp: str) -> None:
+    aggregator = ingest.Aggregator(f"unix:{os.path.join(tmp, 'ingest.sock')}")
+    await aggregator.start()
+    payloads = [
+        sensor_frames(s, args.frames, args.devices) for s in range(args.sensors)
+    ]
+    frame_bytes = sum(len(f) for frames in payloads for f in frames)
+
+    async def sensor(frames):
+        client = ingest.SensorClient(aggregator.address, "bench")
+        for frame in frames:
+            await client.send(frame)
+        await client.close()
+
+    total = args.sensors * args.frames
+    t0 = time.perf_counter()
+    await asyncio.gather(*(sensor(frames) for frames in payloads))
+    while aggregator.frames < total:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{total} frames from {args.sensors} sensors in {elapsed:.2f}s: "
+        f"{total / elapsed:,.0f} frames/s, "
+        f"{total * args.devices / elapsed:,.0f} sightings/s, "
+        f"{frame_bytes / total:.0f} bytes/frame"
+    )
+
+    tracker = PresenceTracker(aggregator, Database())
+    t0 = time.perf_counter()
+    with patch.object(Config, "SCAN_INTERVAL", 0):
+        seen = await tracker.update_presence()
+    print(f"Wrote window of {seen} devices in {time.perf_counter() - t0:.3f}s")
+    await aggregator.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sensors", type=int, default=8)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--devices", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.object(Config, "DATABASE_PATH", os.path.join(tmp, "bench.db")):
+            with patch.object(
+                Config, "PSEUDONYM_KEY_FILE", os.path.join(tmp, "bench.key")
+            ):
+                asyncio.run(run(args, tmp))
+
+
+if __name__ == "__main__":
+    main()
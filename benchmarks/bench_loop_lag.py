@@ -0,0 +1,107 @@
+"""Benchmark event loop lag while the tracker writes a large scan.
+
+Usage::
+
+    python benchmarks/bench_loop_lag.py [--devices 5000] [--cycles 10]
+
+Runs ``--cycles`` scan cycles of ``--devices`` devices (a tenth of them
+replaced every cycle, so devices also go absent and depart) followed by the
+per-cycle retention cleanup, once with the Database called inline on the
+event loop and once through an AsyncDatabase. A timer task meanwhile asks to
+wake up every 5ms; the lag is how late it actually runs, which is how long
+signal handlers, the metrics endpoint and the API would have to wait.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fablab_visitor_logger import asyncdb  # noqa: E402
+from fablab_visitor_logger.config import Config  # noqa: E402
+from fablab_visitor_logger.database import Database  # noqa: E402
+from fablab_visitor_logger.scanner import PresenceTracker  # noqa: E402
+
+TICK = 0.005
+
+
+class SyntheticScanner:
+    """Returns ``devices`` devices per scan, rotating a tenth of them."""
+
+    def __init__(self, devices: int) -> None:
+        self.devices = devices
+        self.cycle = 0
+
+    async def scan(self):
+        self.cycle += 1
+        first = self.cycle * self.devices // 10
+        return [
+            {
+                "mac_address": f"02:00:00:{n // 65536 % 256:02X}:"
+                f"{n // 256 % 256:02X}:{n % 256:02X}",
+                "rssi": -40 - n % 50,
+                "vendor": "Apple",
+                "manufacturer_data": {0x004C: "1005031c0e3d5a"},
+            }
+            for n in range(first, first + self.devices)
+        ]
+
+
+async def measure(db, args) -> None:
+    lags = []
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + TICK
+            await asyncio.sleep(TICK)
+            lags.append(loop.time() - expected)
+
+    tracker = PresenceTracker(SyntheticScanner(args.devices), db)
+    task = asyncio.ensure_future(ticker())
+    t0 = time.perf_counter()
+    for _ in range(args.cycles):
+        await tracker.update_presence()
+        await asyncdb.call(db, "cleanup_old_data")
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - t0
+    task.cancel()
+    lags.sort()
+    name = type(db).__name__
+    print(
+        f"{name:>13}: {elapsed / args.cycles * 1000:6.0f} ms/cycle, "
+        f"loop lag p50 {lags[len(lags) // 2] * 1000:5.1f} ms, "
+        f"p99 {lags[int(len(lags) * 0.99)] * 1000:6.1f} ms, "
+        f"max {lags[-1] * 1000:6.1f} ms"
+    )
+
+
+async def run(args, tmp: str) -> None:
+    with patch.object(Config, "DATABASE_PATH", os.path.join(tmp, "inline.db")):
+        await measure(Database(), args)
+    with patch.object(Config, "DATABASE_PATH", os.path.join(tmp, "async.db")):
+        db = asyncdb.AsyncDatabase(Database)
+        try:
+            await measure(db, args)
+        finally:
+            await db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--cycles", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.object(Config, "PSEUDONYM_KEY_FILE", os.path.join(tmp, "bench.key")):
+            asyncio.run(run(args, tmp))
+
+
+if __name__ == "__main__":
+    main()
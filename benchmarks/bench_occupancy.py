@@ -0,0 +1,102 @@
+"""Benchmark occupancy analytics over a synthetic 90 day x 300 device history.
+
+Usage::
+
+    python benchmarks/bench_occupancy.py [--days 90] [--devices 300]
+
+Each device visits on roughly a third of the days for one to four hours and
+is sampled every ``SCAN_INTERVAL`` seconds while present, like the tracker.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fablab_visitor_logger.config import Config  # noqa: E402
+from fablab_visitor_logger.reporting import Reporter  # noqa: E402
+
+
+def populate(reporter: Reporter, start: datetime, days: int, devices: int) -> int:
+    rng = np.random.default_rng(42)
+    conn = reporter.db.conn
+    with conn:
+        conn.executemany(
+            "INSERT INTO devices VALUES (?, ?, ?, ?, 'present')",
+            [(f"device{d:03d}", f"anon{d:03d}", start, start) for d in range(devices)],
+        )
+    rows = 0
+    for day in range(days):
+        day_start = start + timedelta(days=day)
+        visitors = np.flatnonzero(rng.random(devices) < 0.33)
+        arrivals = rng.integers(8 * 3600, 18 * 3600, len(visitors))
+        lengths = rng.integers(3600, 4 * 3600, len(visitors))
+        batch = []
+        for device, arrival, length in zip(visitors, arrivals, lengths):
+            for offset in range(
+                int(arrival), int(arrival + length), Config.SCAN_INTERVAL
+            ):
+                batch.append(
+                    (
+                        f"device{device:03d}",
+                        day_start + timedelta(seconds=offset),
+                        "present",
+                        -60,
+                    )
+                )
+        with conn:
+            conn.executemany(
+                "INSERT INTO presence_logs (device_id, timestamp, status, rssi) "
+                "VALUES (?, ?, ?, ?)",
+                batch,
+            )
+        rows += len(batch)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--devices", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.object(Config, "DATABASE_PATH", os.path.join(tmp, "bench.db")):
+            reporter = Reporter()
+            start = datetime(2025, 1, 6)
+            end = start + timedelta(days=args.days)
+
+            t0 = time.perf_counter()
+            rows = populate(reporter, start, args.days, args.devices)
+            print(f"Inserted {rows} samples in {time.perf_counter() - t0:.1f}s")
+
+            t0 = time.perf_counter()
+            reporter._presence_samples(start, end)
+            fetch = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            series = reporter.occupancy_series(start, end, timedelta(minutes=15))
+            total = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            heatmap = reporter.occupancy_heatmap(start, end)
+            heatmap_time = time.perf_counter() - t0
+
+    print(f"Fetch samples:           {fetch:.2f}s")
+    print(f"occupancy_series (15m):  {total:.2f}s ({len(series.mean)} buckets)")
+    print(f"  of which analytics:    {total - fetch:.2f}s")
+    print(f"occupancy_heatmap:       {heatmap_time:.2f}s")
+    print(f"Peak occupancy:          {series.peak.max()}")
+    weekday, hour = np.unravel_index(np.nanargmax(heatmap), heatmap.shape)
+    print(f"Busiest hour:            weekday {weekday} (Mon=0), {hour}:00")
+
+
+if __name__ == "__main__":
+    main()
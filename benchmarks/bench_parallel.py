@@ -0,0 +1,59 @@
+"""Benchmark sharded multi-process reports against a single-process run.
+
+Usage::
+
+    python benchmarks/bench_parallel.py [--days 365] [--devices 100] [--workers 4]
+
+Builds a synthetic history (see bench_occupancy.py) and times
+``parallel.range_report`` with one worker and with ``--workers`` workers.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_occupancy import populate  # noqa: E402
+
+from fablab_visitor_logger import parallel  # noqa: E402
+from fablab_visitor_logger.config import Config  # noqa: E402
+from fablab_visitor_logger.reporting import Reporter  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.object(Config, "DATABASE_PATH", os.path.join(tmp, "bench.db")):
+            start = datetime(2025, 1, 6)
+            end = start + timedelta(days=args.days)
+
+            t0 = time.perf_counter()
+            rows = populate(Reporter(), start, args.days, args.devices)
+            print(f"Inserted {rows} samples in {time.perf_counter() - t0:.1f}s")
+
+            timings = {}
+            for workers in (1, args.workers):
+                t0 = time.perf_counter()
+                report = parallel.range_report(start, end, workers=workers)
+                timings[workers] = time.perf_counter() - t0
+                print(
+                    f"{workers} worker(s): {timings[workers]:.2f}s "
+                    f"({report.shards} shards, {report.visits} visits, "
+                    f"~{report.distinct_devices} devices)"
+                )
+
+    print(f"Speedup: {timings[1] / timings[args.workers]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Vectorized occupancy analytics over presence samples.
+
+The tracker logs a ``present`` row for every device on every scan it is seen
+in. Consecutive samples of one device no further apart than
+``max_gap`` seconds form a visit session covering ``[first, last + interval)``.
+Concurrent occupancy is computed with an event sweep: session arrivals (+1)
+and departures (-1) are sorted together with the bucket edges and
+accumulated with ``cumsum``, giving the occupancy level on every segment
+between two events. All steps run on NumPy arrays; NumPy is imported
+lazily so other report commands don't pay for it.
+
+Timestamps are the naive local times stored in the database converted to
+epoch seconds as if they were UTC, so ``seconds // 3600 % 24`` is the local
+wall-clock hour.
+"""
+
+import calendar
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Tuple
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 was a Thursday; shift so that Monday is weekday 0
+EPOCH_WEEKDAY = 3
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+class OccupancySeries(NamedTuple):
+    """Occupancy per time bucket (arrays of equal length)."""
+
+    bucket_starts: Any  # int64 epoch seconds of each bucket start
+    mean: Any  # float64 time-weighted mean number of devices present
+    peak: Any  # int64 highest number of devices present at once
+    bucket_seconds: int
+
+
+def to_epoch(value: datetime) -> int:
+    """Naive datetime to epoch seconds, matching SQLite's strftime('%s')."""
+    return calendar.timegm(value.timetuple())
+
+
+def from_epoch(seconds: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(seconds=int(seconds))
+
+
+def sessions_from_samples(
+    device_codes: Any,
+    timestamps: Any,
+    max_gap: int,
+    interval: int,
+    covers: Any = None,
+) -> Tuple[Any, Any]:
+    """Merge per-device presence samples into (arrivals, departures).
+
+    Args:
+        device_codes: Integer device code of every sample.
+        timestamps: Epoch seconds of every sample.
+        max_gap: Largest distance between samples of one session.
+        interval: Time covered by the last sample of a session.
+        covers: Seconds covered by every sample, for summaries of several
+            scans; defaults to ``interval``. A session continues while the
+            next sample starts at most ``max_gap - interval`` after the end
+            of the previous one.
+    """
+    import numpy as np
+
+    if len(timestamps) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    order = np.lexsort((timestamps, device_codes))
+    devices = device_codes[order]
+    times = timestamps[order]
+    ends = times + (interval if covers is None else covers[order])
+    starts = np.empty(len(times), dtype=bool)
+    starts[0] = True
+    starts[1:] = (devices[1:] != devices[:-1]) | (
+        times[1:] - ends[:-1] > max_gap - interval
+    )
+    first = np.flatnonzero(starts)
+    return times[first], np.maximum.reduceat(ends, first)
+
+
+def occupancy_sweep(
+    arrivals: Any, departures: Any, start: int, end: int, bucket_seconds: int
+) -> OccupancySeries:
+    """Compute mean and peak concurrent occupancy per bucket.
+
+    ``start`` is aligned down to a multiple of ``bucket_seconds`` so hourly
+    and daily buckets line up with the clock.
+    """
+    import numpy as np
+
+    start -= start % bucket_seconds
+    n_buckets = max(0, -(-(end - start) // bucket_seconds))
+    edges = start + bucket_seconds * np.arange(n_buckets + 1, dtype=np.int64)
+    arrivals = np.clip(arrivals, start, edges[-1])
+    departures = np.clip(departures, start, edges[-1])
+    keep = departures > arrivals
+
+    times = np.concatenate((arrivals[keep], departures[keep], edges))
+    deltas = np.concatenate(
+        (
+            np.ones(int(keep.sum()), dtype=np.int64),
+            -np.ones(int(keep.sum()), dtype=np.int64),
+            np.zeros(len(edges), dtype=np.int64),
+        )
+    )
+    # At equal times departures sort before edges before arrivals, so a
+    # device leaving as another arrives never counts twice
+    order = np.lexsort((deltas, times))
+    times = times[order]
+    levels = np.cumsum(deltas[order])
+
+    durations = np.diff(times)
+    segment_levels = levels[:-1]
+    buckets = (times[:-1] - start) // bucket_seconds
+    valid = (durations > 0) & (buckets < n_buckets)
+    buckets = buckets[valid]
+    mean = (
+        np.bincount(
+            buckets,
+            weights=segment_levels[valid] * durations[valid],
+            minlength=n_buckets,
+        )[:n_buckets]
+        / bucket_seconds
+    )
+    peak = np.zeros(n_buckets, dtype=np.int64)
+    np.maximum.at(peak, buckets, segment_levels[valid])
+    return OccupancySeries(edges[:-1], mean, peak, bucket_seconds)
+
+
+def weekday_hour_heatmap(hourly: OccupancySeries) -> Any:
+    """Average an hourly series into a 7x24 weekday (Monday=0) by hour matrix.
+
+    Cells for weekday/hour combinations outside the series are NaN.
+    """
+    import numpy as np
+
+    if hourly.bucket_seconds != 3600:
+        raise ValueError("Heatmaps need an hourly occupancy series")
+    starts = hourly.bucket_starts
+    weekday = (starts // SECONDS_PER_DAY + EPOCH_WEEKDAY) % 7
+    hour = starts // 3600 % 24
+    cells = weekday * 24 + hour
+    totals = np.bincount(cells, weights=hourly.mean, minlength=7 * 24)
+    counts = np.bincount(cells, minlength=7 * 24)
+    with np.errstate(invalid="ignore"):
+        return (totals / counts).reshape(7, 24)
@@ -0,0 +1,241 @@
+"""Read-only JSON API served from inside the scan process.
+
+``/api/presence/current`` is answered from ``PresenceTracker.device_states``
+without touching the database. ``/api/presence/history`` and
+``/api/analytics/trends`` run on a read-only SQLite connection owned by a
+single worker thread, so queries never block the scan loop.
+
+Every response carries an ETag and Last-Modified tied to the scan cycle
+number, which only changes once per cycle. Clients polling with
+``If-None-Match``/``If-Modified-Since`` get ``304 Not Modified``, and
+database-backed bodies are computed at most once per cycle and URL.
+"""
+
+import asyncio
+import json
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fablab_visitor_logger import analytics
+from fablab_visitor_logger.clock import SYSTEM_CLOCK, Clock
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.httpserver import HTTPServer, Request, Response
+from fablab_visitor_logger.reporting import Reporter
+
+CONTENT_TYPE = "application/json"
+HISTORY_DEFAULT_HOURS = 24
+HISTORY_MAX_BUCKETS = 10_000  # caps the arrays one history request allocates
+TRENDS_DEFAULT_DAYS = 28
+
+
+class PresenceAPI:
+    """Serves presence and analytics endpoints for one tracker."""
+
+    def __init__(
+        self,
+        tracker: Any,
+        port: Optional[int] = None,
+        host: str = "127.0.0.1",
+        reporter_factory: Optional[Callable[[], Reporter]] = None,
+        clock: Clock = SYSTEM_CLOCK,
+    ) -> None:
+        self.tracker = tracker
+        self.port = port
+        self.host = host
+        self.clock = clock  # Last-Modified and the default query ranges
+        self.logger = logging.getLogger(__name__)
+        self.cycle = 0
+        self.last_modified = clock.time()
+        self._reporter_factory = reporter_factory or (
+            lambda: Reporter(read_only=True, clock=clock)
+        )
+        self._reporter: Optional[Reporter] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._server: Optional[HTTPServer] = None
+        self._instance = int(self.last_modified)  # Keeps ETags unique per run
+        self._bodies: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], bytes] = {}
+
+    @classmethod
+    def from_config(cls, tracker: Any, clock: Clock = SYSTEM_CLOCK) -> "PresenceAPI":
+        return cls(tracker, port=Config.API_PORT, host=Config.API_HOST, clock=clock)
+
+    async def start(self) -> None:
+        """Start the HTTP endpoint if a port is configured."""
+        if self.port is None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api")
+        self._server = HTTPServer(self.host, self.port)
+        self._server.route("/api/presence/current", self._serve_current)
+        self._server.route("/api/presence/history", self._serve_history)
+        self._server.route("/api/analytics/trends", self._serve_trends)
+        await self._server.start()
+        self.port = self._server.port
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            await self._server.stop()
+            self._server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def mark_cycle(self) -> None:
+        """Advance the cycle number; called once per scan cycle."""
+        self.cycle += 1
+        self.last_modified = self.clock.time()
+        self._bodies.clear()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self._instance}-{self.cycle}"'
+
+    def _not_modified(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return self.etag in (tag.strip() for tag in if_none_match.split(","))
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.last_modified) <= since
+        return False
+
+    def _response(self, request: Request, body: Optional[bytes]) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Last-Modified": formatdate(self.last_modified, usegmt=True),
+            "Cache-Control": "no-cache",
+        }
+        if body is None:
+            return Response(304, headers=headers, content_type=CONTENT_TYPE)
+        return Response(200, body, CONTENT_TYPE, headers)
+
+    def _serve_current(self, request: Request) -> Response:
+        if self._not_modified(request):
+            return self._response(request, None)
+        present = absent = 0
+        for state in self.tracker.device_states.values():
+            if state.get("missed_pings", 0) < Config.PING_TIMEOUT:
+                present += 1
+            else:
+                absent += 1
+        return self._response(
+            request,
+            _dumps(
+                {
+                    "cycle": self.cycle,
+                    "present": present,
+                    "absent": absent,
+                    "degraded": bool(getattr(self.tracker, "degraded", False)),
+                }
+            ),
+        )
+
+    async def _serve_history(self, request: Request) -> Response:
+        return await self._serve_cached(request, self._history)
+
+    async def _serve_trends(self, request: Request) -> Response:
+        return await self._serve_cached(request, self._trends)
+
+    async def _serve_cached(
+        self, request: Request, build: Callable[[Reporter, Dict[str, str]], Any]
+    ) -> Response:
+        if self._not_modified(request):
+            return self._response(request, None)
+        key = (request.path, tuple(sorted(request.query.items())))
+        body = self._bodies.get(key)
+        if body is None:
+            try:
+                payload = await self._run_query(build, request.query)
+            except ValueError as e:
+                return Response(400, _dumps({"error": str(e)}), CONTENT_TYPE)
+            body = self._bodies[key] = _dumps(payload)
+        return self._response(request, body)
+
+    async def _run_query(
+        self, build: Callable[[Reporter, Dict[str, str]], Any], query: Dict[str, str]
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: build(self._get_reporter(), query)
+        )
+
+    def _get_reporter(self) -> Reporter:
+        # Created on the worker thread that runs every query
+        if self._reporter is None:
+            self._reporter = self._reporter_factory()
+        return self._reporter
+
+    def _history(self, reporter: Reporter, query: Dict[str, str]) -> Dict[str, Any]:
+        until = _query_datetime(query, "until") or self.clock.now()
+        since = _query_datetime(query, "since") or until - timedelta(
+            hours=HISTORY_DEFAULT_HOURS
+        )
+        try:
+            bucket = int(query.get("bucket", 60))
+        except ValueError:
+            raise ValueError("bucket must be a number of minutes")
+        if bucket <= 0:
+            raise ValueError("bucket must be a positive number of minutes")
+        if (until - since) / timedelta(minutes=bucket) > HISTORY_MAX_BUCKETS:
+            raise ValueError(
+                f"range covers more than {HISTORY_MAX_BUCKETS} buckets; "
+                "use a larger bucket or a shorter range"
+            )
+        series = reporter.occupancy_series(since, until, timedelta(minutes=bucket))
+        return {
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "bucket_minutes": bucket,
+            "buckets": [
+                {
+                    "start": analytics.from_epoch(start).isoformat(),
+                    "mean": round(float(mean), 3),
+                    "peak": int(peak),
+                }
+                for start, mean, peak in zip(
+                    series.bucket_starts, series.mean, series.peak
+                )
+            ],
+        }
+
+    def _trends(self, reporter: Reporter, query: Dict[str, str]) -> Dict[str, Any]:
+        until = _query_datetime(query, "until") or self.clock.now()
+        since = _query_datetime(query, "since") or until - timedelta(
+            days=TRENDS_DEFAULT_DAYS
+        )
+        heatmap = reporter.occupancy_heatmap(since, until)
+        return {
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "heatmap": {
+                name: [None if math.isnan(v) else round(float(v), 3) for v in row]
+                for name, row in zip(analytics.WEEKDAY_NAMES, heatmap)
+            },
+            "device_types": {
+                device_type or "Unknown": days
+                for device_type, days in reporter.get_device_type_trends(
+                    since.date(), until.date()
+                ).items()
+            },
+        }
+
+
+def _query_datetime(query: Dict[str, str], name: str) -> Optional[datetime]:
+    value = query.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date or datetime")
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload).encode()
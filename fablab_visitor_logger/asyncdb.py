@@ -0,0 +1,124 @@
+"""Async facade running a Database on a dedicated worker thread.
+
+SQLite calls block. Made from a coroutine, a bulk insert of a large scan or
+a retention cleanup stalls the event loop for its whole duration, delaying
+signal handling, the metrics and API endpoints and timers. An
+``AsyncDatabase`` opens its Database on a single-thread executor and runs
+every call there: the connection is only ever used by that thread, calls
+run one at a time in submission order, and the loop just awaits them.
+
+A call that has been submitted always runs to completion. Cancelling the
+awaiting task only stops the wait, so a write is never half-applied or
+silently dropped from the queue. ``close()`` waits for the queued calls
+and closes the connection on the worker thread.
+
+``call``, ``run`` and ``unwrap`` accept either an ``AsyncDatabase`` or a
+plain ``Database``. The plain one is used inline on the calling thread, as
+offline tools and tests do.
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.reporting import Reporter
+
+T = TypeVar("T")
+
+
+class AsyncDatabase:
+    """Database whose calls run on one worker thread owning the connection."""
+
+    def __init__(self, factory: Callable[[], Database] = Database) -> None:
+        self._start()
+        # Opened (and migrated) on the worker thread, which owns it from now on
+        self.database = self._executor.submit(factory).result()
+
+    @classmethod
+    async def open(cls, factory: Callable[[], Database] = Database) -> "AsyncDatabase":
+        """Create one from a coroutine, awaiting the open and migrations."""
+        db = cls.__new__(cls)
+        db._start()
+        db.database = await asyncio.wrap_future(db._executor.submit(factory))
+        return db
+
+    def _start(self) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="database"
+        )
+        self._reporter: Optional[Reporter] = None
+        self._closed = False
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run ``func(*args)`` on the worker thread and return its result."""
+        if self._closed:
+            raise RuntimeError("Database is closed")
+        future = self._executor.submit(func, *args)
+        # Shielded: cancelling the caller must not unqueue a pending write
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Call a Database method on the worker thread."""
+        return await self.run(
+            functools.partial(getattr(self.database, method), *args, **kwargs)
+        )
+
+    async def log_presence(self, device_id, status, rssi=None):
+        return await self.call("log_presence", device_id, status, rssi)
+
+    async def log_presence_batch(self, entries, timestamp=None):
+        return await self.call("log_presence_batch", entries, timestamp)
+
+    async def log_device_info(self, device_id, device_info):
+        return await self.call("log_device_info", device_id, device_info)
+
+    async def log_device_info_batch(self, entries, timestamp=None):
+        return await self.call("log_device_info_batch", entries, timestamp)
+
+    async def log_zone_events(self, changes, timestamp=None):
+        return await self.call("log_zone_events", changes, timestamp)
+
+    async def cleanup_old_data(self):
+        return await self.call("cleanup_old_data")
+
+    async def report(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Run a Reporter query on this connection on the worker thread."""
+        return await self.run(self._report, method, args, kwargs)
+
+    def _report(self, method: str, args: tuple, kwargs: dict) -> Any:
+        if self._reporter is None:
+            self._reporter = Reporter(db=self.database)
+        return getattr(self._reporter, method)(*args, **kwargs)
+
+    async def close(self) -> None:
+        """Finish the queued calls, then close the connection and the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        future = self._executor.submit(self.database.conn.close)
+        self._executor.shutdown(wait=False)  # Queued calls still run
+        await asyncio.shield(asyncio.wrap_future(future))
+        self.logger.debug("Database closed")
+
+
+async def call(db: Any, method: str, *args: Any, **kwargs: Any) -> Any:
+    """Call a method of ``db`` where its connection may be used."""
+    if isinstance(db, AsyncDatabase):
+        return await db.call(method, *args, **kwargs)
+    return getattr(db, method)(*args, **kwargs)
+
+
+async def run(db: Any, func: Callable[..., T], *args: Any) -> T:
+    """Run ``func(*args)``, which uses ``unwrap(db)``, where that is allowed."""
+    if isinstance(db, AsyncDatabase):
+        return await db.run(func, *args)
+    return func(*args)
+
+
+def unwrap(db: Any) -> Any:
+    """The synchronous Database behind ``db``, for functions passed to run()."""
+    return db.database if isinstance(db, AsyncDatabase) else db
@@ -0,0 +1,339 @@
+"""Append-only binary capture of raw BLE advertisements.
+
+Every advertisement seen by a scan, before RSSI filtering, is appended to an
+hourly segment file as a length-prefixed record. Segments are read back by
+memory-mapping them and slicing records out as ``memoryview`` objects, so
+large captures can be replayed through the tracker without copying or
+parsing text.
+
+Every scan starts with a scan marker record holding the number of
+advertisements that follow (or ``SCAN_FAILED``), so replay reproduces empty
+and failed scans as cycles of their own.
+
+Segment layout (little-endian)::
+
+    magic        8 bytes   b"FLCAP\\x002\\n" (b"FLCAP\\x001\\n": no markers)
+    record*      u32 length, followed by ``length`` bytes of body
+
+Record body::
+
+    timestamp    f64       scan start time (epoch seconds), shared by a scan
+    rssi         i16
+    tx_power     i16       TX_POWER_NONE when not advertised
+    addr_len     u8
+    n_manu       u8        manufacturer data entries
+    n_service    u8        service data entries
+    kind         u8        KIND_ADVERTISEMENT (0) or KIND_SCAN (1)
+    address      addr_len bytes (ASCII)
+    manufacturer n_manu x (company_id u16, data_len u16, data)
+    service      n_service x (uuid_len u8, uuid ASCII, data_len u16, data)
+
+A scan marker has no address or sections and ends with an i32 count of the
+scan's advertisements.
+"""
+
+import glob
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Union
+
+from fablab_visitor_logger import metrics
+
+MAGIC = b"FLCAP\x002\n"
+MAGIC_V1 = b"FLCAP\x001\n"  # Segments written before scan markers
+SEGMENT_PREFIX = "capture-"
+SEGMENT_SUFFIX = ".seg"
+TX_POWER_NONE = -32768
+KIND_ADVERTISEMENT = 0
+KIND_SCAN = 1
+SCAN_FAILED = -1  # Scan marker count of a scan that raised
+
+_LENGTH = struct.Struct("<I")
+_HEADER = struct.Struct("<dhhBBBB")
+_SCAN_COUNT = struct.Struct("<i")
+_MANU_ENTRY = struct.Struct("<HH")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+
+
+def _clamp_i16(value: int) -> int:
+    return max(-32767, min(32767, int(value)))
+
+
+def encode_record(
+    timestamp: float,
+    address: str,
+    rssi: int,
+    tx_power: Optional[int],
+    manufacturer_data: Optional[Mapping[int, bytes]],
+    service_data: Optional[Mapping[str, bytes]],
+) -> bytes:
+    """Encode one advertisement as a length-prefixed record."""
+    manufacturer = list((manufacturer_data or {}).items())[:255]
+    service = list((service_data or {}).items())[:255]
+    addr = address.encode("ascii")
+    parts = [
+        _HEADER.pack(
+            timestamp,
+            _clamp_i16(rssi),
+            TX_POWER_NONE if tx_power is None else _clamp_i16(tx_power),
+            len(addr),
+            len(manufacturer),
+            len(service),
+            KIND_ADVERTISEMENT,
+        ),
+        addr,
+    ]
+    for company_id, data in manufacturer:
+        data = bytes(data)[:0xFFFF]
+        parts.append(_MANU_ENTRY.pack(int(company_id) & 0xFFFF, len(data)))
+        parts.append(data)
+    for uuid, data in service:
+        uuid_bytes = str(uuid).encode("ascii")[:255]
+        data = bytes(data)[:0xFFFF]
+        parts.append(_U8.pack(len(uuid_bytes)))
+        parts.append(uuid_bytes)
+        parts.append(_U16.pack(len(data)))
+        parts.append(data)
+    body = b"".join(parts)
+    return _LENGTH.pack(len(body)) + body
+
+
+def encode_scan_marker(timestamp: float, devices: int) -> bytes:
+    """Encode the marker starting a scan of ``devices`` advertisements."""
+    body = _HEADER.pack(
+        timestamp, 0, TX_POWER_NONE, 0, 0, 0, KIND_SCAN
+    ) + _SCAN_COUNT.pack(devices)
+    return _LENGTH.pack(len(body)) + body
+
+
+class CorruptRecord(ValueError):
+    """A record too short for, or inconsistent with, its own header."""
+
+
+class CaptureRecord:
+    """A zero-copy view of one captured advertisement or scan marker.
+
+    The record references the reader's memory map and is only valid until
+    the reader is closed; copy fields out (``bytes(...)``) to keep them.
+    """
+
+    __slots__ = ("buffer", "timestamp", "rssi", "kind", "_tx_power", "_counts")
+
+    def __init__(self, buffer: memoryview) -> None:
+        self.buffer = buffer
+        try:
+            (timestamp, rssi, tx_power, addr_len, n_manu, n_service, kind) = (
+                _HEADER.unpack_from(buffer, 0)
+            )
+            if kind == KIND_SCAN:
+                _SCAN_COUNT.unpack_from(buffer, _HEADER.size)
+        except struct.error as e:
+            raise CorruptRecord(f"{len(buffer)}-byte record: {e}") from e
+        self.timestamp: float = timestamp
+        self.rssi: int = rssi
+        self.kind: int = kind
+        self._tx_power = tx_power
+        self._counts = (addr_len, n_manu, n_service)
+
+    @property
+    def is_scan(self) -> bool:
+        return self.kind == KIND_SCAN
+
+    @property
+    def devices(self) -> int:
+        """Advertisements of the scan a marker starts, or SCAN_FAILED."""
+        return _SCAN_COUNT.unpack_from(self.buffer, _HEADER.size)[0]
+
+    @property
+    def tx_power(self) -> Optional[int]:
+        return None if self._tx_power == TX_POWER_NONE else self._tx_power
+
+    @property
+    def address(self) -> str:
+        addr_len = self._counts[0]
+        try:
+            return str(self.buffer[_HEADER.size : _HEADER.size + addr_len], "ascii")
+        except UnicodeDecodeError as e:
+            raise CorruptRecord(f"address: {e}") from e
+
+    def sections(self):
+        """Parse the variable-length sections into memoryview slices.
+
+        Raises:
+            CorruptRecord: If the sections overrun the record.
+        """
+        try:
+            return self._sections()
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise CorruptRecord(f"sections: {e}") from e
+
+    def _sections(self):
+        buf = self.buffer
+        addr_len, n_manu, n_service = self._counts
+        offset = _HEADER.size + addr_len
+        manufacturer: Dict[int, memoryview] = {}
+        for _ in range(n_manu):
+            company_id, data_len = _MANU_ENTRY.unpack_from(buf, offset)
+            offset += _MANU_ENTRY.size
+            manufacturer[company_id] = buf[offset : offset + data_len]
+            offset += data_len
+        service: Dict[str, memoryview] = {}
+        for _ in range(n_service):
+            uuid_len = buf[offset]
+            offset += 1
+            uuid = str(buf[offset : offset + uuid_len], "ascii")
+            offset += uuid_len
+            (data_len,) = _U16.unpack_from(buf, offset)
+            offset += _U16.size
+            service[uuid] = buf[offset : offset + data_len]
+            offset += data_len
+        if offset > len(buf):
+            raise IndexError(f"sections end at {offset} of {len(buf)} bytes")
+        return manufacturer, service
+
+    @property
+    def manufacturer_data(self) -> Dict[int, memoryview]:
+        return self.sections()[0]
+
+    @property
+    def service_data(self) -> Dict[str, memoryview]:
+        return self.sections()[1]
+
+
+class CaptureWriter:
+    """Appends raw advertisements to hourly rotated segment files."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.logger = logging.getLogger(__name__)
+        self._file = None
+        self._segment_key: Optional[str] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def segment_path(self, timestamp: float) -> str:
+        key = time.strftime("%Y%m%d-%H", time.localtime(timestamp))
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{key}{SEGMENT_SUFFIX}")
+
+    def _rotate(self, timestamp: float) -> None:
+        key = time.strftime("%Y%m%d-%H", time.localtime(timestamp))
+        if key == self._segment_key and self._file is not None:
+            return
+        self.close()
+        path = self.segment_path(timestamp)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._segment_key = key
+        self.logger.debug(f"Writing capture segment {path}")
+
+    def append(
+        self,
+        timestamp: float,
+        address: str,
+        rssi: int,
+        tx_power: Optional[int] = None,
+        manufacturer_data: Optional[Mapping[int, bytes]] = None,
+        service_data: Optional[Mapping[str, bytes]] = None,
+    ) -> None:
+        """Append one advertisement, rotating to a new segment each hour."""
+        self._rotate(timestamp)
+        assert self._file is not None
+        self._file.write(
+            encode_record(
+                timestamp, address, rssi, tx_power, manufacturer_data, service_data
+            )
+        )
+
+    def mark_scan(self, timestamp: float, devices: int) -> None:
+        """Start a scan of ``devices`` advertisements (SCAN_FAILED if none)."""
+        self._rotate(timestamp)
+        assert self._file is not None
+        self._file.write(encode_scan_marker(timestamp, devices))
+
+    def flush(self) -> None:
+        """Flush buffered records; called once per scan."""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._segment_key = None
+
+
+def list_segments(paths: Union[str, Iterable[str]]) -> List[str]:
+    """Expand files and directories into segment paths in time order."""
+    if isinstance(paths, str):
+        paths = [paths]
+    segments: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            segments.extend(
+                glob.glob(os.path.join(path, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+            )
+        else:
+            segments.append(path)
+    return sorted(segments, key=os.path.basename)
+
+
+class CaptureReader:
+    """Iterates records of one or more segments via memory maps."""
+
+    def __init__(self, paths: Union[str, Iterable[str]]) -> None:
+        self.segments = list_segments(paths)
+        self.logger = logging.getLogger(__name__)
+        self._maps: List[mmap.mmap] = []
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        for path in self.segments:
+            yield from self._iter_segment(path)
+
+    def _iter_segment(self, path: str) -> Iterator[CaptureRecord]:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= len(MAGIC):
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        view = memoryview(mapped)
+        if view[: len(MAGIC)] not in (MAGIC, MAGIC_V1):
+            self.logger.warning(f"Skipping {path}: not a capture segment")
+            return
+        offset = len(MAGIC)
+        while offset + _LENGTH.size <= size:
+            (length,) = _LENGTH.unpack_from(view, offset)
+            start = offset + _LENGTH.size
+            if start + length > size:
+                self.logger.warning(
+                    f"Truncated record at offset {offset} in {path}, stopping"
+                )
+                break
+            try:
+                record = CaptureRecord(view[start : start + length])
+            except CorruptRecord as e:
+                # Skipped like an undecodable spooled write
+                self.logger.error(f"Skipping corrupt record in {path}: {e}")
+                metrics.CAPTURE_CORRUPT_TOTAL.inc()
+            else:
+                yield record
+            offset = start + length
+
+    def close(self) -> None:
+        """Unmap segments. Maps still referenced by records stay until GC."""
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+        self._maps.clear()
@@ -0,0 +1,175 @@
+"""Typed columnar export of presence logs for analytics.
+
+Rows arrive in chunks from a database cursor and are converted into compact
+typed columns: int64 epoch seconds, int8 status codes, int16 RSSI and
+dictionary-encoded device IDs, vendors and device types. Parquet (one row
+group per chunk) is written when pyarrow is installed; otherwise a directory
+of plain ``.npy`` files, one per column, that NumPy can memory-map. NumPy and
+pyarrow are imported lazily so that other report commands don't pay for
+them.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+# Status codes stored in the int8 ``status`` column; 0 means unknown.
+STATUS_CODES = {"present": 1, "absent": 2, "departed": 3}
+RSSI_NULL = -32768  # int16 sentinel for missing RSSI in .npy output
+CODE_NULL = -1  # dictionary code for missing vendor/type in .npy output
+
+# Column order of the rows fed to the sinks
+COLUMNAR_QUERY_COLUMNS = (
+    "timestamp",
+    "status",
+    "rssi",
+    "device_id",
+    "vendor_name",
+    "device_type",
+)
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _DictionaryEncoder:
+    """Maps values to dense integer codes, remembering first-seen order."""
+
+    def __init__(self) -> None:
+        self.codes: Dict[Any, int] = {}
+
+    def encode(self, values: Sequence[Optional[str]]) -> List[int]:
+        codes = self.codes
+        return [
+            CODE_NULL if value is None else codes.setdefault(value, len(codes))
+            for value in values
+        ]
+
+    @property
+    def dictionary(self) -> List[str]:
+        return list(self.codes)
+
+
+class NpyDirectorySink:
+    """Streams each column into its own ``.npy`` file in a directory.
+
+    Chunks are appended to the files as they arrive, so memory is bounded by
+    one chunk whatever the row count, and the header's shape is filled in on
+    close. Plain ``.npy`` files (unlike ``.npz`` archives) can be opened with
+    ``np.load(path, mmap_mode="r")`` without reading them into memory.
+    """
+
+    COLUMNS = {
+        "timestamp": "<i8",
+        "status": "<i1",
+        "rssi": "<i2",
+        "device_code": "<i4",
+        "vendor_code": "<i4",
+        "type_code": "<i4",
+    }
+
+    def __init__(self, path: str) -> None:
+        import numpy as np
+
+        self.np = np
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._files = {
+            name: open(os.path.join(path, f"{name}.npy"), "wb") for name in self.COLUMNS
+        }
+        for name, f in self._files.items():
+            self._write_header(f, self.COLUMNS[name], 0)
+        self._header_size = next(iter(self._files.values())).tell()
+        self._devices = _DictionaryEncoder()
+        self._vendors = _DictionaryEncoder()
+        self._types = _DictionaryEncoder()
+        self._rows = 0
+
+    def _write_header(self, f: Any, descr: str, rows: int) -> None:
+        # Always 128 bytes for a 1-D shape, so the final header of the same
+        # size can overwrite the placeholder written before the data
+        self.np.lib.format.write_array_header_1_0(
+            f, {"descr": descr, "fortran_order": False, "shape": (rows,)}
+        )
+
+    def write_chunk(self, rows: Sequence[Sequence[Any]]) -> None:
+        np = self.np
+        ts, status, rssi, devices, vendors, types = zip(*rows)
+        columns = {
+            "timestamp": [t if t is not None else 0 for t in ts],
+            "status": [STATUS_CODES.get(s, 0) for s in status],
+            "rssi": [RSSI_NULL if r is None else r for r in rssi],
+            "device_code": self._devices.encode(devices),
+            "vendor_code": self._vendors.encode(vendors),
+            "type_code": self._types.encode(types),
+        }
+        for name, values in columns.items():
+            np.asarray(values, dtype=self.COLUMNS[name]).tofile(self._files[name])
+        self._rows += len(rows)
+
+    def close(self) -> None:
+        np = self.np
+        for name, f in self._files.items():
+            f.seek(0)
+            self._write_header(f, self.COLUMNS[name], self._rows)
+            assert f.tell() == self._header_size
+            f.close()
+        dictionaries = {
+            "device_dictionary": self._devices.dictionary,
+            "vendor_dictionary": self._vendors.dictionary,
+            "type_dictionary": self._types.dictionary,
+            "status_labels": sorted(STATUS_CODES, key=STATUS_CODES.__getitem__),
+        }
+        for name, values in dictionaries.items():
+            np.save(os.path.join(self.path, f"{name}.npy"), np.array(values, dtype=str))
+
+
+class ParquetSink:
+    """Writes each chunk as one Parquet row group."""
+
+    def __init__(self, path: str) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        dictionary = pa.dictionary(pa.int32(), pa.string())
+        self.schema = pa.schema(
+            [
+                ("timestamp", pa.timestamp("s")),
+                ("status", pa.int8()),
+                ("rssi", pa.int16()),
+                ("device_id", dictionary),
+                ("vendor_name", dictionary),
+                ("device_type", dictionary),
+            ],
+            metadata={
+                b"status_codes": ",".join(
+                    f"{code}={name}" for name, code in STATUS_CODES.items()
+                ).encode()
+            },
+        )
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write_chunk(self, rows: Sequence[Sequence[Any]]) -> None:
+        pa = self.pa
+        ts, status, rssi, devices, vendors, types = zip(*rows)
+        table = pa.Table.from_arrays(
+            [
+                pa.array(ts, pa.int64()).cast(pa.timestamp("s")),
+                pa.array([STATUS_CODES.get(s, 0) for s in status], pa.int8()),
+                pa.array(rssi, pa.int16()),
+                pa.array(devices, pa.string()).dictionary_encode(),
+                pa.array(vendors, pa.string()).dictionary_encode(),
+                pa.array(types, pa.string()).dictionary_encode(),
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        self.writer.close()
@@ -1,4 +1,11 @@
+import os
 from enum import Enum
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+# Environment variables override settings as FABLAB_<NAME>; FABLAB_CONFIG
+# names a dotenv-style file of the same variables (prefix optional)
+ENV_PREFIX = "FABLAB_"
+CONFIG_FILE_ENV = "FABLAB_CONFIG"
 
 
 class DeviceStatus(Enum):
@@ -7,6 +14,10 @@ class DeviceStatus(Enum):
     DEPARTED = "departed"
 
 
+class ConfigError(ValueError):
+    """Raised when a configuration layer has unknown or invalid settings."""
+
+
 class Config:
     # Scanning configuration
     SCAN_INTERVAL = 30  # seconds
@@ -14,22 +25,372 @@ class Config:
     DEPARTURE_THRESHOLD = 5  # 'absent' pings before 'departed'
     RSSI_THRESHOLD = -80  # dBm
 
+    # Scan failure handling
+    SCAN_RETRIES = 3  # BleakError retries per scan
+    SCAN_RETRY_BACKOFF = 1.0  # seconds, doubled on each retry
+    MAX_DEGRADED_CYCLES = 10  # empty scans to distrust before accepting them
+
     # Data handling
-    DATA_RETENTION_DAYS = 90
+    DATA_RETENTION_DAYS = 90  # raw presence logs
+    # Older presence is kept downsampled: per-minute summaries up to
+    # MINUTELY_RETENTION_DAYS, then per-hour summaries (0 keeps them forever)
+    MINUTELY_RETENTION_DAYS = 180
+    HOURLY_RETENTION_DAYS = 730
+    COMPACTION_HOURS_PER_CYCLE = 6  # hours of logs rolled up per scan cycle
     ANONYMIZE_DEVICES = True
+    # Secret key of the keyed device pseudonyms, created on first use; empty
+    # for DEFAULT_KEY_FILE next to DATABASE_PATH
+    PSEUDONYM_KEY_FILE = ""
+    PSEUDONYM_ROTATION_DAYS = 0  # e.g. 30 for monthly pseudonyms; 0 never rotates
+    PSEUDONYM_CACHE_SIZE = 4096  # device IDs whose pseudonym is kept in memory
+    REKEY_BATCH_SIZE = 500  # devices re-keyed per scan cycle after a key change
 
     # Database
     DATABASE_PATH = "fablab_presence.db"
+    DATABASE_WAL = True  # write-ahead log: readers and the scanner don't block
+
+    # Storage maintenance by the scan process. Vacuum and optimize run in the
+    # quiet hours [start, end) (local time; start > end wraps past midnight)
+    MAINTENANCE_START_HOUR = 2
+    MAINTENANCE_END_HOUR = 5
+    VACUUM_PAGES_PER_CYCLE = 2000  # free pages returned to the filesystem
+    CHECKPOINT_INTERVAL = 300  # seconds between WAL checkpoints; 0 disables
+    # Writes failing while the database is locked or the disk is full are
+    # journaled here and replayed in order; None disables the spool
+    SPOOL_DIR = None
+    SPOOL_MAX_BYTES = 64 * 1024 * 1024  # oldest records are dropped beyond this
+    SPOOL_DRAIN_SECONDS = 2.0  # replay budget per scan cycle
+
+    # Raw advertisement capture (hourly segment files); None disables capture
+    CAPTURE_DIR = None
+
+    # Metrics
+    METRICS_HOST = "127.0.0.1"
+    METRICS_PORT = None  # e.g. 9105; None disables the HTTP endpoint
+    METRICS_TEXTFILE_PATH = None  # e.g. node_exporter textfile collector *.prom
+
+    # JSON API (/api/presence/current, /history, /api/analytics/trends)
+    API_HOST = "127.0.0.1"
+    API_PORT = None  # e.g. 8080; None disables the API
+
+    # Multi-node ingestion: sensors push scans to the aggregator at this
+    # address ("host:port" or "unix:/path"); the aggregator listens on it
+    AGGREGATOR_ADDRESS = None
+    SENSOR_ID = None  # Name sent by a sensor; defaults to the host name
+    # Seconds past SCAN_INTERVAL the aggregator waits for a silent sensor
+    # before closing a window without it
+    AGGREGATOR_GRACE_SECONDS = 5.0
+
+    # Zone assignment on the aggregator, from each device's per-sensor RSSI.
+    # Comma-separated sensor=value pairs; unlisted sensors are their own zone
+    SENSOR_ZONES = ""  # e.g. "lab-door=workshop,lab-back=workshop,desk=office"
+    SENSOR_RSSI_OFFSETS = ""  # dB added to a sensor's readings, e.g. "desk=-4"
+    ZONE_SMOOTHING = 0.3  # weight of the newest reading in the RSSI average
+    ZONE_HYSTERESIS_DB = 4.0  # margin a new zone needs to take a device over
+    ZONE_MISSING_RSSI = -100  # dBm assumed for a sensor that missed a device
+
+    # Logging
+    LOG_FILE = "presence_tracker.log"
+    LOG_LEVEL = "INFO"
+    LOG_MAX_BYTES = 5 * 1024 * 1024  # rotate the log file at this size
+    LOG_BACKUP_COUNT = 3
+    LOG_DEVICE_DETAIL_LIMIT = 5  # device IDs listed per summary line
+
+    _log_listener = None
+    _config_file: Optional[str] = None
+    _environ: Optional[Mapping[str, str]] = None
+
+    @classmethod
+    def settings(cls) -> Dict[str, Any]:
+        """Current value of every setting."""
+        return {name: getattr(cls, name) for name in _DEFAULTS}
+
+    @classmethod
+    def resolve(
+        cls,
+        config_file: Optional[str] = None,
+        environ: Optional[Mapping[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Layer defaults < config file < environment and validate the result.
+
+        Args:
+            config_file: dotenv-style file; defaults to ``$FABLAB_CONFIG``.
+            environ: Environment to read; defaults to ``os.environ``.
+
+        Raises:
+            ConfigError: Listing every unknown, unparsable or out-of-range value.
+        """
+        environ = os.environ if environ is None else environ
+        config_file = config_file or environ.get(CONFIG_FILE_ENV)
+        errors: List[str] = []
+        raw: Dict[str, Optional[str]] = {}
+        if config_file:
+            if not os.path.isfile(config_file):
+                raise ConfigError(f"Config file not found: {config_file}")
+            # Imported here: only needed when a config file is used
+            from dotenv import dotenv_values
+
+            for key, value in dotenv_values(config_file).items():
+                name = key[len(ENV_PREFIX) :] if key.startswith(ENV_PREFIX) else key
+                if name in _DEFAULTS:
+                    raw[name] = value
+                else:
+                    errors.append(f"{config_file}: unknown setting {key}")
+        for key, value in environ.items():
+            if not key.startswith(ENV_PREFIX) or key == CONFIG_FILE_ENV:
+                continue
+            name = key[len(ENV_PREFIX) :]
+            if name in _DEFAULTS:
+                raw[name] = value
+            else:
+                errors.append(f"unknown environment variable {key}")
+
+        values = dict(_DEFAULTS)
+        for name, value in raw.items():
+            try:
+                values[name] = _parse_setting(name, value or "")
+            except ValueError as e:
+                errors.append(str(e))
+        errors += _validate(values)
+        if errors:
+            raise ConfigError("; ".join(errors))
+        return values
+
+    @classmethod
+    def load(
+        cls,
+        config_file: Optional[str] = None,
+        environ: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """Apply all layers at startup and remember them for ``reload``."""
+        values = cls.resolve(config_file, environ)
+        cls._config_file = config_file
+        cls._environ = environ
+        for name, value in values.items():
+            setattr(cls, name, value)
+
+    @classmethod
+    def reload(cls) -> Tuple[Dict[str, Tuple[Any, Any]], List[str]]:
+        """Re-read the layers given to ``load`` and apply what changed.
+
+        Settings read only at startup (paths, ports, log files) are left
+        alone. Everything else is read by the scan loop on every cycle, so
+        it takes effect on the next one. Nothing changes if validation fails.
+
+        Returns:
+            ({name: (old, new)} applied, [changed names needing a restart])
+        """
+        values = cls.resolve(cls._config_file, cls._environ)
+        applied: Dict[str, Tuple[Any, Any]] = {}
+        pending: List[str] = []
+        for name, value in values.items():
+            old = getattr(cls, name)
+            if value == old:
+                continue
+            if name in _RESTART_REQUIRED:
+                pending.append(name)
+                continue
+            setattr(cls, name, value)
+            applied[name] = (old, value)
+        if "LOG_LEVEL" in applied and cls._log_listener is not None:
+            import logging
 
-    @staticmethod
-    def setup_logging():
+            logging.getLogger().setLevel(cls.LOG_LEVEL)
+        return applied, pending
+
+    @classmethod
+    def setup_logging(cls):
+        """Route logging through a queue drained by a background thread.
+
+        Records are handed to a ``QueueHandler`` on the calling thread, so the
+        event loop never blocks on file I/O; a ``QueueListener`` writes them to
+        a size-rotated log file and stderr. Calling this again is a no-op.
+        """
+        import atexit
         import logging
+        import queue
+        from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+        if cls._log_listener is not None:
+            return
+
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
+        file_handler = RotatingFileHandler(
+            cls.LOG_FILE, maxBytes=cls.LOG_MAX_BYTES, backupCount=cls.LOG_BACKUP_COUNT
+        )
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        listener = QueueListener(
+            log_queue, file_handler, stream_handler, respect_handler_level=True
+        )
+        root = logging.getLogger()
+        root.setLevel(cls.LOG_LEVEL)
+        root.addHandler(QueueHandler(log_queue))
+        listener.start()
+        atexit.register(cls.shutdown_logging)
+        cls._log_listener = listener
+
+    @classmethod
+    def shutdown_logging(cls):
+        """Flush queued records and detach the queue handler."""
+        import logging
+        from logging.handlers import QueueHandler
+
+        listener = cls._log_listener
+        if listener is None:
+            return
+        cls._log_listener = None
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, QueueHandler) and handler.queue is listener.queue:
+                root.removeHandler(handler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
 
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.FileHandler("presence_tracker.log"),
-                logging.StreamHandler(),
-            ],
+
+# Built-in values of every setting: the upper-case class attributes
+_DEFAULTS: Dict[str, Any] = {
+    name: value for name, value in vars(Config).items() if name.isupper()
+}
+
+# Types of settings whose default is None; an empty value means None
+_OPTIONAL_TYPES = {
+    "CAPTURE_DIR": str,
+    "SPOOL_DIR": str,
+    "AGGREGATOR_ADDRESS": str,
+    "SENSOR_ID": str,
+    "METRICS_PORT": int,
+    "METRICS_TEXTFILE_PATH": str,
+    "API_PORT": int,
+}
+
+# Inclusive (minimum, maximum) of numeric settings; None is unbounded
+_RANGES = {
+    "SCAN_INTERVAL": (1, None),
+    "PING_TIMEOUT": (1, None),
+    "DEPARTURE_THRESHOLD": (1, None),
+    "RSSI_THRESHOLD": (-127, 0),
+    "SCAN_RETRIES": (0, None),
+    "SCAN_RETRY_BACKOFF": (0, None),
+    "MAX_DEGRADED_CYCLES": (0, None),
+    "DATA_RETENTION_DAYS": (1, None),
+    "MINUTELY_RETENTION_DAYS": (1, None),
+    "HOURLY_RETENTION_DAYS": (0, None),
+    "COMPACTION_HOURS_PER_CYCLE": (1, None),
+    "PSEUDONYM_ROTATION_DAYS": (0, None),
+    "PSEUDONYM_CACHE_SIZE": (1, None),
+    "REKEY_BATCH_SIZE": (1, None),
+    "MAINTENANCE_START_HOUR": (0, 23),
+    "MAINTENANCE_END_HOUR": (0, 24),
+    "VACUUM_PAGES_PER_CYCLE": (0, None),
+    "CHECKPOINT_INTERVAL": (0, None),
+    "SPOOL_MAX_BYTES": (1024, None),
+    "SPOOL_DRAIN_SECONDS": (0.1, None),
+    "AGGREGATOR_GRACE_SECONDS": (0, None),
+    "METRICS_PORT": (0, 65535),
+    "API_PORT": (0, 65535),
+    "ZONE_SMOOTHING": (0.01, 1),
+    "ZONE_HYSTERESIS_DB": (0, None),
+    "ZONE_MISSING_RSSI": (-127, 0),
+    "LOG_MAX_BYTES": (0, None),
+    "LOG_BACKUP_COUNT": (0, None),
+    "LOG_DEVICE_DETAIL_LIMIT": (0, None),
+}
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# Settings only read when the process starts
+_RESTART_REQUIRED = frozenset(
+    {
+        "ANONYMIZE_DEVICES",
+        "PSEUDONYM_KEY_FILE",
+        "PSEUDONYM_ROTATION_DAYS",
+        "PSEUDONYM_CACHE_SIZE",
+        "DATABASE_PATH",
+        "DATABASE_WAL",
+        "SPOOL_DIR",
+        "SPOOL_MAX_BYTES",
+        "CAPTURE_DIR",
+        "METRICS_HOST",
+        "METRICS_PORT",
+        "METRICS_TEXTFILE_PATH",
+        "API_HOST",
+        "AGGREGATOR_ADDRESS",
+        "SENSOR_ID",
+        "SENSOR_ZONES",
+        "SENSOR_RSSI_OFFSETS",
+        "ZONE_SMOOTHING",
+        "ZONE_HYSTERESIS_DB",
+        "ZONE_MISSING_RSSI",
+        "API_PORT",
+        "LOG_FILE",
+        "LOG_MAX_BYTES",
+        "LOG_BACKUP_COUNT",
+    }
+)
+
+
+def _parse_setting(name: str, raw: str) -> Any:
+    kind = _OPTIONAL_TYPES.get(name, type(_DEFAULTS[name]))
+    raw = raw.strip()
+    if name in _OPTIONAL_TYPES and not raw:
+        return None
+    if kind is bool:
+        if raw.lower() in ("1", "true", "yes", "on"):
+            return True
+        if raw.lower() in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"{name}: expected a boolean, got {raw!r}")
+    if name == "LOG_LEVEL":
+        raw = raw.upper()
+    try:
+        return kind(raw)
+    except ValueError:
+        raise ValueError(f"{name}: expected {kind.__name__}, got {raw!r}")
+
+
+def _validate(values: Dict[str, Any]) -> List[str]:
+    errors = []
+    for name, (low, high) in _RANGES.items():
+        value = values[name]
+        if value is None:
+            continue
+        if (low is not None and value < low) or (high is not None and value > high):
+            bounds = f">= {low}" if high is None else f"in [{low}, {high}]"
+            errors.append(f"{name} must be {bounds}, got {value}")
+    if values["DEPARTURE_THRESHOLD"] < values["PING_TIMEOUT"]:
+        errors.append("DEPARTURE_THRESHOLD must not be below PING_TIMEOUT")
+    if values["MINUTELY_RETENTION_DAYS"] < values["DATA_RETENTION_DAYS"]:
+        errors.append("MINUTELY_RETENTION_DAYS must not be below DATA_RETENTION_DAYS")
+    if 0 < values["HOURLY_RETENTION_DAYS"] < values["MINUTELY_RETENTION_DAYS"]:
+        errors.append(
+            "HOURLY_RETENTION_DAYS must be 0 or not below MINUTELY_RETENTION_DAYS"
         )
+    for name, kind in (("SENSOR_ZONES", str), ("SENSOR_RSSI_OFFSETS", float)):
+        try:
+            parse_pairs(values[name], kind)
+        except ValueError as e:
+            errors.append(f"{name}: {e}")
+    if values["LOG_LEVEL"] not in LOG_LEVELS:
+        errors.append(f"LOG_LEVEL must be one of {', '.join(LOG_LEVELS)}")
+    return errors
+
+
+def parse_pairs(text: str, kind: type = str) -> Dict[str, Any]:
+    """Parse ``"key=value,key=value"`` into a dict, converting values to kind."""
+    pairs: Dict[str, Any] = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        key, sep, value = item.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"expected key=value, got {item!r}")
+        try:
+            pairs[key.strip()] = kind(value.strip())
+        except ValueError:
+            raise ValueError(f"expected {kind.__name__} for {key.strip()!r}")
+    return pairs
@@ -1,142 +1,545 @@
-import hashlib
 import json
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from pathlib import Path
 
+from fablab_visitor_logger import migrations
+from fablab_visitor_logger.analytics import from_epoch, to_epoch
+from fablab_visitor_logger.clock import SYSTEM_CLOCK
 from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.pseudonym import Pseudonymizer
+
+UPSERT_DEVICE_SQL = """
+    INSERT INTO devices (
+        device_id,
+        anonymous_id,
+        first_seen,
+        last_seen,
+        status
+    ) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(device_id) DO UPDATE SET
+        anonymous_id = excluded.anonymous_id,
+        last_seen = excluded.last_seen,
+        status = excluded.status
+"""
+
+INSERT_DEVICE_IF_MISSING_SQL = """
+    INSERT OR IGNORE INTO devices
+        (device_id, anonymous_id, first_seen, last_seen, status)
+        VALUES (?, ?, ?, ?, ?)
+"""
+
+UPSERT_DEVICE_INFO_SQL = """
+    INSERT INTO device_info (
+        device_id,
+        device_name,
+        device_type,
+        vendor_name,
+        vendor_id,
+        model_number,
+        service_uuids,
+        manufacturer_data,
+        tx_power,
+        appearance,
+        service_data,
+        first_detected,
+        last_detected
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(device_id) DO UPDATE SET
+        device_name = excluded.device_name,
+        device_type = excluded.device_type,
+        vendor_name = excluded.vendor_name,
+        model_number = excluded.model_number,
+        vendor_id = excluded.vendor_id,
+        service_uuids = excluded.service_uuids,
+        manufacturer_data = excluded.manufacturer_data,
+        tx_power = excluded.tx_power,
+        appearance = excluded.appearance,
+        service_data = excluded.service_data,
+        last_detected = excluded.last_detected
+"""
+
+INSERT_PRESENCE_LOG_SQL = """
+    INSERT INTO presence_logs (
+        device_id,
+        timestamp,
+        status,
+        rssi
+    ) VALUES (?, ?, ?, ?)
+"""
+
+# Counters that differ from a fresh aggregation of the raw tables
+STATS_MISMATCH_SQL = """
+    SELECT e.scope, e.key, e.value, s.value
+    FROM stats_counters_expected e
+    LEFT JOIN stats_counters s ON s.scope = e.scope AND s.key = e.key
+    WHERE s.value IS NOT e.value
+    UNION ALL
+    SELECT s.scope, s.key, NULL, s.value
+    FROM stats_counters s
+    LEFT JOIN stats_counters_expected e ON e.scope = s.scope AND e.key = s.key
+    WHERE e.scope IS NULL AND s.scope != 'meta'
+"""
+
+# Per-day rollups of closed days: one statement per table, each fed by the
+# present samples of the day grouped per device
+ROLLUP_DAY_SQL = """
+    WITH per_device AS (
+        SELECT device_id, COUNT(*) * :interval / 60.0 AS minutes
+        FROM presence_logs
+        WHERE timestamp >= :day AND timestamp < :next_day AND status = 'present'
+        GROUP BY device_id
+    )
+    INSERT INTO {table}
+    SELECT :day, COALESCE(di.{column}, ''), COUNT(*),
+           CAST(ROUND(AVG(p.minutes)) AS INTEGER)
+    FROM per_device p
+    LEFT JOIN device_info di ON di.device_id = p.device_id
+    GROUP BY 2
+"""
+
+# Downsampling of the presence tiers (see compact_presence), each fed by
+# the range [start, end) of the finer tier
+COMPACT_MINUTELY_SQL = """
+    INSERT INTO presence_minutely
+    SELECT t - t % 60, device_id, COUNT(*), MIN(t), MAX(t), SUM(rssi), MAX(rssi)
+    FROM (
+        SELECT device_id, CAST(strftime('%s', timestamp) AS INTEGER) AS t, rssi
+        FROM presence_logs
+        WHERE timestamp >= ? AND timestamp < ? AND status = 'present'
+    )
+    GROUP BY t - t % 60, device_id
+"""
+
+COMPACT_HOURLY_SQL = """
+    INSERT INTO presence_hourly
+    SELECT bucket - bucket % 3600, device_id, SUM(samples), MIN(first_seen),
+           MAX(last_seen), SUM(rssi_sum), MAX(rssi_max)
+    FROM presence_minutely
+    WHERE bucket >= ? AND bucket < ?
+    GROUP BY bucket - bucket % 3600, device_id
+"""
+
+# The retention cutoff (bound twice), held back to the minutely watermark
+RETENTION_CUTOFF_SQL = """MIN(?, COALESCE((
+    SELECT datetime(until, 'unixepoch')
+    FROM retention_watermarks WHERE tier = 'minutely'
+), ?))"""
+
+AUTO_VACUUM_INCREMENTAL = 2
+AUTO_VACUUM_MODES = {0: "none", 1: "full", AUTO_VACUUM_INCREMENTAL: "incremental"}
+
+
+def _hour_of(timestamp, default):
+    """Epoch seconds of the hour a stored DATETIME falls in."""
+    if timestamp is None:
+        return default
+    seconds = to_epoch(datetime.fromisoformat(timestamp))
+    return seconds - seconds % 3600
 
 
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect(Config.DATABASE_PATH)
-        self._init_db()
+    def __init__(self, read_only=False, pseudonymizer=None, clock=None):
+        self._pseudonymizer = pseudonymizer
+        self.clock = clock or SYSTEM_CLOCK  # Default timestamps and retention
+        if read_only:
+            # Readers never create or alter the schema
+            uri = Path(Config.DATABASE_PATH).absolute().as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True)
+        else:
+            self.conn = sqlite3.connect(Config.DATABASE_PATH)
+            self._init_db()
 
     def _init_db(self):
+        # A single PRAGMA read when the schema is current
+        migrations.migrate(self.conn)
+        pragmas = "PRAGMA foreign_keys = ON;"
+        if Config.DATABASE_WAL:
+            pragmas += " PRAGMA journal_mode = WAL;"
+        self.conn.executescript(pragmas)
+
+    def check_stats(self):
+        """Compare the stats counters with the raw tables.
+
+        Returns:
+            List of (scope, key, expected, stored) tuples for counters that
+            are out of sync; empty when the counters are consistent.
+        """
+        return self.conn.execute(STATS_MISMATCH_SQL).fetchall()
+
+    def rebuild_stats(self):
+        """Recompute all stats counters from the raw tables."""
         with self.conn:
-            self.conn.executescript(
-                """
-                PRAGMA foreign_keys = ON;
-
-                CREATE TABLE IF NOT EXISTS devices (
-                    device_id TEXT PRIMARY KEY,
-                    anonymous_id TEXT,
-                    first_seen DATETIME,
-                    last_seen DATETIME,
-                    status TEXT CHECK(
-                        status IN (
-                            'present',
-                            'absent',
-                            'departed'
-                        )
-                    )
-                );
-                CREATE TABLE IF NOT EXISTS presence_logs (
-                    log_id INTEGER PRIMARY KEY,
-                    device_id TEXT,
-                    timestamp DATETIME,
-                    status TEXT,
-                    rssi INTEGER,
-                    FOREIGN KEY(device_id) REFERENCES devices(device_id)
-                );
-                CREATE TABLE IF NOT EXISTS occupancy_aggregates (
-                    date DATE,
-                    hour INTEGER,
-                    present_count INTEGER,
-                    PRIMARY KEY(date, hour)
-                );
-
-                CREATE TABLE IF NOT EXISTS vendors (
-                    vendor_id INTEGER PRIMARY KEY,
-                    vendor_name TEXT NOT NULL,
-                    common_device_types TEXT
-                );
-
-                INSERT OR IGNORE INTO vendors VALUES
-                    (0x004C, 'Apple', 'iPhone,AirPods,Apple Watch'),
-                    (0x0006, 'Microsoft', 'Surface,Xbox'),
-                    (0x000F, 'Samsung', 'Galaxy Phones,Galaxy Watch'),
-                    (0x0015, 'Google', 'Pixel Phones,Pixel Buds'),
-                    (0x0075, 'Sony', 'PlayStation,Headphones'),
-                    (0x000D, 'Intel', 'Laptops,Tablets');
-
-                CREATE TABLE IF NOT EXISTS device_info (
-                    device_id TEXT PRIMARY KEY,
-                    device_name TEXT,
-                    device_type TEXT,
-                    vendor_id INTEGER,
-                    vendor_name TEXT,
-                    model_number TEXT,
-                    service_uuids TEXT,  -- JSON array of service UUIDs
-                    manufacturer_data TEXT,  -- JSON of manufacturer data
-                    tx_power INTEGER,
-                    appearance INTEGER,
-                    service_data TEXT,  -- JSON of service data
-                    first_detected DATETIME,
-                    last_detected DATETIME,
-                    FOREIGN KEY(device_id) REFERENCES devices(device_id),
-                    FOREIGN KEY(vendor_id) REFERENCES vendors(vendor_id)
-                );
-            """
+            self.conn.execute("DELETE FROM stats_counters")
+            self.conn.execute(
+                "INSERT INTO stats_counters SELECT * FROM stats_counters_expected"
             )
+            self.conn.execute(
+                "INSERT INTO stats_counters VALUES ('meta', 'initialized', 1)"
+            )
+
+    @property
+    def pseudonymizer(self):
+        # Created on first use: readers never need the key
+        if self._pseudonymizer is None:
+            self._pseudonymizer = Pseudonymizer.from_config(clock=self.clock.time)
+        return self._pseudonymizer
 
     def _anonymize_id(self, device_id):
         if Config.ANONYMIZE_DEVICES:
-            return hashlib.sha256(device_id.encode()).hexdigest()
+            return self.pseudonymizer.pseudonym(device_id)
         return device_id
 
+    def rekey_pseudonyms(self, batch_size=500):
+        """Rewrite devices.anonymous_id under the current key, in batches.
+
+        A generator: each step updates at most ``batch_size`` devices in its
+        own short transaction and yields the number of rows changed, so the
+        scan loop can run one step per cycle and ingestion never waits long.
+        Devices written in the meantime already get current pseudonyms.
+        """
+        if Config.ANONYMIZE_DEVICES:
+            self.pseudonymizer.refresh()
+            pseudonym = self.pseudonymizer.compute
+        else:
+            pseudonym = str
+        after = ""
+        while True:
+            rows = self.conn.execute(
+                """SELECT device_id, anonymous_id FROM devices
+                   WHERE device_id > ? ORDER BY device_id LIMIT ?""",
+                (after, batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            updates = []
+            for device_id, anonymous_id in rows:
+                new_id = pseudonym(device_id)
+                if new_id != anonymous_id:
+                    updates.append((new_id, device_id))
+            if updates:
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE devices SET anonymous_id = ? WHERE device_id = ?",
+                        updates,
+                    )
+            after = rows[-1][0]
+            yield len(updates)
+
     def log_presence(self, device_id, status, rssi=None):
         anonymous_id = self._anonymize_id(device_id)
-        timestamp = datetime.now()
+        timestamp = self.clock.now()
 
         with self.conn:
             # Update or insert device
             self.conn.execute(
-                """
-                INSERT INTO devices (
-                    device_id,
-                    anonymous_id,
-                    first_seen,
-                    last_seen,
-                    status
-                ) VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(device_id) DO UPDATE SET
-                    last_seen = excluded.last_seen,
-                    status = excluded.status
-            """,
+                UPSERT_DEVICE_SQL,
                 (device_id, anonymous_id, timestamp, timestamp, status.value),
             )
 
             # Log presence event
             self.conn.execute(
-                """
-                INSERT INTO presence_logs (
+                INSERT_PRESENCE_LOG_SQL,
+                (device_id, timestamp, status.value, rssi),
+            )
+
+    def log_presence_batch(self, entries, timestamp=None):
+        """Log many presence updates in a single transaction.
+
+        Args:
+            entries: Iterable of (device_id, DeviceStatus, rssi) tuples.
+            timestamp: Time recorded for every entry. Defaults to now.
+
+        Returns:
+            Dict of device_id -> stored anonymous_id (the device_id itself
+            when anonymization is off).
+        """
+        timestamp = timestamp or self.clock.now()
+        if Config.ANONYMIZE_DEVICES:
+            self.pseudonymizer.refresh()
+        device_rows = []
+        log_rows = []
+        for device_id, status, rssi in entries:
+            device_rows.append(
+                (
                     device_id,
+                    self._anonymize_id(device_id),
                     timestamp,
-                    status,
-                    rssi
-                ) VALUES (?, ?, ?, ?)
-            """,
-                (device_id, timestamp, status.value, rssi),
+                    timestamp,
+                    status.value,
+                )
+            )
+            log_rows.append((device_id, timestamp, status.value, rssi))
+        if not log_rows:
+            return {}
+
+        with self.conn:
+            self.conn.executemany(UPSERT_DEVICE_SQL, device_rows)
+            self.conn.executemany(INSERT_PRESENCE_LOG_SQL, log_rows)
+        return {row[0]: row[1] for row in device_rows}
+
+    def log_zone_events(self, changes, timestamp=None):
+        """Log zone changes in a single transaction.
+
+        Args:
+            changes: Iterable of (device_id, zone) tuples; zone None records
+                that the device left every zone.
+            timestamp: Time recorded for every change. Defaults to now.
+        """
+        timestamp = timestamp or self.clock.now()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO zone_events (device_id, timestamp, zone) VALUES (?, ?, ?)",
+                [(device_id, timestamp, zone) for device_id, zone in changes],
             )
 
     def cleanup_old_data(self):
-        cutoff = datetime.now() - timedelta(days=Config.DATA_RETENTION_DAYS)
+        cutoff = self.clock.now() - timedelta(days=Config.DATA_RETENTION_DAYS)
         with self.conn:
+            # Logs not yet rolled up into the minutely tier are kept until
+            # compact_presence() has caught up with them, and so are their
+            # devices, which the logs reference
             self.conn.execute(
-                "DELETE FROM presence_logs WHERE timestamp < ?", (cutoff,)
+                f"""
+                DELETE FROM presence_logs
+                WHERE timestamp < {RETENTION_CUTOFF_SQL}
+            """,
+                (cutoff, cutoff),
             )
+            # Before the devices it references
             self.conn.execute(
-                """
+                f"DELETE FROM device_info WHERE last_detected < {RETENTION_CUTOFF_SQL}",
+                (cutoff, cutoff),
+            )
+            self.conn.execute(
+                f"""
                 DELETE FROM devices
-                WHERE last_seen < ?
+                WHERE last_seen < {RETENTION_CUTOFF_SQL}
                 AND status = 'departed'
             """,
-                (cutoff,),
-            )
-            self.conn.execute(
-                "DELETE FROM device_info WHERE last_detected < ?", (cutoff,)
+                (cutoff, cutoff),
             )
 
+    def compact_presence(self, hours=None, now=None):
+        """Roll ageing presence data up into the next coarser tier.
+
+        Raw logs are summarized per device and minute a day before they
+        expire, minutely summaries per device and hour once they are older
+        than ``MINUTELY_RETENTION_DAYS``, and hourly summaries older than
+        ``HOURLY_RETENTION_DAYS`` are deleted. Each tier advances by at most
+        ``hours`` per call, so a backlog is worked off over several cycles.
+
+        Returns:
+            Rows written to the (minutely, hourly) tiers and hourly rows expired.
+        """
+        step = (hours or Config.COMPACTION_HOURS_PER_CYCLE) * 3600
+        now = now or self.clock.now()
+        minutely_until, hourly_until = self.retention_watermarks()
+
+        target = to_epoch(now - timedelta(days=Config.DATA_RETENTION_DAYS - 1))
+        target -= target % 3600
+        (first,) = self.conn.execute(
+            "SELECT MIN(timestamp) FROM presence_logs WHERE timestamp >= ?",
+            (from_epoch(minutely_until),),
+        ).fetchone()
+        # Skip stretches without logs instead of stepping through them
+        start = _hour_of(first, target)
+        end = min(target, max(minutely_until, start) + step)
+        minutely = 0
+        if end > minutely_until:
+            with self.conn:
+                # Raw timestamps are compared as text
+                minutely = self.conn.execute(
+                    COMPACT_MINUTELY_SQL, (from_epoch(minutely_until), from_epoch(end))
+                ).rowcount
+                self._set_watermark("minutely", end)
+            minutely_until = end
+
+        target = to_epoch(now - timedelta(days=Config.MINUTELY_RETENTION_DAYS))
+        target = min(target - target % 3600, minutely_until)
+        (first,) = self.conn.execute(
+            "SELECT MIN(bucket) FROM presence_minutely WHERE bucket >= ?",
+            (hourly_until,),
+        ).fetchone()
+        start = target if first is None else first - first % 3600
+        end = min(target, max(hourly_until, start) + step)
+        hourly = 0
+        if end > hourly_until:
+            with self.conn:
+                hourly = self.conn.execute(
+                    COMPACT_HOURLY_SQL, (hourly_until, end)
+                ).rowcount
+                self.conn.execute(
+                    "DELETE FROM presence_minutely WHERE bucket < ?", (end,)
+                )
+                self._set_watermark("hourly", end)
+
+        expired = 0
+        if Config.HOURLY_RETENTION_DAYS:
+            cutoff = to_epoch(now - timedelta(days=Config.HOURLY_RETENTION_DAYS))
+            with self.conn:
+                expired = self.conn.execute(
+                    "DELETE FROM presence_hourly WHERE bucket < ?", (cutoff,)
+                ).rowcount
+        return minutely, hourly, expired
+
+    def _set_watermark(self, tier, until):
+        self.conn.execute(
+            "UPDATE retention_watermarks SET until = ? WHERE tier = ?", (until, tier)
+        )
+
+    def retention_watermarks(self):
+        """Epoch seconds before which presence is read from the minutely and
+        hourly tiers respectively."""
+        marks = dict(self.conn.execute("SELECT tier, until FROM retention_watermarks"))
+        return marks["minutely"], marks["hourly"]
+
+    def rollup_daily_stats(self, today=None):
+        """Roll closed days up into vendor_stats and device_type_stats.
+
+        A day is (re)processed when its presence log count, read from the
+        hourly stats counters, differs from the count at its last rollup.
+        Days that retention has started purging are left untouched, so
+        their rollups outlive the raw logs.
+
+        Returns:
+            ISO dates of the days that were rolled up.
+        """
+        today = today or self.clock.today()
+        oldest = today - timedelta(days=Config.DATA_RETENTION_DAYS - 1)
+        with self.conn:
+            changed = self.conn.execute(
+                """
+                SELECT h.day, h.log_count
+                FROM (
+                    SELECT substr(key, 1, 10) AS day, SUM(value) AS log_count
+                    FROM stats_counters
+                    WHERE scope = 'hourly' AND key >= ? AND key < ?
+                    GROUP BY day
+                ) h
+                LEFT JOIN rollup_days r ON r.date = h.day
+                WHERE r.log_count IS NOT h.log_count
+                ORDER BY h.day
+            """,
+                (oldest.isoformat(), today.isoformat()),
+            ).fetchall()
+            for day, log_count in changed:
+                params = {
+                    "day": day,
+                    "next_day": (
+                        date.fromisoformat(day) + timedelta(days=1)
+                    ).isoformat(),
+                    "interval": Config.SCAN_INTERVAL,
+                }
+                for table, column in (
+                    ("vendor_stats", "vendor_name"),
+                    ("device_type_stats", "device_type"),
+                ):
+                    self.conn.execute(f"DELETE FROM {table} WHERE date = ?", (day,))
+                    self.conn.execute(
+                        ROLLUP_DAY_SQL.format(table=table, column=column), params
+                    )
+                self.conn.execute(
+                    """INSERT INTO rollup_days VALUES (?, ?)
+                       ON CONFLICT(date) DO UPDATE
+                       SET log_count = excluded.log_count""",
+                    (day, log_count),
+                )
+        return [day for day, _ in changed]
+
+    def _pragma(self, name):
+        return self.conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+    def incremental_vacuum(self, pages):
+        """Return up to ``pages`` free pages to the filesystem.
+
+        Only frees pages when the database uses ``auto_vacuum=INCREMENTAL``.
+
+        Returns:
+            Number of pages freed.
+        """
+        before = self._pragma("freelist_count")
+        if not before or self._pragma("auto_vacuum") != AUTO_VACUUM_INCREMENTAL:
+            return 0
+        # Frees one page per step; execute() steps a statement without
+        # result columns only once, executescript() runs it to completion
+        self.conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        return before - self._pragma("freelist_count")
+
+    def optimize(self):
+        """Refresh the query planner statistics where they are stale."""
+        if not self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone():
+            self.conn.execute("ANALYZE")  # Never analyzed: optimize would skip
+        self.conn.execute("PRAGMA optimize")
+
+    def checkpoint(self):
+        """Copy the write-ahead log into the database file and truncate it.
+
+        Returns:
+            (busy, WAL pages, pages checkpointed); (0, -1, -1) without WAL.
+        """
+        return tuple(self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+
+    def vacuum(self):
+        """Rebuild the whole file, switching to incremental auto-vacuum.
+
+        Holds an exclusive lock for the duration, so it is meant for a
+        maintenance window rather than the scan loop.
+
+        Returns:
+            Page counts (before, after).
+        """
+        before = self._pragma("page_count")
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("VACUUM")
+        return before, self._pragma("page_count")
+
+    def health(self):
+        """Page-level storage statistics.
+
+        Returns:
+            Dict with the file's page size and counts, auto-vacuum and
+            journal modes, and ``objects``: per table and index, its pages,
+            bytes, unused bytes and fragmentation (share of pages not
+            following their predecessor in b-tree order), largest first.
+        """
+        health = {
+            "page_size": self._pragma("page_size"),
+            "page_count": self._pragma("page_count"),
+            "freelist_count": self._pragma("freelist_count"),
+            "auto_vacuum": AUTO_VACUUM_MODES.get(self._pragma("auto_vacuum")),
+            "journal_mode": self._pragma("journal_mode"),
+        }
+        objects = {}
+        previous = None
+        for name, pageno, pgsize, unused in self.conn.execute(
+            "SELECT name, pageno, pgsize, unused FROM dbstat ORDER BY name, path"
+        ):
+            stats = objects.get(name)
+            if stats is None:
+                stats = objects[name] = {
+                    "name": name,
+                    "pages": 0,
+                    "bytes": 0,
+                    "unused_bytes": 0,
+                    "gaps": 0,
+                }
+            elif pageno != previous + 1:
+                stats["gaps"] += 1
+            stats["pages"] += 1
+            stats["bytes"] += pgsize
+            stats["unused_bytes"] += unused
+            previous = pageno
+        for stats in objects.values():
+            gaps = stats.pop("gaps")
+            stats["fragmentation"] = gaps / (stats["pages"] - 1 or 1)
+        health["objects"] = sorted(
+            objects.values(), key=lambda stats: stats["bytes"], reverse=True
+        )
+        return health
+
     def _get_vendor_info(self, vendor_id):
         """Lookup vendor info by ID"""
         if not vendor_id:
@@ -153,17 +556,49 @@ class Database:
 
     def log_device_info(self, device_id, device_info):
         """Log or update device information with BLE characteristics"""
-        now = datetime.now()
+        now = self.clock.now()
 
         # Ensure device exists in devices table first
         with self.conn:
             self.conn.execute(
-                """INSERT OR IGNORE INTO devices
-                   (device_id, anonymous_id, first_seen, last_seen, status)
-                   VALUES (?, ?, ?, ?, ?)""",
+                INSERT_DEVICE_IF_MISSING_SQL,
                 (device_id, self._anonymize_id(device_id), now, now, "present"),
             )
 
+        with self.conn:
+            self.conn.execute(
+                UPSERT_DEVICE_INFO_SQL,
+                self._device_info_row(device_id, device_info, now),
+            )
+
+    def log_device_info_batch(self, entries, timestamp=None):
+        """Log device information for many devices in a single transaction.
+
+        Args:
+            entries: Iterable of (device_id, device_info) tuples.
+            timestamp: Detection time recorded for every entry. Defaults to now.
+        """
+        now = timestamp or self.clock.now()
+        entries = list(entries)
+        if not entries:
+            return
+        with self.conn:
+            self.conn.executemany(
+                INSERT_DEVICE_IF_MISSING_SQL,
+                [
+                    (device_id, self._anonymize_id(device_id), now, now, "present")
+                    for device_id, _ in entries
+                ],
+            )
+            self.conn.executemany(
+                UPSERT_DEVICE_INFO_SQL,
+                [
+                    self._device_info_row(device_id, device_info, now)
+                    for device_id, device_info in entries
+                ],
+            )
+
+    def _device_info_row(self, device_id, device_info, now):
         # Extract vendor info
         # Use None for vendor_id to not interfere with foreign key constraints
         # The vendor ID should only be used internally for lookups
@@ -177,72 +612,36 @@ class Database:
             vendor_name = vendor_name if vendor_name is not None else v_name
             device_type = device_type if device_type is not None else d_type
 
-        with self.conn:
-            self.conn.execute(
-                """
-                INSERT INTO device_info (
-                    device_id,
-                    device_name,
-                    device_type,
-                    vendor_name,
-                    vendor_id,
-                    model_number,
-                    service_uuids,
-                    manufacturer_data,
-                    tx_power,
-                    appearance,
-                    service_data,
-                    first_detected,
-                    last_detected
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(device_id) DO UPDATE SET
-                    device_name = excluded.device_name,
-                    device_type = excluded.device_type,
-                    vendor_name = excluded.vendor_name,
-                    model_number = excluded.model_number,
-                    vendor_id = excluded.vendor_id,
-                    service_uuids = excluded.service_uuids,
-                    manufacturer_data = excluded.manufacturer_data,
-                    tx_power = excluded.tx_power,
-                    appearance = excluded.appearance,
-                    service_data = excluded.service_data,
-                    last_detected = excluded.last_detected
-            """,
-                (
-                    device_id,
-                    device_info.get("device_name"),
-                    device_info.get("device_type") or device_type,
-                    vendor_name,
-                    vendor_id,
-                    device_info.get("model_number"),
-                    json.dumps(device_info.get("service_uuids", [])),
-                    (
-                        json.dumps(
-                            {
-                                k: v.hex() if isinstance(v, bytes) else v
-                                for k, v in (
-                                    device_info.get("manufacturer_data") or {}
-                                ).items()
-                            }
-                        )
-                        if device_info.get("manufacturer_data")
-                        else None
-                    ),
-                    device_info.get("tx_power"),
-                    device_info.get("appearance"),
-                    (
-                        json.dumps(
-                            {
-                                k: v.hex() if isinstance(v, bytes) else v
-                                for k, v in (
-                                    device_info.get("service_data") or {}
-                                ).items()
-                            }
-                        )
-                        if device_info.get("service_data")
-                        else None
-                    ),
-                    now,
-                    now,
-                ),
-            )
+        return (
+            device_id,
+            device_info.get("device_name"),
+            device_info.get("device_type") or device_type,
+            vendor_name,
+            vendor_id,
+            device_info.get("model_number"),
+            json.dumps(device_info.get("service_uuids", [])),
+            (
+                json.dumps(
+                    {
+                        k: v.hex() if isinstance(v, bytes) else v
+                        for k, v in (device_info.get("manufacturer_data") or {}).items()
+                    }
+                )
+                if device_info.get("manufacturer_data")
+                else None
+            ),
+            device_info.get("tx_power"),
+            device_info.get("appearance"),
+            (
+                json.dumps(
+                    {
+                        k: v.hex() if isinstance(v, bytes) else v
+                        for k, v in (device_info.get("service_data") or {}).items()
+                    }
+                )
+                if device_info.get("service_data")
+                else None
+            ),
+            now,
+            now,
+        )
@@ -0,0 +1,153 @@
+"""Minimal asyncio HTTP/1.1 server for local read-only endpoints.
+
+Only what the scan process needs: ``GET``/``HEAD`` requests, exact-path
+routing and one request per connection. It runs on the application's event
+loop so handlers can read in-memory state without locking.
+"""
+
+import asyncio
+import inspect
+import logging
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Union
+from urllib.parse import parse_qsl, urlsplit
+
+MAX_REQUEST_LINE = 8192
+MAX_HEADERS = 64
+READ_TIMEOUT = 5.0  # seconds
+
+_REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class Request(NamedTuple):
+    """A parsed HTTP request."""
+
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]  # Lower-cased header names
+
+
+class Response(NamedTuple):
+    """An HTTP response to be serialized by the server."""
+
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Dict[str, str] = {}
+
+
+Handler = Callable[[Request], Union[Response, Awaitable[Response]]]
+
+
+class HTTPServer:
+    """Serves registered routes on a local TCP port."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.logger = logging.getLogger(__name__)
+        self._routes: Dict[str, Handler] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, path: str, handler: Handler) -> None:
+        """Register a handler for an exact request path."""
+        self._routes[path] = handler
+
+    async def start(self) -> None:
+        """Start listening. A port of 0 picks a free port."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        sockname = self._server.sockets[0].getsockname()
+        self.port = sockname[1]
+        self.logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        """Stop accepting connections and wait for the listener to close."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await asyncio.wait_for(
+                self._read_request(reader), timeout=READ_TIMEOUT
+            )
+            if request is None:
+                response = Response(400, b"Bad Request\n")
+            else:
+                response = await self._dispatch(request)
+            self._write_response(
+                writer, response, head_only=bool(request and request.method == "HEAD")
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        request_line = await reader.readline()
+        if not request_line or len(request_line) > MAX_REQUEST_LINE:
+            return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            return None
+        method, target, _version = parts
+
+        headers: Dict[str, str] = {}
+        for _ in range(MAX_HEADERS):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers)
+
+    async def _dispatch(self, request: Request) -> Response:
+        if request.method not in ("GET", "HEAD"):
+            return Response(405, b"Method Not Allowed\n", headers={"Allow": "GET"})
+        handler = self._routes.get(request.path)
+        if handler is None:
+            return Response(404, b"Not Found\n")
+        try:
+            result = handler(request)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            self.logger.error(f"Error serving {request.path}: {e}", exc_info=True)
+            return Response(500, b"Internal Server Error\n")
+
+    @staticmethod
+    def _write_response(
+        writer: asyncio.StreamWriter, response: Response, head_only: bool = False
+    ) -> None:
+        reason = _REASONS.get(response.status, "")
+        lines = [f"HTTP/1.1 {response.status} {reason}"]
+        headers = {
+            "Content-Type": response.content_type,
+            "Content-Length": str(len(response.body)),
+            "Connection": "close",
+        }
+        headers.update(response.headers)
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        writer.write(head if head_only else head + response.body)
@@ -0,0 +1,335 @@
+"""Sensor to aggregator ingestion for multi-room deployments.
+
+A sensor runs only the BLE scanner and pushes each scan as one frame to the
+aggregator over TCP (``host:port``) or a Unix socket (``unix:/path``). The
+aggregator merges the frames of all sensors into a window, keeping the
+strongest sighting of each device, and hands the window to a single
+``PresenceTracker`` as if it were one scan. A device seen by several sensors
+is therefore one device with one presence row per cycle, written with the
+tracker's bulk inserts.
+
+Windows follow the sensors' frames rather than a timer, which would drift
+against the sensors' own scan cadence and come up empty or with two scans of
+a sensor. A window closes once every sensor that reported recently has sent
+a frame into it, or when a sensor sends a second frame (which starts the
+next window), or ``AGGREGATOR_GRACE_SECONDS`` after a scan interval when a
+sensor stays silent.
+
+Frame layout (little-endian)::
+
+    length       u32, followed by ``length`` bytes of zlib-compressed body
+
+Body::
+
+    version      u8        FRAME_VERSION
+    sensor_len   u8
+    n_devices    u16
+    scan_time    f64       scan start time (epoch seconds)
+    sensor       sensor_len bytes (UTF-8)
+    device*      capture record (see ``capture.py``), then name_len u8,
+                 name (UTF-8), n_uuids u8, n_uuids x (uuid_len u8, uuid ASCII)
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import struct
+import zlib
+from datetime import datetime
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from fablab_visitor_logger import metrics
+from fablab_visitor_logger.capture import CaptureRecord, encode_record
+from fablab_visitor_logger.clock import SYSTEM_CLOCK, Clock
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.vendor import get_vendor
+
+FRAME_VERSION = 1
+MAX_FRAME_BYTES = 4 * 1024 * 1024  # Larger frames are rejected
+MAX_DEVICES_PER_FRAME = 0xFFFF
+
+_LENGTH = struct.Struct("<I")
+_FRAME_HEADER = struct.Struct("<BBHd")
+
+
+class Frame(NamedTuple):
+    """One sensor scan."""
+
+    sensor: str
+    scan_time: float
+    devices: List[Dict[str, Any]]  # scanner.DeviceData
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """Split ``unix:/path`` or ``host:port`` into ("unix", path) or ("tcp", ...)."""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:") :]
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"Expected host:port or unix:/path, got {address!r}")
+    return "tcp", (host or "0.0.0.0", int(port))
+
+
+def _short_string(value: Optional[str], encoding: str = "utf-8") -> bytes:
+    data = (value or "").encode(encoding, "replace")[:255]
+    return bytes((len(data),)) + data
+
+
+def encode_frame(
+    sensor: str, scan_time: float, devices: Sequence[Dict[str, Any]]
+) -> bytes:
+    """Encode one scan's devices as a length-prefixed, compressed frame."""
+    sensor_bytes = sensor.encode()[:255]
+    devices = devices[:MAX_DEVICES_PER_FRAME]
+    parts = [
+        _FRAME_HEADER.pack(FRAME_VERSION, len(sensor_bytes), len(devices), scan_time),
+        sensor_bytes,
+    ]
+    for device in devices:
+        parts.append(
+            encode_record(
+                scan_time,
+                device["mac_address"],
+                device["rssi"],
+                device.get("tx_power"),
+                {
+                    int(k): bytes.fromhex(v)
+                    for k, v in (device.get("manufacturer_data") or {}).items()
+                },
+                {
+                    k: bytes.fromhex(v)
+                    for k, v in (device.get("service_data") or {}).items()
+                },
+            )
+        )
+        parts.append(_short_string(device.get("device_name")))
+        uuids = list(device.get("service_uuids") or [])[:255]
+        parts.append(bytes((len(uuids),)))
+        parts.extend(_short_string(uuid, "ascii") for uuid in uuids)
+    body = zlib.compress(b"".join(parts))
+    return _LENGTH.pack(len(body)) + body
+
+
+def decode_frame(payload: bytes) -> Frame:
+    """Decode a frame body (without its length prefix).
+
+    Raises:
+        ValueError: If the frame is corrupt or of an unknown version.
+    """
+    try:
+        body = memoryview(zlib.decompress(payload))
+        version, sensor_len, n_devices, scan_time = _FRAME_HEADER.unpack_from(body)
+        if version != FRAME_VERSION:
+            raise ValueError(f"Unsupported frame version {version}")
+        offset = _FRAME_HEADER.size
+        sensor = str(body[offset : offset + sensor_len], "utf-8")
+        offset += sensor_len
+        timestamp = datetime.fromtimestamp(scan_time).isoformat()
+        devices = []
+        for _ in range(n_devices):
+            (length,) = _LENGTH.unpack_from(body, offset)
+            offset += _LENGTH.size
+            record = CaptureRecord(body[offset : offset + length])
+            offset += length
+            name_len = body[offset]
+            name = str(body[offset + 1 : offset + 1 + name_len], "utf-8")
+            offset += 1 + name_len
+            uuids = []
+            for _ in range(body[offset]):
+                uuid_len = body[offset + 1]
+                uuids.append(str(body[offset + 2 : offset + 2 + uuid_len], "ascii"))
+                offset += 1 + uuid_len
+            offset += 1
+            manufacturer, service = record.sections()
+            address = record.address
+            devices.append(
+                {
+                    "mac_address": address,
+                    "rssi": record.rssi,
+                    "timestamp": timestamp,
+                    "device_name": name or None,
+                    "vendor": get_vendor(address),
+                    "service_uuids": uuids,
+                    "manufacturer_data": {k: v.hex() for k, v in manufacturer.items()},
+                    "tx_power": record.tx_power,
+                    "service_data": {k: v.hex() for k, v in service.items()},
+                }
+            )
+    except (zlib.error, struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Corrupt frame: {e}") from e
+    return Frame(sensor, scan_time, devices)
+
+
+class Aggregator:
+    """Receives sensor frames and serves merged windows in place of a scanner.
+
+    ``scan()`` waits for the next window to close, then returns every device
+    reported by any sensor during it, each with its strongest RSSI. Each
+    device also carries ``sensor_rssi``, its strongest RSSI per sensor, for
+    zone assignment. Windows that close while the tracker is busy are queued,
+    so every frame is tracked exactly once.
+    """
+
+    def __init__(self, address: str, clock: Clock = SYSTEM_CLOCK) -> None:
+        self.address = address
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self.frames = 0
+        self.sensors: Dict[str, float] = {}  # Last frame time per sensor
+        self._window: Dict[str, Dict[str, Any]] = {}
+        self._window_sensors: Set[str] = set()  # Sensors in the open window
+        self._expected: Set[str] = set()  # Sensors the open window waits for
+        self._closed: Deque[List[Dict[str, Any]]] = collections.deque()
+        self._window_closed = asyncio.Event()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Start listening. A TCP port of 0 picks a free port."""
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.unlink(target)  # Stale socket from a previous run
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, target
+            )
+        else:
+            host, port = target
+            self._server = await asyncio.start_server(
+                self._handle_connection, host, port
+            )
+            port = self._server.sockets[0].getsockname()[1]
+            self.address = f"{host}:{port}"
+        self.logger.info(f"Aggregator listening on {self.address}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def scan(self, duration: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Wait for the next window to close and return its merged devices."""
+        if not self._closed:
+            interval = duration if duration is not None else Config.SCAN_INTERVAL
+            self._window_closed.clear()
+            waiter = asyncio.ensure_future(self._window_closed.wait())
+            timer = asyncio.ensure_future(
+                self.clock.sleep(interval + Config.AGGREGATOR_GRACE_SECONDS)
+            )
+            try:
+                await asyncio.wait((waiter, timer), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+                timer.cancel()
+            if not self._closed:
+                missing = self._expected - self._window_sensors
+                if missing:
+                    self.logger.debug(
+                        f"Window closed without frames from {sorted(missing)}"
+                    )
+                self._close_window()
+        return self._closed.popleft()
+
+    def take_window(self) -> List[Dict[str, Any]]:
+        """Close the open window now and return the oldest closed one."""
+        self._close_window()
+        return self._closed.popleft()
+
+    def _close_window(self) -> None:
+        self._closed.append(list(self._window.values()))
+        self._window = {}
+        self._window_sensors = set()
+        # The next window waits for every sensor heard from recently
+        horizon = 2 * Config.SCAN_INTERVAL + Config.AGGREGATOR_GRACE_SECONDS
+        now = self.clock.time()
+        self._expected = {s for s, t in self.sensors.items() if now - t <= horizon}
+        self._window_closed.set()
+
+    def add_frame(self, frame: Frame) -> None:
+        """Merge a frame into the open window, closing it when complete."""
+        sensor = frame.sensor
+        if sensor in self._window_sensors:
+            self._close_window()  # The sensor's next scan: a new window
+        window = self._window
+        for device in frame.devices:
+            mac = device["mac_address"]
+            rssi = device["rssi"]
+            seen = window.get(mac)
+            if seen is None:
+                device["sensor_rssi"] = {sensor: rssi}
+                window[mac] = device
+                continue
+            readings = seen["sensor_rssi"]
+            if rssi > readings.get(sensor, rssi - 1):
+                readings[sensor] = rssi
+            if rssi > seen["rssi"]:
+                device["sensor_rssi"] = readings
+                window[mac] = device
+        self.sensors[sensor] = self.clock.time()
+        self._window_sensors.add(sensor)
+        self.frames += 1
+        metrics.INGEST_FRAMES_TOTAL.inc()
+        if self._expected and self._window_sensors >= self._expected:
+            self._close_window()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_LENGTH.size)
+                except asyncio.IncompleteReadError:
+                    break  # Sensor disconnected between frames
+                (length,) = _LENGTH.unpack(header)
+                if length > MAX_FRAME_BYTES:
+                    raise ValueError(f"Frame of {length} bytes exceeds the limit")
+                self.add_frame(decode_frame(await reader.readexactly(length)))
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            metrics.INGEST_REJECTED_FRAMES_TOTAL.inc()
+            self.logger.warning(f"Dropping sensor connection: {e}")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class SensorClient:
+    """Pushes frames to the aggregator, reconnecting after failures."""
+
+    def __init__(self, address: str, sensor: str) -> None:
+        self.address = address
+        self.sensor = sensor
+        self.logger = logging.getLogger(__name__)
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def send(self, frame: bytes) -> bool:
+        """Send one frame; returns False (and drops it) if it could not be sent."""
+        try:
+            if self._writer is None:
+                self._writer = await self._connect()
+            self._writer.write(frame)
+            await self._writer.drain()
+            return True
+        except OSError as e:
+            self.logger.warning(f"Could not send frame to {self.address}: {e}")
+            await self.close()
+            return False
+
+    async def close(self) -> None:
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            _, writer = await asyncio.open_unix_connection(target)
+        else:
+            _, writer = await asyncio.open_connection(*target)
+        return writer
@@ -1,48 +1,118 @@
-"""Main application entry point for the FabLab Visitor Logger."""
+"""Main application entry point for the FabLab Visitor Logger.
+
+Only what every subcommand needs is imported at module load. The scan
+subsystems (Bleak and its D-Bus backend, asyncio, the async database
+facade, the HTTP API, the write spool and database maintenance) are
+resolved on first use through ``_lazy``, so ``report`` commands start
+without loading them. ``metrics`` is deferred too, although reporting
+still imports it (cheaply) for its cache counters.
+"""
 
 import argparse
-import asyncio  # Import asyncio
+import functools
+import importlib
 import logging
 import signal
 import sys
-import time  # Keep time for time.time()
 
-from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.clock import SYSTEM_CLOCK
+from fablab_visitor_logger.config import Config, ConfigError
 from fablab_visitor_logger.database import Database
 
 # Import Reporter here for report mode handling
-from fablab_visitor_logger.reporting import Reporter
-from fablab_visitor_logger.scanner import BLEScanner, PresenceTracker
+from fablab_visitor_logger.reporting import (
+    Reporter,
+    add_report_commands,
+    run_report_command,
+    writes_database,
+)
+
+# Module attributes imported on first access: name -> (module, attribute)
+_LAZY_IMPORTS = {
+    "asyncio": ("asyncio", None),
+    "asyncdb": ("fablab_visitor_logger.asyncdb", None),
+    "BLEScanner": ("fablab_visitor_logger.scanner", "BLEScanner"),
+    "PresenceTracker": ("fablab_visitor_logger.scanner", "PresenceTracker"),
+    "PresenceAPI": ("fablab_visitor_logger.api", "PresenceAPI"),
+    "DatabaseMaintenance": (
+        "fablab_visitor_logger.maintenance",
+        "DatabaseMaintenance",
+    ),
+    "metrics": ("fablab_visitor_logger.metrics", None),
+    "spool": ("fablab_visitor_logger.spool", None),
+}
+
+
+def __getattr__(name):
+    """Resolve lazily imported names, e.g. for ``patch("...main.BLEScanner")``."""
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+def _lazy(name):
+    # Globals first, so names patched on this module take precedence
+    return globals()[name] if name in globals() else __getattr__(name)
 
 
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description="FabLab Visitor Logger")
+    parser.add_argument(
+        "--config",
+        help="dotenv-style settings file (default: $FABLAB_CONFIG); "
+        "FABLAB_* environment variables override it",
+    )
     subparsers = parser.add_subparsers(dest="mode", required=True)
 
     # Scan mode (default behavior)
     subparsers.add_parser("scan", help="Run continuous scanning")
 
-    # Report mode
-    report_parser = subparsers.add_parser("report", help="Reporting commands")
-    report_subparsers = report_parser.add_subparsers(dest="command", required=True)
+    # Replay mode: re-run raw advertisement captures through the tracker
+    replay_parser = subparsers.add_parser(
+        "replay", help="Replay raw advertisement captures through the tracker"
+    )
+    replay_parser.add_argument(
+        "captures", nargs="+", help="Capture segment files or directories"
+    )
+    replay_parser.add_argument(
+        "--database",
+        default="replay.db",
+        help="Database to write replayed presence to (default: replay.db)",
+    )
+    replay_parser.add_argument(
+        "--rssi-threshold", type=int, help="Override Config.RSSI_THRESHOLD"
+    )
 
-    # List devices command
-    list_parser = report_subparsers.add_parser(
-        "list-devices", help="List all detected devices"
+    # Multi-node mode: sensors scan and push, the aggregator tracks and writes
+    sensor_parser = subparsers.add_parser(
+        "sensor", help="Scan and push every scan to an aggregator"
+    )
+    sensor_parser.add_argument(
+        "--aggregator",
+        help="host:port or unix:/path (default: Config.AGGREGATOR_ADDRESS)",
+    )
+    sensor_parser.add_argument(
+        "--sensor-id", help="Name of this sensor (default: host name)"
     )
-    list_parser.add_argument(
-        "--active", action="store_true", help="Show only active devices"
+    aggregate_parser = subparsers.add_parser(
+        "aggregate", help="Track presence from the scans of several sensors"
+    )
+    aggregate_parser.add_argument(
+        "--listen",
+        help="host:port or unix:/path (default: Config.AGGREGATOR_ADDRESS)",
     )
 
-    # Stats command
-    report_subparsers.add_parser("stats", help="Show visitor statistics")
+    # Report mode
+    report_parser = subparsers.add_parser("report", help="Reporting commands")
+    report_subparsers = report_parser.add_subparsers(dest="command", required=True)
 
-    # Export command
-    export_parser = report_subparsers.add_parser(
-        "export-csv", help="Export data to CSV"
-    )
-    export_parser.add_argument("output_path", help="Path to output CSV file")
+    add_report_commands(report_subparsers)
 
     return parser.parse_args()
 
@@ -51,30 +121,86 @@ class PresenceMonitoringApp:
     """Manages the presence monitoring application lifecycle."""
 
     # Modify __init__ to allow dependency injection for testing
-    def __init__(self, scanner=None, db=None, tracker=None):
+    def __init__(
+        self,
+        scanner=None,
+        db=None,
+        tracker=None,
+        metrics_exporter=None,
+        api=None,
+        clock=None,
+    ):
         """Initialize the Presence Monitoring Application.
 
 
         Args:
             scanner: Optional BLEScanner instance for dependency injection.
-            db: Optional Database instance for dependency injection.
+            db: Optional Database or AsyncDatabase for dependency injection;
+                defaults to an AsyncDatabase closed when run() returns.
             tracker: Optional PresenceTracker instance for dependency injection.
+            metrics_exporter: Optional MetricsExporter; defaults to one built
+                from Config (disabled unless a port or textfile is set).
+            api: Optional PresenceAPI; defaults to one built from Config
+                (disabled unless API_PORT is set).
+            clock: Optional Clock for the loop and the default scanner,
+                database and tracker; defaults to the system clock.
         """
         Config.setup_logging()
         self.logger = logging.getLogger(__name__)
         self.running = False
+        self.clock = clock or SYSTEM_CLOCK
         # Use injected dependencies if provided, otherwise create defaults
-        self.scanner = scanner if scanner is not None else BLEScanner()
-        self.db = db if db is not None else Database()
+        self.scanner = (
+            scanner if scanner is not None else _lazy("BLEScanner")(clock=self.clock)
+        )
+        self._owns_db = db is None
+        self.db = (
+            db
+            if db is not None
+            else _lazy("asyncdb").AsyncDatabase(
+                functools.partial(Database, clock=self.clock)
+            )
+        )
+        # Only used by functions run through asyncdb.run(self.db, ...)
+        self._database = _lazy("asyncdb").unwrap(self.db)
         # Use injected tracker if provided, otherwise create default
         # Ensure tracker uses the correct scanner and db instances if created internally
         self.tracker = (
-            tracker if tracker is not None else PresenceTracker(self.scanner, self.db)
+            tracker
+            if tracker is not None
+            else _lazy("PresenceTracker")(
+                self.scanner,
+                self.db,
+                spool=_lazy("spool").from_config("tracker"),
+                clock=self.clock,
+            )
+        )
+        self.metrics_exporter = (
+            metrics_exporter
+            if metrics_exporter is not None
+            else _lazy("metrics").MetricsExporter.from_config()
         )
-        self._shutdown_event = asyncio.Event()
+        self.api = (
+            api
+            if api is not None
+            else _lazy("PresenceAPI").from_config(self.tracker, clock=self.clock)
+        )
+        self._lag_monitor = _lazy("metrics").LoopLagMonitor()
+        self._rollup_date = None  # Day the daily stats were last rolled up
+        self._rekey_period = None  # Pseudonym period the rekey job started for
+        self._rekey_job = None
+        self._rekeyed = 0
+        self._maintenance = _lazy("DatabaseMaintenance")(
+            self._database, clock=self.clock
+        )
+        self._shutdown_event = _lazy("asyncio").Event()
 
     def _handle_signal(self, signum, frame):
         self.logger.info(f"Received signal {signum}, initiating shutdown...")
+        self.stop()
+
+    def stop(self):
+        """Make the run loop exit after the current cycle."""
         # Set the event to signal the run loop to stop
         self._shutdown_event.set()
         # Setting self.running = False might still be useful for immediate checks
@@ -87,65 +213,67 @@ class PresenceMonitoringApp:
 
         # or ensure they correctly interact with the asyncio event loop.
         # Using loop.add_signal_handler is generally preferred in async code.
+        asyncio = _lazy("asyncio")
         loop = asyncio.get_running_loop()
         for sig in (signal.SIGINT, signal.SIGTERM):
             loop.add_signal_handler(sig, self._handle_signal, sig, None)
+        # Runs between loop iterations, so no scan cycle is interrupted
+        loop.add_signal_handler(signal.SIGHUP, self._reload_config)
 
         self.running = True  # Initial state
         self.logger.info("Starting FabLab Presence Monitoring System (Async)")
 
+        try:
+            await self.metrics_exporter.start()
+        except OSError as e:
+            self.logger.error(f"Could not start metrics endpoint: {e}")
+        try:
+            await self.api.start()
+        except OSError as e:
+            self.logger.error(f"Could not start API endpoint: {e}")
+        self._lag_monitor.start(loop)
+
         try:
             iteration = 0
             while not self._shutdown_event.is_set():  # Check asyncio event
                 iteration += 1
                 self.logger.debug(f"Starting async iteration {iteration}")
-                start_time = time.time()
+                start_time = self.clock.monotonic()
 
                 try:
                     # Await the async presence update
-                    print(
-                        "[DEBUG] main.py: Before await self.tracker.update_presence()"
-                    )  # DEBUG
                     device_count = await self.tracker.update_presence()
-                    print(
-                        "[DEBUG] main.py: After await "
-                        f"self.tracker.update_presence(), count={device_count}"
-                    )  # DEBUG
                     self.logger.info(
                         f"Async scan complete, detected {device_count} devices"
                     )
-                    # Consider making cleanup async if it involves I/O,
-                    # but for now assume it's quick enough or refactor later.
-                    self.db.cleanup_old_data()
+                    # On the database thread, keeping the loop responsive
+                    await _lazy("asyncdb").run(self.db, self._housekeeping)
                 except Exception as e:
                     # Log error but continue loop unless it's critical
                     self.logger.error(
                         f"Error during async presence update: {e}", exc_info=True
                     )
                     # Maybe add a short sleep after error before retrying
-                    await asyncio.sleep(5)  # Sleep briefly after an error
+                    await self.clock.sleep(5)  # Sleep briefly after an error
+
+                # Sleep asynchronously for remaining interval time
+                elapsed = self.clock.monotonic() - start_time
+                self._record_cycle(elapsed)
 
                 # Check shutdown event again before sleep
                 if self._shutdown_event.is_set():
                     self.logger.debug("Shutdown event set, exiting loop.")
                     break
 
-                # Sleep asynchronously for remaining interval time
-                elapsed = time.time() - start_time
                 sleep_time = Config.SCAN_INTERVAL - elapsed
                 if sleep_time > 0:
                     self.logger.debug(
                         f"Sleeping asynchronously for {sleep_time:.2f} seconds"
                     )
                     # Simpler sleep - rely on the loop condition and signal handler
-                    print(
-                        f"[DEBUG] main.py: Before await asyncio.sleep({sleep_time})"
-                    )  # DEBUG
-                    await asyncio.sleep(sleep_time)
-                    print(
-                        f"[DEBUG] main.py: After await asyncio.sleep({sleep_time})"
-                    )  # DEBUG
+                    await self.clock.sleep(sleep_time)
                 else:
+                    _lazy("metrics").CYCLE_OVERRUNS_TOTAL.inc()
                     self.logger.warning(
                         f"Scan iteration took longer ({elapsed:.2f}s) than interval "
                         f"({Config.SCAN_INTERVAL}s), skipping sleep."
@@ -158,18 +286,166 @@ class PresenceMonitoringApp:
             # Potentially re-raise or handle differently
         finally:
             self.running = False  # Ensure flag is false on exit
+            self._lag_monitor.stop()
+            await self.metrics_exporter.stop()
+            await self.api.stop()
+            if self._owns_db:
+                await self.db.close()  # After the writes already queued
             self.logger.info("FabLab Presence Monitoring System stopped")
 
+    def _reload_config(self) -> None:
+        """Apply configuration changes on SIGHUP, keeping tracker state."""
+        try:
+            applied, pending = Config.reload()
+        except ConfigError as e:
+            self.logger.error(f"Config reload failed, keeping current settings: {e}")
+            return
+        for name, (old, new) in applied.items():
+            self.logger.info(f"Config {name} changed from {old!r} to {new!r}")
+        if pending:
+            self.logger.warning(
+                f"Config changes to {', '.join(pending)} need a restart"
+            )
+        if not applied and not pending:
+            self.logger.info("Config reloaded, no changes")
+
+    def _housekeeping(self) -> None:
+        """Per-cycle database upkeep, run where the connection may be used."""
+        with _lazy("metrics").CLEANUP_SECONDS.time():
+            self._database.cleanup_old_data()
+        self._rollup_daily_stats()
+        self._rekey_pseudonyms()
+        self._maintenance.run()
+
+    def _rollup_daily_stats(self) -> None:
+        """Roll up yesterday (and any changed days) once after midnight."""
+        today = self.clock.today()
+        if today == self._rollup_date:
+            return
+        days = self._database.rollup_daily_stats(today)
+        self._rollup_date = today
+        if days:
+            self.logger.info(f"Rolled up daily stats for {len(days)} day(s)")
+
+    def _rekey_pseudonyms(self) -> None:
+        """Re-key one batch of stored pseudonyms per cycle after a key change.
+
+        Runs once from startup (picking up pseudonyms made with an older key)
+        and again whenever the pseudonym period rotates.
+        """
+        if not Config.ANONYMIZE_DEVICES:
+            return
+        period = self._database.pseudonymizer.period
+        if period != self._rekey_period:
+            self._rekey_period = period
+            self._rekey_job = iter(
+                self._database.rekey_pseudonyms(Config.REKEY_BATCH_SIZE)
+            )
+            self._rekeyed = 0
+        if self._rekey_job is None:
+            return
+        changed = next(self._rekey_job, None)
+        if changed is None:
+            self._rekey_job = None
+            if self._rekeyed:
+                self.logger.info(f"Re-keyed {self._rekeyed} device pseudonym(s)")
+        else:
+            self._rekeyed += changed
+
+    def _record_cycle(self, elapsed: float) -> None:
+        """Record per-cycle metrics and publish the textfile snapshot."""
+        metrics = _lazy("metrics")
+        metrics.CYCLES_TOTAL.inc()
+        metrics.CYCLE_SECONDS.observe(elapsed)
+        metrics.LAST_CYCLE_SECONDS.set(elapsed)
+        metrics.SCAN_INTERVAL_SECONDS.set(Config.SCAN_INTERVAL)
+        self.metrics_exporter.publish()
+        self.api.mark_cycle()
+
+
+async def replay_captures(paths, database_path):
+    """Feed captured scans through a fresh tracker writing to database_path.
+
+    Returns:
+        Number of scans replayed.
+    """
+    # Imported here: replay is an offline tool and the only user of the reader
+    from fablab_visitor_logger.capture import CaptureReader
+    from fablab_visitor_logger.clock import ManualClock
+    from fablab_visitor_logger.scanner import ReplayScanner
+
+    Config.DATABASE_PATH = database_path
+    clock = ManualClock()  # Follows the capture times
+    with CaptureReader(paths) as reader:
+        scanner = ReplayScanner(reader, clock)
+        tracker = _lazy("PresenceTracker")(scanner, Database(clock=clock), clock=clock)
+        scans = 0
+        while not scanner.exhausted:
+            await tracker.update_presence()
+            scans += 1
+    return scans
+
+
+async def run_sensor(address, sensor_id, scanner=None, clock=SYSTEM_CLOCK):
+    """Scan continuously and push every scan to the aggregator as a frame."""
+    from fablab_visitor_logger.ingest import SensorClient, encode_frame
+
+    logger = logging.getLogger(__name__)
+    scanner = scanner if scanner is not None else _lazy("BLEScanner")(clock=clock)
+    client = SensorClient(address, sensor_id)
+    logger.info(f"Sensor {sensor_id} sending scans to {address}")
+    try:
+        while True:
+            scan_time = clock.time()
+            try:
+                devices = await scanner.scan()
+            except Exception as e:
+                logger.error(f"Scan failed: {e}")
+                await clock.sleep(5)
+                continue
+            # Empty scans are sent too; the aggregator's tracker judges them
+            await client.send(encode_frame(sensor_id, scan_time, devices))
+    finally:
+        await client.close()
+
+
+async def run_aggregator(address):
+    """Receive sensor frames and track presence and zones from merged windows."""
+    from fablab_visitor_logger.ingest import Aggregator
+
+    from fablab_visitor_logger.zones import ZoneLocator
+
+    aggregator = Aggregator(address)
+    await aggregator.start()
+    # Opened on the database thread: migrations must not stall the listener
+    db = await _lazy("asyncdb").AsyncDatabase.open(Database)
+    tracker = _lazy("PresenceTracker")(
+        aggregator,
+        db,
+        zones=ZoneLocator.from_config(),
+        spool=_lazy("spool").from_config("tracker"),
+    )
+    try:
+        await PresenceMonitoringApp(scanner=aggregator, db=db, tracker=tracker).run()
+    finally:
+        await aggregator.stop()
+        await db.close()
+
 
 def main():
     """Run the main entry point for the CLI."""
     args = parse_args()
+    try:
+        Config.load(args.config)
+    except ConfigError as e:
+        print(f"Invalid configuration: {e}", file=sys.stderr)
+        sys.exit(2)
 
     if args.mode == "scan":
         app = PresenceMonitoringApp()
         try:
             # Run the async application using asyncio.run
-            asyncio.run(app.run())
+            _lazy("asyncio").run(app.run())
         except KeyboardInterrupt:
             # Handle Ctrl+C if asyncio.run doesn't catch it gracefully enough
             logging.getLogger(__name__).info(
@@ -182,47 +458,37 @@ def main():
             )
             sys.exit(1)
 
+    elif args.mode == "replay":
+        if args.rssi_threshold is not None:
+            Config.RSSI_THRESHOLD = args.rssi_threshold
+        scans = _lazy("asyncio").run(replay_captures(args.captures, args.database))
+        print(f"Replayed {scans} scans into {args.database}")
+
+    elif args.mode in ("sensor", "aggregate"):
+        address = (
+            args.aggregator if args.mode == "sensor" else args.listen
+        ) or Config.AGGREGATOR_ADDRESS
+        if not address:
+            print("No aggregator address configured", file=sys.stderr)
+            sys.exit(2)
+        if args.mode == "sensor":
+            import socket
+
+            Config.setup_logging()
+            sensor_id = args.sensor_id or Config.SENSOR_ID or socket.gethostname()
+            runner = run_sensor(address, sensor_id)
+        else:
+            runner = run_aggregator(address)
+        try:
+            _lazy("asyncio").run(runner)
+        except KeyboardInterrupt:
+            logging.getLogger(__name__).info(f"{args.mode} interrupted by user.")
+
     elif args.mode == "report":
         # Simplified report handling: Instantiate Reporter and call methods
-        reporter = Reporter()
+        reporter = Reporter(read_only=not writes_database(args))
         try:
-            if args.command == "list-devices":
-                devices = reporter.list_devices(args.active)
-                # Simple console output formatting
-                if devices:
-                    # Print header (optional)
-                    # print("ID | Status | Name | Vendor | Type")
-                    # print("-" * 50)
-                    for device in devices:
-                        output = [
-                            f"ID: {device.get('device_id', 'N/A')}",
-                            f"Status: {device.get('status', 'N/A')}",
-                            f"Name: {device.get('device_name', 'Unknown')}",
-                            f"Vendor: {device.get('vendor_name', 'Unknown')}",
-                            f"Type: {device.get('device_type', 'Unknown')}",
-                        ]
-                        print(" | ".join(output))
-                else:
-                    print("No devices found.")
-            elif args.command == "stats":
-                stats = reporter.get_stats()
-                print(f"Total unique devices: {stats.get('total_devices', 0)}")
-                print(f"Currently present: {stats.get('present_devices', 0)}")
-                print(f"Visits in last 24h: {stats.get('recent_visits', 0)}\n")
-
-                print("Vendor Breakdown:")
-                for vendor, count in stats.get("vendor_breakdown", {}).items():
-                    print(f"  {vendor or 'Unknown'}: {count}")
-
-                print("\nDevice Type Breakdown:")
-                for dev_type, count in stats.get("type_breakdown", {}).items():
-                    print(f"  {dev_type or 'Unknown'}: {count}")
-
-            elif args.command == "export-csv":
-                # output_path is now required by argparse for this command
-                reporter.export_csv(args.output_path)
-                print(f"Data exported to {args.output_path}")
-
+            run_report_command(reporter, args)
         except Exception as e:
             print(f"Error during report generation: {str(e)}", file=sys.stderr)
             sys.exit(1)
@@ -0,0 +1,72 @@
+"""Storage maintenance run by the scan loop after each cycle.
+
+Retention cleanup deletes rows but leaves their pages on the freelist, and
+the write-ahead log grows between checkpoints. Once per cycle, the scan
+process:
+
+- rolls ageing presence logs up into the minutely and hourly tiers
+  (``COMPACTION_HOURS_PER_CYCLE`` hours of each per cycle), so retention
+  cleanup can drop the raw rows;
+- checkpoints the WAL (``TRUNCATE``) every ``CHECKPOINT_INTERVAL`` seconds;
+- in the quiet hours, returns up to ``VACUUM_PAGES_PER_CYCLE`` free pages to
+  the filesystem with ``incremental_vacuum``, so a large cleanup is
+  reclaimed over several short steps instead of one long ``VACUUM``;
+- once per day in the quiet hours, runs ``PRAGMA optimize`` to refresh the
+  planner statistics.
+"""
+
+import logging
+from datetime import date
+from typing import Optional
+
+from fablab_visitor_logger import metrics
+from fablab_visitor_logger.clock import SYSTEM_CLOCK, Clock
+from fablab_visitor_logger.config import Config
+
+
+def in_quiet_hours(hour: int) -> bool:
+    start, end = Config.MAINTENANCE_START_HOUR, Config.MAINTENANCE_END_HOUR
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end  # Wraps past midnight
+
+
+class DatabaseMaintenance:
+    """Schedules compaction, checkpoints, vacuum and optimize for a Database."""
+
+    def __init__(self, db, clock: Clock = SYSTEM_CLOCK) -> None:
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self.clock = clock
+        self._last_checkpoint = clock.monotonic()
+        self._optimized: Optional[date] = None  # Day optimize last ran
+
+    def run(self) -> None:
+        now = self.clock.now()
+        with metrics.DB_MAINTENANCE_SECONDS.time():
+            minutely, hourly, expired = self.db.compact_presence(now=now)
+            if minutely or hourly or expired:
+                self.logger.debug(
+                    f"Compacted presence into {minutely} minutely and {hourly} "
+                    f"hourly rows; {expired} hourly rows expired"
+                )
+            if (
+                Config.CHECKPOINT_INTERVAL
+                and self.clock.monotonic() - self._last_checkpoint
+                >= Config.CHECKPOINT_INTERVAL
+            ):
+                busy, _, _ = self.db.checkpoint()
+                if busy:
+                    self.logger.debug("WAL checkpoint incomplete: readers active")
+                self._last_checkpoint = self.clock.monotonic()
+            if not in_quiet_hours(now.hour):
+                return
+            if Config.VACUUM_PAGES_PER_CYCLE:
+                freed = self.db.incremental_vacuum(Config.VACUUM_PAGES_PER_CYCLE)
+                if freed:
+                    metrics.DB_VACUUMED_PAGES_TOTAL.inc(freed)
+                    self.logger.debug(f"Incremental vacuum freed {freed} pages")
+            if self._optimized != now.date():
+                self.db.optimize()
+                self._optimized = now.date()
+                self.logger.info("Refreshed query planner statistics")
@@ -0,0 +1,444 @@
+"""In-process metrics for the scan loop, exposed in Prometheus text format.
+
+Metrics are plain Python counters updated from the event loop thread, so
+recording a sample is a couple of additions and a bisect. The registry can be
+served on a local HTTP port and/or written to a node_exporter textfile
+collector path after every scan cycle. The HTTP server (and with it
+asyncio) is only imported when an exporter starts, so report commands that
+bump a counter stay cheap to import.
+"""
+
+import bisect
+import logging
+import math
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fablab_visitor_logger.config import Config
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from fablab_visitor_logger.httpserver import HTTPServer, Request, Response
+
+# Phase durations on a Pi range from sub-millisecond (tracker bookkeeping) to the
+# full scan window (discovery), so the buckets span 1ms to 2 minutes.
+DURATION_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    """Monotonically increasing counter with optional labels."""
+
+    type_name = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def labels(self, **labels: str) -> "_BoundCounter":
+        """Return a child counter for the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._values.setdefault(key, 0.0)
+        return _BoundCounter(self, key)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increment the unlabelled counter."""
+        self._values[()] += amount
+
+    def value(self, **labels: str) -> float:
+        """Return the current value (mainly for tests and summaries)."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, value in sorted(self._values.items()):
+            label_str = _format_labels(list(zip(self.labelnames, key)))
+            lines.append(f"{self.name}{label_str} {_format_value(value)}")
+        return lines
+
+
+class _BoundCounter:
+    __slots__ = ("_counter", "_key")
+
+    def __init__(self, counter: Counter, key: Tuple[str, ...]) -> None:
+        self._counter = counter
+        self._key = key
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._counter._values[self._key] += amount
+
+
+class Gauge:
+    """A value that can go up and down."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._value -= amount
+
+    def value(self) -> float:
+        return self._value
+
+    def render(self) -> List[str]:
+        return [f"{self.name} {_format_value(self._value)}"]
+
+
+class Histogram:
+    """Fixed-bucket histogram, rendered with cumulative Prometheus buckets."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._upper_bounds = tuple(sorted(buckets)) + (math.inf,)
+        self._counts = [0] * len(self._upper_bounds)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float) -> None:
+        """Record a single sample."""
+        self._counts[bisect.bisect_left(self._upper_bounds, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the wall-clock duration of the ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def render(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._upper_bounds, self._counts):
+            cumulative += count
+            lines.append(
+                f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}'
+            )
+        lines.append(f"{self.name}_sum {_format_value(self._sum)}")
+        lines.append(f"{self.name}_count {self._count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        """Return all metrics as Prometheus text."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SCAN_DISCOVERY_SECONDS = REGISTRY.histogram(
+    "fablab_scan_discovery_seconds", "Time spent in BLE discovery per scan."
+)
+SCAN_FILTER_SECONDS = REGISTRY.histogram(
+    "fablab_scan_filter_seconds",
+    "Time spent filtering and converting advertisements per scan.",
+)
+TRACKER_SECONDS = REGISTRY.histogram(
+    "fablab_tracker_seconds",
+    "Time spent in the presence state machine per cycle, excluding DB writes.",
+)
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    "fablab_db_write_seconds", "Time spent writing to the database per cycle."
+)
+CLEANUP_SECONDS = REGISTRY.histogram(
+    "fablab_cleanup_seconds", "Time spent in retention cleanup per cycle."
+)
+DB_MAINTENANCE_SECONDS = REGISTRY.histogram(
+    "fablab_db_maintenance_seconds",
+    "Time spent in checkpoints, incremental vacuum and optimize per cycle.",
+)
+DB_VACUUMED_PAGES_TOTAL = REGISTRY.counter(
+    "fablab_db_vacuumed_pages_total", "Free pages returned to the filesystem."
+)
+CYCLE_SECONDS = REGISTRY.histogram(
+    "fablab_cycle_seconds", "Total wall-clock time of a scan cycle."
+)
+DEVICES_SEEN = REGISTRY.histogram(
+    "fablab_devices_seen",
+    "Devices passing the RSSI filter per scan.",
+    buckets=COUNT_BUCKETS,
+)
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "fablab_event_loop_lag_seconds",
+    "Delay between a scheduled event loop callback and its execution.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+TRANSITIONS_TOTAL = REGISTRY.counter(
+    "fablab_transitions_total",
+    "Device state transitions written by the tracker.",
+    labelnames=("status",),
+)
+NEW_DEVICES_TOTAL = REGISTRY.counter(
+    "fablab_new_devices_total", "Devices added to the tracker state."
+)
+SCAN_FAILURES_TOTAL = REGISTRY.counter(
+    "fablab_scan_failures_total", "BLE discovery attempts that raised BleakError."
+)
+FROZEN_CYCLES_TOTAL = REGISTRY.counter(
+    "fablab_frozen_cycles_total",
+    "Cycles whose missed-ping counters were frozen due to a failed or empty scan.",
+)
+SCAN_DEGRADED = REGISTRY.gauge(
+    "fablab_scan_degraded", "1 while the tracker distrusts scan results."
+)
+CYCLES_TOTAL = REGISTRY.counter("fablab_cycles_total", "Completed scan cycles.")
+CYCLE_OVERRUNS_TOTAL = REGISTRY.counter(
+    "fablab_cycle_overruns_total", "Scan cycles that took longer than SCAN_INTERVAL."
+)
+LAST_CYCLE_SECONDS = REGISTRY.gauge(
+    "fablab_last_cycle_seconds", "Duration of the most recent scan cycle."
+)
+SCAN_INTERVAL_SECONDS = REGISTRY.gauge(
+    "fablab_scan_interval_seconds", "Configured SCAN_INTERVAL."
+)
+TRACKED_DEVICES = REGISTRY.gauge(
+    "fablab_tracked_devices", "Devices currently held in tracker state."
+)
+SPOOL_RECORDS = REGISTRY.gauge(
+    "fablab_spool_records", "Database writes waiting in the spool."
+)
+SPOOL_BYTES = REGISTRY.gauge("fablab_spool_bytes", "Size of the spool backlog.")
+SPOOLED_TOTAL = REGISTRY.counter(
+    "fablab_spooled_total", "Database writes diverted to the spool."
+)
+SPOOL_DRAINED_TOTAL = REGISTRY.counter(
+    "fablab_spool_drained_total", "Spooled writes replayed into the database."
+)
+SPOOL_DROPPED_TOTAL = REGISTRY.counter(
+    "fablab_spool_dropped_total", "Spooled writes dropped by the size cap."
+)
+SPOOL_CORRUPT_TOTAL = REGISTRY.counter(
+    "fablab_spool_corrupt_total", "Spooled writes discarded as undecodable."
+)
+CAPTURE_CORRUPT_TOTAL = REGISTRY.counter(
+    "fablab_capture_corrupt_total", "Capture records skipped as undecodable."
+)
+INGEST_FRAMES_TOTAL = REGISTRY.counter(
+    "fablab_ingest_frames_total", "Sensor frames merged by the aggregator."
+)
+INGEST_REJECTED_FRAMES_TOTAL = REGISTRY.counter(
+    "fablab_ingest_rejected_frames_total",
+    "Sensor connections dropped because of a corrupt or oversized frame.",
+)
+ZONE_SECONDS = REGISTRY.histogram(
+    "fablab_zone_seconds", "Time spent assigning devices to zones per cycle."
+)
+ZONE_CHANGES_TOTAL = REGISTRY.counter(
+    "fablab_zone_changes_total", "Zone entries, moves and exits of devices."
+)
+REPORT_CACHE_HITS_TOTAL = REGISTRY.counter(
+    "fablab_report_cache_hits_total", "Reporter queries answered from the cache."
+)
+REPORT_CACHE_MISSES_TOTAL = REGISTRY.counter(
+    "fablab_report_cache_misses_total", "Reporter queries executed against SQLite."
+)
+
+
+def write_textfile(path: str, registry: MetricsRegistry = REGISTRY) -> None:
+    """Atomically write the registry for node_exporter's textfile collector."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".prom.tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(registry.render())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class LoopLagMonitor:
+    """Measures event loop lag with a self-rescheduling timer callback."""
+
+    def __init__(
+        self, histogram: Histogram = EVENT_LOOP_LAG_SECONDS, interval: float = 1.0
+    ) -> None:
+        self.histogram = histogram
+        self.interval = interval
+        self._loop: Optional["asyncio.AbstractEventLoop"] = None
+        self._handle: Optional["asyncio.TimerHandle"] = None
+        self._expected = 0.0
+
+    def start(self, loop: "asyncio.AbstractEventLoop") -> None:
+        self._loop = loop
+        self._schedule()
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self) -> None:
+        assert self._loop is not None
+        self._expected = self._loop.time() + self.interval
+        self._handle = self._loop.call_later(self.interval, self._tick)
+
+    def _tick(self) -> None:
+        assert self._loop is not None
+        self.histogram.observe(max(0.0, self._loop.time() - self._expected))
+        self._schedule()
+
+
+class MetricsExporter:
+    """Publishes a registry on a local HTTP port and/or a textfile path."""
+
+    def __init__(
+        self,
+        registry: MetricsRegistry = REGISTRY,
+        port: Optional[int] = None,
+        host: str = "127.0.0.1",
+        textfile_path: Optional[str] = None,
+    ) -> None:
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self.textfile_path = textfile_path
+        self.logger = logging.getLogger(__name__)
+        self._server: Optional["HTTPServer"] = None
+
+    @classmethod
+    def from_config(cls) -> "MetricsExporter":
+        return cls(
+            port=Config.METRICS_PORT,
+            host=Config.METRICS_HOST,
+            textfile_path=Config.METRICS_TEXTFILE_PATH,
+        )
+
+    async def start(self) -> None:
+        """Start the HTTP endpoint if a port is configured."""
+        if self.port is None:
+            return
+        from fablab_visitor_logger.httpserver import HTTPServer
+
+        self._server = HTTPServer(self.host, self.port)
+        self._server.route("/metrics", self._serve_metrics)
+        await self._server.start()
+        self.port = self._server.port
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            await self._server.stop()
+            self._server = None
+
+    def publish(self) -> None:
+        """Write the textfile snapshot, if configured. Called once per cycle."""
+        if not self.textfile_path:
+            return
+        try:
+            write_textfile(self.textfile_path, self.registry)
+        except OSError as e:
+            self.logger.warning(f"Could not write metrics textfile: {e}")
+
+    def _serve_metrics(self, request: "Request") -> "Response":
+        from fablab_visitor_logger.httpserver import Response
+
+        return Response(200, self.registry.render().encode(), CONTENT_TYPE)
@@ -0,0 +1,548 @@
+"""Versioned schema migrations keyed on ``PRAGMA user_version``.
+
+``MIGRATIONS`` is an ordered list of steps; the database's ``user_version``
+is the last step applied. Opening a current database costs one PRAGMA read.
+Otherwise the pending steps run in order:
+
+- Consecutive DDL-only steps run as one script in a single transaction
+  that also sets the new ``user_version``, so a failure leaves the schema
+  at the previous version.
+- Steps with a ``backfill`` rewrite a large table in batches: after their
+  DDL, the backfill statement runs over rowid ranges of ``batch_size``
+  rows, each range in its own short transaction, so no single transaction
+  grows with the table. Progress is recorded in
+  ``schema_migration_progress`` and an interrupted backfill resumes where
+  it stopped.
+- ``isolated`` steps commit on their own. SQLite builds an index in a
+  single statement, so an index on a large table cannot be batched; as its
+  own step it at least does not hold back the steps around it, and an
+  interrupted build does not roll them back.
+- ``vacuum`` steps rebuild the whole file with ``VACUUM`` after their
+  script, for settings such as ``auto_vacuum`` that only apply to a
+  rebuilt file. The rebuild holds an exclusive lock for its duration: on
+  a large database, the first open after the upgrade waits for it once.
+
+Migrations run when a read-write ``Database`` is opened, before its owner
+writes anything, so the scanner's own writes always wait for them. Only
+another process writing to the same file can interleave with a backfill.
+Such writes must already be in the new form, since the backfill only
+covers the rowids that existed when it started, and they must not update
+or delete rows the backfill has not reached yet (for the stats counters,
+``report check-stats --repair`` fixes the drift this causes).
+
+Every DDL statement uses ``IF NOT EXISTS`` so that databases created before
+versioning (``user_version`` 0) can replay the base schema safely.
+"""
+
+import logging
+import sqlite3
+import time
+from typing import List, NamedTuple, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+class Migration(NamedTuple):
+    """One schema step, applied when ``user_version`` is below ``version``."""
+
+    version: int
+    description: str
+    script: str = ""  # DDL run in one transaction
+    backfill: Optional[str] = None  # UPDATE over rowids in (:start, :end]
+    table: Optional[str] = None  # Table whose rowids the backfill walks
+    batch_size: int = BACKFILL_BATCH_SIZE
+    isolated: bool = False  # Script runs in its own transaction
+    vacuum: bool = False  # Rebuild the file after the script
+
+
+BASE_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS devices (
+        device_id TEXT PRIMARY KEY,
+        anonymous_id TEXT,
+        first_seen DATETIME,
+        last_seen DATETIME,
+        status TEXT CHECK(
+            status IN (
+                'present',
+                'absent',
+                'departed'
+            )
+        )
+    );
+    CREATE TABLE IF NOT EXISTS presence_logs (
+        log_id INTEGER PRIMARY KEY,
+        device_id TEXT,
+        timestamp DATETIME,
+        status TEXT,
+        rssi INTEGER,
+        FOREIGN KEY(device_id) REFERENCES devices(device_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_presence_logs_timestamp
+        ON presence_logs(timestamp);
+    -- Keyset pagination of devices filtered by status
+    CREATE INDEX IF NOT EXISTS idx_devices_status
+        ON devices(status, device_id);
+    CREATE TABLE IF NOT EXISTS occupancy_aggregates (
+        date DATE,
+        hour INTEGER,
+        present_count INTEGER,
+        PRIMARY KEY(date, hour)
+    );
+
+    CREATE TABLE IF NOT EXISTS vendors (
+        vendor_id INTEGER PRIMARY KEY,
+        vendor_name TEXT NOT NULL,
+        common_device_types TEXT
+    );
+
+    INSERT OR IGNORE INTO vendors VALUES
+        (0x004C, 'Apple', 'iPhone,AirPods,Apple Watch'),
+        (0x0006, 'Microsoft', 'Surface,Xbox'),
+        (0x000F, 'Samsung', 'Galaxy Phones,Galaxy Watch'),
+        (0x0015, 'Google', 'Pixel Phones,Pixel Buds'),
+        (0x0075, 'Sony', 'PlayStation,Headphones'),
+        (0x000D, 'Intel', 'Laptops,Tablets');
+
+    CREATE TABLE IF NOT EXISTS device_info (
+        device_id TEXT PRIMARY KEY,
+        device_name TEXT,
+        device_type TEXT,
+        vendor_id INTEGER,
+        vendor_name TEXT,
+        model_number TEXT,
+        service_uuids TEXT,  -- JSON array of service UUIDs
+        manufacturer_data TEXT,  -- JSON of manufacturer data
+        tx_power INTEGER,
+        appearance INTEGER,
+        service_data TEXT,  -- JSON of service data
+        first_detected DATETIME,
+        last_detected DATETIME,
+        FOREIGN KEY(device_id) REFERENCES devices(device_id),
+        FOREIGN KEY(vendor_id) REFERENCES vendors(vendor_id)
+    );
+
+    -- Daily rollups ('' = unknown vendor/type)
+    CREATE TABLE IF NOT EXISTS vendor_stats (
+        date DATE,
+        vendor_name TEXT,
+        device_count INTEGER,
+        avg_presence_minutes INTEGER,
+        PRIMARY KEY(date, vendor_name)
+    );
+    CREATE TABLE IF NOT EXISTS device_type_stats (
+        date DATE,
+        device_type TEXT,
+        device_count INTEGER,
+        avg_presence_minutes INTEGER,
+        PRIMARY KEY(date, device_type)
+    );
+    -- Presence log count of each rolled-up day, to spot changes
+    CREATE TABLE IF NOT EXISTS rollup_days (
+        date DATE PRIMARY KEY,
+        log_count INTEGER
+    );
+"""
+
+# Counters maintained by triggers so that `report stats` reads a few rows
+# instead of aggregating the raw tables. Scopes: ('devices', 'total'),
+# ('status', <status>), ('vendor', <vendor_name>), ('type', <device_type>)
+# and ('hourly', 'YYYY-MM-DD HH') presence log buckets. NULL keys are
+# stored as ''. The ('meta', 'initialized') row is set once the rows that
+# predate the triggers have been counted (migrations 5 to 8).
+STATS_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS stats_counters (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY(scope, key)
+    ) WITHOUT ROWID;
+
+    CREATE VIEW IF NOT EXISTS stats_counters_expected AS
+        SELECT 'devices' AS scope, 'total' AS key, COUNT(*) AS value
+            FROM devices HAVING COUNT(*) > 0
+        UNION ALL
+        SELECT 'status', COALESCE(status, ''), COUNT(*)
+            FROM devices GROUP BY 2
+        UNION ALL
+        SELECT 'vendor', COALESCE(vendor_name, ''), COUNT(*)
+            FROM device_info GROUP BY 2
+        UNION ALL
+        SELECT 'type', COALESCE(device_type, ''), COUNT(*)
+            FROM device_info GROUP BY 2
+        UNION ALL
+        SELECT 'hourly', COALESCE(substr(timestamp, 1, 13), ''), COUNT(*)
+            FROM presence_logs GROUP BY 2;
+"""
+
+# Each table's triggers are created by the step that counts its existing
+# rows, right before the walk: rows inserted later are counted by the
+# triggers, the rest by the walk
+STATS_DEVICES_TRIGGERS_SQL = """
+    CREATE TRIGGER IF NOT EXISTS stats_devices_insert
+    AFTER INSERT ON devices
+    BEGIN
+        INSERT INTO stats_counters VALUES ('devices', 'total', 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+        INSERT INTO stats_counters VALUES ('status', COALESCE(NEW.status, ''), 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_devices_status
+    AFTER UPDATE OF status ON devices
+    WHEN OLD.status IS NOT NEW.status
+    BEGIN
+        UPDATE stats_counters SET value = value - 1
+            WHERE scope = 'status' AND key = COALESCE(OLD.status, '');
+        DELETE FROM stats_counters
+            WHERE scope = 'status' AND key = COALESCE(OLD.status, '')
+            AND value <= 0;
+        INSERT INTO stats_counters VALUES ('status', COALESCE(NEW.status, ''), 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_devices_delete
+    AFTER DELETE ON devices
+    BEGIN
+        UPDATE stats_counters SET value = value - 1
+            WHERE (scope = 'devices' AND key = 'total')
+            OR (scope = 'status' AND key = COALESCE(OLD.status, ''));
+        DELETE FROM stats_counters
+            WHERE ((scope = 'devices' AND key = 'total')
+                OR (scope = 'status' AND key = COALESCE(OLD.status, '')))
+            AND value <= 0;
+    END;
+"""
+
+STATS_DEVICE_INFO_TRIGGERS_SQL = """
+    CREATE TRIGGER IF NOT EXISTS stats_device_info_insert
+    AFTER INSERT ON device_info
+    BEGIN
+        INSERT INTO stats_counters
+            VALUES ('vendor', COALESCE(NEW.vendor_name, ''), 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+        INSERT INTO stats_counters
+            VALUES ('type', COALESCE(NEW.device_type, ''), 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_device_info_update
+    AFTER UPDATE OF vendor_name, device_type ON device_info
+    WHEN OLD.vendor_name IS NOT NEW.vendor_name
+        OR OLD.device_type IS NOT NEW.device_type
+    BEGIN
+        UPDATE stats_counters SET value = value - 1
+            WHERE (scope = 'vendor' AND key = COALESCE(OLD.vendor_name, ''))
+            OR (scope = 'type' AND key = COALESCE(OLD.device_type, ''));
+        DELETE FROM stats_counters
+            WHERE ((scope = 'vendor' AND key = COALESCE(OLD.vendor_name, ''))
+                OR (scope = 'type' AND key = COALESCE(OLD.device_type, '')))
+            AND value <= 0;
+        INSERT INTO stats_counters
+            VALUES ('vendor', COALESCE(NEW.vendor_name, ''), 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+        INSERT INTO stats_counters
+            VALUES ('type', COALESCE(NEW.device_type, ''), 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_device_info_delete
+    AFTER DELETE ON device_info
+    BEGIN
+        UPDATE stats_counters SET value = value - 1
+            WHERE (scope = 'vendor' AND key = COALESCE(OLD.vendor_name, ''))
+            OR (scope = 'type' AND key = COALESCE(OLD.device_type, ''));
+        DELETE FROM stats_counters
+            WHERE ((scope = 'vendor' AND key = COALESCE(OLD.vendor_name, ''))
+                OR (scope = 'type' AND key = COALESCE(OLD.device_type, '')))
+            AND value <= 0;
+    END;
+"""
+
+STATS_PRESENCE_LOGS_TRIGGERS_SQL = """
+    CREATE TRIGGER IF NOT EXISTS stats_presence_logs_insert
+    AFTER INSERT ON presence_logs
+    BEGIN
+        INSERT INTO stats_counters
+            VALUES ('hourly', COALESCE(substr(NEW.timestamp, 1, 13), ''), 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_presence_logs_update
+    AFTER UPDATE OF timestamp ON presence_logs
+    WHEN substr(OLD.timestamp, 1, 13) IS NOT substr(NEW.timestamp, 1, 13)
+    BEGIN
+        UPDATE stats_counters SET value = value - 1
+            WHERE scope = 'hourly'
+            AND key = COALESCE(substr(OLD.timestamp, 1, 13), '');
+        DELETE FROM stats_counters
+            WHERE scope = 'hourly'
+            AND key = COALESCE(substr(OLD.timestamp, 1, 13), '')
+            AND value <= 0;
+        INSERT INTO stats_counters
+            VALUES ('hourly', COALESCE(substr(NEW.timestamp, 1, 13), ''), 1)
+            ON CONFLICT(scope, key) DO UPDATE SET value = value + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS stats_presence_logs_delete
+    AFTER DELETE ON presence_logs
+    BEGIN
+        UPDATE stats_counters SET value = value - 1
+            WHERE scope = 'hourly'
+            AND key = COALESCE(substr(OLD.timestamp, 1, 13), '');
+        DELETE FROM stats_counters
+            WHERE scope = 'hourly'
+            AND key = COALESCE(substr(OLD.timestamp, 1, 13), '')
+            AND value <= 0;
+    END;
+"""
+
+
+# Count the rows in (:start, :end] into stats_counters, adding to what the
+# earlier batches (and the triggers) stored. Skipped once populated, so that
+# databases whose counters were filled in one statement by an earlier
+# version are not counted twice. An upsert from a SELECT needs a WHERE.
+_STATS_BACKFILL_SQL = """
+    INSERT INTO stats_counters (scope, key, value)
+        SELECT scope, key, value FROM ({counts})
+        WHERE value > 0 AND NOT EXISTS (
+            SELECT 1 FROM stats_counters
+            WHERE scope = 'meta' AND key = 'initialized'
+        )
+        ON CONFLICT(scope, key) DO UPDATE SET value = value + excluded.value
+"""
+_IN_BATCH = "rowid > :start AND rowid <= :end"
+
+STATS_DEVICES_BACKFILL_SQL = _STATS_BACKFILL_SQL.format(
+    counts=f"""
+        SELECT 'devices' AS scope, 'total' AS key, COUNT(*) AS value
+            FROM devices WHERE {_IN_BATCH}
+        UNION ALL
+        SELECT 'status', COALESCE(status, ''), COUNT(*)
+            FROM devices WHERE {_IN_BATCH} GROUP BY 2"""
+)
+STATS_DEVICE_INFO_BACKFILL_SQL = _STATS_BACKFILL_SQL.format(
+    counts=f"""
+        SELECT 'vendor' AS scope, COALESCE(vendor_name, '') AS key,
+            COUNT(*) AS value
+            FROM device_info WHERE {_IN_BATCH} GROUP BY 2
+        UNION ALL
+        SELECT 'type', COALESCE(device_type, ''), COUNT(*)
+            FROM device_info WHERE {_IN_BATCH} GROUP BY 2"""
+)
+STATS_PRESENCE_LOGS_BACKFILL_SQL = _STATS_BACKFILL_SQL.format(
+    counts=f"""
+        SELECT 'hourly' AS scope, COALESCE(substr(timestamp, 1, 13), '') AS key,
+            COUNT(*) AS value
+            FROM presence_logs WHERE {_IN_BATCH} GROUP BY 2"""
+)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Base schema", BASE_SCHEMA_SQL + STATS_SCHEMA_SQL),
+    Migration(
+        2,
+        # Without it, each departed device deleted by cleanup_old_data makes
+        # the foreign key check scan all of presence_logs
+        "Index presence logs by device",
+        """
+    CREATE INDEX IF NOT EXISTS idx_presence_logs_device
+        ON presence_logs(device_id, timestamp);
+""",
+        isolated=True,
+    ),
+    Migration(
+        3,
+        "Zone change events",
+        """
+    -- One row per zone entry, move or exit (zone NULL) of a device; removed
+    -- with the device by retention cleanup
+    CREATE TABLE IF NOT EXISTS zone_events (
+        event_id INTEGER PRIMARY KEY,
+        device_id TEXT REFERENCES devices(device_id) ON DELETE CASCADE,
+        timestamp DATETIME,
+        zone TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_zone_events_device
+        ON zone_events(device_id, timestamp);
+""",
+    ),
+    Migration(
+        4,
+        "Downsampled presence tiers",
+        """
+    -- Presence summaries per device and minute/hour (bucket, first_seen and
+    -- last_seen in epoch seconds of local time), kept after the raw logs
+    -- expire. No foreign key: they outlive the device rows.
+    CREATE TABLE IF NOT EXISTS presence_minutely (
+        bucket INTEGER NOT NULL,
+        device_id TEXT NOT NULL,
+        samples INTEGER NOT NULL,
+        first_seen INTEGER NOT NULL,
+        last_seen INTEGER NOT NULL,
+        rssi_sum INTEGER,
+        rssi_max INTEGER,
+        PRIMARY KEY (bucket, device_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS presence_hourly (
+        bucket INTEGER NOT NULL,
+        device_id TEXT NOT NULL,
+        samples INTEGER NOT NULL,
+        first_seen INTEGER NOT NULL,
+        last_seen INTEGER NOT NULL,
+        rssi_sum INTEGER,
+        rssi_max INTEGER,
+        PRIMARY KEY (bucket, device_id)
+    ) WITHOUT ROWID;
+    -- Everything before 'until' (epoch seconds) has been rolled up into
+    -- the tier; the raw logs (or minutely rows) before it are read from the
+    -- tier instead
+    CREATE TABLE IF NOT EXISTS retention_watermarks (
+        tier TEXT PRIMARY KEY,
+        until INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO retention_watermarks (tier, until)
+        VALUES ('minutely', 0), ('hourly', 0);
+""",
+    ),
+    Migration(
+        5,
+        "Count existing devices",
+        STATS_DEVICES_TRIGGERS_SQL,
+        backfill=STATS_DEVICES_BACKFILL_SQL,
+        table="devices",
+    ),
+    Migration(
+        6,
+        "Count existing device info",
+        STATS_DEVICE_INFO_TRIGGERS_SQL,
+        backfill=STATS_DEVICE_INFO_BACKFILL_SQL,
+        table="device_info",
+    ),
+    Migration(
+        7,
+        "Count existing presence logs",
+        STATS_PRESENCE_LOGS_TRIGGERS_SQL,
+        backfill=STATS_PRESENCE_LOGS_BACKFILL_SQL,
+        table="presence_logs",
+    ),
+    Migration(
+        8,
+        "Stats counters populated",
+        "INSERT OR IGNORE INTO stats_counters VALUES ('meta', 'initialized', 1);",
+    ),
+    Migration(
+        9,
+        # Lets the scan loop return pages freed by retention cleanup to the
+        # filesystem with PRAGMA incremental_vacuum
+        "Incremental auto-vacuum",
+        "PRAGMA auto_vacuum = INCREMENTAL;",
+        vacuum=True,
+    ),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    # On a separate cursor, leaving the connection's statement history alone
+    return int(conn.cursor().execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate(
+    conn: sqlite3.Connection,
+    migrations: Sequence[Migration] = MIGRATIONS,
+    pause: float = 0.0,
+) -> List[int]:
+    """Apply the pending migrations in order.
+
+    Args:
+        conn: Connection to migrate.
+        migrations: Steps ordered by version.
+        pause: Seconds to sleep between backfill batches.
+
+    Returns:
+        Versions that were applied.
+    """
+    current = schema_version(conn)
+    pending = [m for m in migrations if m.version > current]
+    applied: List[int] = []
+    while pending:
+        if _mergeable(pending[0]):
+            # Run every DDL-only step up to the next backfill together
+            steps = []
+            while pending and _mergeable(pending[0]):
+                steps.append(pending.pop(0))
+            _run_script(conn, "".join(m.script for m in steps), steps[-1].version)
+        elif pending[0].vacuum:
+            steps = [pending.pop(0)]
+            _run_vacuum(conn, steps[0])
+        elif pending[0].backfill is None:
+            steps = [pending.pop(0)]
+            _run_script(conn, steps[0].script, steps[0].version)
+        else:
+            steps = [pending.pop(0)]
+            _run_backfill(conn, steps[0], pause)
+        for step in steps:
+            logger.info(f"Applied schema migration {step.version}: {step.description}")
+            applied.append(step.version)
+    return applied
+
+
+def _mergeable(migration: Migration) -> bool:
+    return migration.backfill is None and not (migration.isolated or migration.vacuum)
+
+
+def _run_script(conn: sqlite3.Connection, script: str, version: int) -> None:
+    try:
+        conn.executescript(f"BEGIN; {script}\nPRAGMA user_version = {version}; COMMIT;")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+
+def _run_vacuum(conn: sqlite3.Connection, migration: Migration) -> None:
+    # Not bumped until the rebuild is done, so an interrupted VACUUM (which
+    # rolls back) is run again on the next open
+    _run_script(conn, migration.script, schema_version(conn))
+    conn.execute("VACUUM")  # Outside any transaction
+    conn.execute(f"PRAGMA user_version = {migration.version}")
+
+
+def _run_backfill(conn: sqlite3.Connection, migration: Migration, pause: float) -> None:
+    _run_script(
+        conn,
+        migration.script
+        + """
+    CREATE TABLE IF NOT EXISTS schema_migration_progress (
+        version INTEGER PRIMARY KEY,
+        last_rowid INTEGER NOT NULL
+    );
+""",
+        schema_version(conn),  # Not bumped until the backfill is complete
+    )
+    row = conn.execute(
+        "SELECT last_rowid FROM schema_migration_progress WHERE version = ?",
+        (migration.version,),
+    ).fetchone()
+    start = row[0] if row else 0
+    (last,) = conn.execute(f"SELECT MAX(rowid) FROM {migration.table}").fetchone()
+    while last is not None and start < last:
+        end = min(start + migration.batch_size, last)
+        with conn:
+            conn.execute(migration.backfill, {"start": start, "end": end})
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_migration_progress VALUES (?, ?)",
+                (migration.version, end),
+            )
+        start = end
+        if pause:
+            time.sleep(pause)
+    with conn:
+        conn.execute(
+            "DELETE FROM schema_migration_progress WHERE version = ?",
+            (migration.version,),
+        )
+        conn.execute(f"PRAGMA user_version = {migration.version}")
@@ -0,0 +1,209 @@
+"""Multi-process long-range reports over date-range shards.
+
+The requested period is split into contiguous shards aligned to the
+occupancy bucket size. Each shard runs in a ``ProcessPoolExecutor`` worker
+with its own read-only SQLite connection and returns mergeable partial
+aggregates:
+
+- occupancy per bucket (shards don't overlap, so these are concatenated),
+- a visit-duration histogram, visit count and total presence time (summed),
+- a HyperLogLog sketch of the devices seen (merged by register maximum).
+
+Visits that cross a shard boundary are counted once in each shard, which
+only matters for the visit count and histogram, not for occupancy or total
+presence time.
+"""
+
+import functools
+import hashlib
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from fablab_visitor_logger import analytics
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.reporting import Reporter
+
+# Visit duration histogram bin edges in minutes; the last bin is open-ended
+DWELL_BIN_MINUTES = (0, 5, 15, 30, 60, 120, 240, 480)
+HLL_PRECISION = 12  # 4096 registers, ~1.6% standard error
+
+
+class HyperLogLog:
+    """A small HyperLogLog sketch for approximate distinct counts."""
+
+    def __init__(self, precision: int = HLL_PRECISION) -> None:
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: str) -> None:
+        digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = hashed & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+class ShardResult(NamedTuple):
+    """Partial aggregates of one shard."""
+
+    occupancy: analytics.OccupancySeries
+    dwell_counts: List[int]
+    visits: int
+    present_seconds: int
+    devices: HyperLogLog
+
+
+class RangeReport(NamedTuple):
+    """Merged aggregates over the whole period."""
+
+    occupancy: analytics.OccupancySeries
+    dwell_counts: List[int]  # Visits per DWELL_BIN_MINUTES bin
+    visits: int
+    present_seconds: int
+    distinct_devices: int  # HyperLogLog estimate
+    shards: int
+
+
+def shard_ranges(
+    start: datetime, end: datetime, bucket: timedelta, shards: int
+) -> List[Tuple[datetime, datetime]]:
+    """Split [start, end) into up to ``shards`` bucket-aligned ranges."""
+    bucket_seconds = int(bucket.total_seconds())
+    first = analytics.to_epoch(start)
+    first -= first % bucket_seconds
+    last = analytics.to_epoch(end)
+    n_buckets = max(1, -(-(last - first) // bucket_seconds))
+    shards = max(1, min(shards, n_buckets))
+    bounds = [first + bucket_seconds * (n_buckets * i // shards) for i in range(shards)]
+    starts = [analytics.from_epoch(b) for b in bounds]
+    return list(zip(starts, starts[1:] + [end]))
+
+
+def summarize_shard(
+    db_path: str,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int,
+    interval: int,
+    max_gap: int,
+) -> ShardResult:
+    """Aggregate one shard on a private read-only connection.
+
+    Runs in a worker process, so it takes everything it needs as arguments.
+    """
+    import numpy as np
+
+    Config.DATABASE_PATH = db_path
+    reporter = Reporter(read_only=True, cache_size=0)
+    try:
+        devices, timestamps, covers, device_ids = reporter._presence_samples(
+            start, end, interval
+        )
+    finally:
+        reporter.db.conn.close()
+
+    arrivals, departures = analytics.sessions_from_samples(
+        devices, timestamps, max_gap, interval, covers
+    )
+    end_epoch = analytics.to_epoch(end)
+    occupancy = analytics.occupancy_sweep(
+        arrivals, departures, analytics.to_epoch(start), end_epoch, bucket_seconds
+    )
+    durations = np.minimum(departures, end_epoch) - arrivals
+    bins = np.searchsorted(DWELL_BIN_MINUTES, durations / 60, side="right") - 1
+    dwell_counts = np.bincount(bins, minlength=len(DWELL_BIN_MINUTES))
+
+    sketch = HyperLogLog()
+    for device_id in device_ids:
+        sketch.add(device_id)
+    return ShardResult(
+        occupancy,
+        dwell_counts.tolist(),
+        len(arrivals),
+        int(durations.sum()),
+        sketch,
+    )
+
+
+def merge_shards(results: List[ShardResult]) -> RangeReport:
+    """Combine shard results, given in time order."""
+    import numpy as np
+
+    first = results[0].occupancy
+    occupancy = analytics.OccupancySeries(
+        np.concatenate([r.occupancy.bucket_starts for r in results]),
+        np.concatenate([r.occupancy.mean for r in results]),
+        np.concatenate([r.occupancy.peak for r in results]),
+        first.bucket_seconds,
+    )
+    devices = HyperLogLog(results[0].devices.precision)
+    for result in results:
+        devices.merge(result.devices)
+    return RangeReport(
+        occupancy,
+        [sum(counts) for counts in zip(*(r.dwell_counts for r in results))],
+        sum(r.visits for r in results),
+        sum(r.present_seconds for r in results),
+        devices.estimate(),
+        len(results),
+    )
+
+
+def range_report(
+    start: datetime,
+    end: datetime,
+    bucket: timedelta = timedelta(hours=1),
+    workers: Optional[int] = None,
+    shards: Optional[int] = None,
+) -> RangeReport:
+    """Compute a long-range report, one shard per worker process.
+
+    Args:
+        start: Start of the period.
+        end: End of the period.
+        bucket: Occupancy bucket size; shards are aligned to it.
+        workers: Worker processes (default: CPU count). 1 runs in-process.
+        shards: Number of shards (default: twice the worker count).
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = shard_ranges(start, end, bucket, shards or workers * 2)
+    summarize = functools.partial(
+        summarize_shard,
+        Config.DATABASE_PATH,
+        bucket_seconds=int(bucket.total_seconds()),
+        interval=Config.SCAN_INTERVAL,
+        max_gap=Config.SCAN_INTERVAL * Config.PING_TIMEOUT,
+    )
+    if workers == 1:
+        results = [summarize(s, e) for s, e in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(summarize, *zip(*ranges)))
+    return merge_shards(results)
+
+
+def dwell_bin_labels() -> List[str]:
+    edges = DWELL_BIN_MINUTES
+    labels = [f"{lo}-{hi} min" for lo, hi in zip(edges, edges[1:])]
+    return labels + [f"{edges[-1]}+ min"]
@@ -0,0 +1,128 @@
+"""Keyed pseudonyms for device MAC addresses.
+
+An unsalted hash of a 48-bit MAC is reversed by hashing every address, so
+pseudonyms are BLAKE2b digests keyed with a secret kept outside the
+database (``Config.PSEUDONYM_KEY_FILE``, by default next to the database
+file, created on first use). With
+``PSEUDONYM_ROTATION_DAYS`` set, each period uses a key derived from the
+secret and the period number, so pseudonyms of different periods cannot be
+linked without the secret.
+
+Pseudonyms are cached per MAC in a bounded dict, so the tracker's hot path
+costs one dict lookup per device; the cache is dropped when the period
+changes. ``Database.rekey_pseudonyms`` rewrites stored pseudonyms made with
+another key or period.
+"""
+
+import hashlib
+import os
+import secrets
+import time
+from typing import Callable, Dict
+
+from fablab_visitor_logger.config import Config
+
+KEY_BYTES = 32
+DIGEST_BYTES = 16  # 32 hex characters
+SECONDS_PER_DAY = 86400
+DEFAULT_KEY_FILE = "pseudonym.key"
+
+
+class Pseudonymizer:
+    """Maps device IDs to keyed, optionally period-rotated pseudonyms."""
+
+    def __init__(
+        self,
+        key: bytes,
+        rotation_days: int = 0,
+        cache_size: int = 4096,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.key = key
+        self.rotation_days = rotation_days
+        self.cache_size = cache_size
+        self._clock = clock
+        self._cache: Dict[str, str] = {}
+        self.period = self._current_period()
+        self._period_key = self._derive_key(self.period)
+
+    @classmethod
+    def from_config(cls, clock: Callable[[], float] = time.time) -> "Pseudonymizer":
+        return cls(
+            load_key(key_file()),
+            rotation_days=Config.PSEUDONYM_ROTATION_DAYS,
+            cache_size=Config.PSEUDONYM_CACHE_SIZE,
+            clock=clock,
+        )
+
+    def refresh(self) -> bool:
+        """Switch to the current period's key; call once per batch of writes.
+
+        Returns:
+            True if the period changed.
+        """
+        period = self._current_period()
+        if period == self.period:
+            return False
+        self.period = period
+        self._period_key = self._derive_key(period)
+        self._cache.clear()
+        return True
+
+    def pseudonym(self, device_id: str) -> str:
+        """Cached pseudonym of device_id in the current period."""
+        try:
+            return self._cache[device_id]
+        except KeyError:
+            pass
+        value = self.compute(device_id)
+        if len(self._cache) >= self.cache_size:
+            # Evict the oldest insertion; devices still around are re-added
+            del self._cache[next(iter(self._cache))]
+        self._cache[device_id] = value
+        return value
+
+    def compute(self, device_id: str) -> str:
+        """Uncached pseudonym, for bulk jobs that would flush the cache."""
+        return hashlib.blake2b(
+            device_id.encode(), key=self._period_key, digest_size=DIGEST_BYTES
+        ).hexdigest()
+
+    def _current_period(self) -> int:
+        if not self.rotation_days:
+            return 0
+        return int(self._clock() // (self.rotation_days * SECONDS_PER_DAY))
+
+    def _derive_key(self, period: int) -> bytes:
+        if not self.rotation_days:
+            return self.key
+        return hashlib.blake2b(
+            period.to_bytes(8, "big"), key=self.key, digest_size=KEY_BYTES
+        ).digest()
+
+
+def key_file() -> str:
+    """Path of the secret key: the configured one, or next to the database."""
+    if Config.PSEUDONYM_KEY_FILE:
+        return Config.PSEUDONYM_KEY_FILE
+    return os.path.join(os.path.dirname(Config.DATABASE_PATH), DEFAULT_KEY_FILE)
+
+
+def load_key(path: str) -> bytes:
+    """Read the hex-encoded secret key, creating it (mode 0600) if missing."""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(KEY_BYTES) + "\n")
+    with open(path) as f:
+        text = f.read().strip()
+    try:
+        key = bytes.fromhex(text)
+    except ValueError:
+        raise ValueError(f"Pseudonym key file {path} is not hex encoded")
+    if not 16 <= len(key) <= hashlib.blake2b.MAX_KEY_SIZE:
+        raise ValueError(f"Pseudonym key in {path} must be 16 to 64 bytes")
+    return key
@@ -1,136 +1,745 @@
 import argparse
+import copy
 import csv
+import functools
+import gzip
+import io
+import json
+import math
+import os
 import sys
-from typing import Any, Dict, List
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
+from fablab_visitor_logger import analytics, columnar, metrics
+from fablab_visitor_logger.clock import SYSTEM_CLOCK, Clock
+from fablab_visitor_logger.config import Config
 from fablab_visitor_logger.database import Database
 
+EXPORT_COLUMNS = [
+    "device_id",
+    "timestamp",
+    "status",
+    "rssi",
+    "device_name",
+    "vendor_name",
+    "device_type",
+]
+EXPORT_CHUNK_SIZE = 5000  # rows per fetchmany() during streaming exports
+COLUMNAR_ROW_GROUP_SIZE = 100_000  # rows per Parquet row group / fetch
+EXPORT_STATE_SUFFIX = ".state"  # sidecar holding the incremental watermark
+RESULT_CACHE_SIZE = 128  # query results kept per Reporter (LRU)
+
+
+def _cached(method):
+    """Serve repeated calls with equal arguments from the Reporter cache."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        return self._cache_lookup(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
+
 
 class Reporter:
-    def __init__(self):
-        self.db = Database()
+    def __init__(
+        self,
+        read_only: bool = False,
+        cache_size: int = RESULT_CACHE_SIZE,
+        db: Optional[Database] = None,
+        clock: Clock = SYSTEM_CLOCK,
+    ):
+        # An existing Database (and its connection) may be shared
+        self.db = db if db is not None else Database(read_only=read_only)
+        self.clock = clock  # Cache expiry and default "now" for queries
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache: "OrderedDict[Any, Any]" = OrderedDict()
+        self._cache_version: Optional[Tuple[int, int, str]] = None
 
+    def _data_version(self) -> Tuple[int, int, str]:
+        """Identify the database state the cached results belong to.
+
+        ``PRAGMA data_version`` changes when another connection commits,
+        ``total_changes`` when this one writes, and the hour covers queries
+        relative to the current time (such as the rolling 24-hour count).
+        """
+        (data_version,) = self.db.conn.execute("PRAGMA data_version").fetchone()
+        return (
+            data_version,
+            self.db.conn.total_changes,
+            self.clock.now().strftime("%Y%m%d%H"),
+        )
+
+    def _cache_lookup(self, key: Any, compute: Callable[[], Any]) -> Any:
+        """Return a copy of the cached result for key, computing it on a miss."""
+        version = self._data_version()
+        if version != self._cache_version:
+            self._cache.clear()
+            self._cache_version = version
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            metrics.REPORT_CACHE_HITS_TOTAL.inc()
+            return copy.deepcopy(self._cache[key])
+        self.cache_misses += 1
+        metrics.REPORT_CACHE_MISSES_TOTAL.inc()
+        result = compute()
+        if self.cache_size > 0:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return copy.deepcopy(result)
+
+    def cache_info(self) -> Dict[str, int]:
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+        }
+
+    @_cached
     def list_devices(self, active_only: bool = False) -> List[Dict[str, Any]]:
         """List all detected devices with detailed info"""
-        with self.db.conn:
-            cursor = self.db.conn.cursor()
-            query = """
-                SELECT d.device_id, d.anonymous_id, d.status,
-                       di.device_name, di.vendor_name, di.device_type
-                FROM devices d
-                LEFT JOIN device_info di ON d.device_id = di.device_id
-            """
-            if active_only:
-                query += " WHERE d.status IN ('present', 'absent')"
-            cursor.execute(query)
-            rows = cursor.fetchall()
-
-            devices = []
-            for row in rows:
-                device = {
-                    "device_id": row[0],
-                    "anonymous_id": row[1],
-                    "status": row[2],
-                    "device_name": row[3],
-                    "vendor_name": row[4],
-                    "device_type": row[5],
-                }
-                devices.append(device)
-            return devices
+        return list(self.iter_devices(active_only=active_only))
 
+    def iter_devices(
+        self,
+        active_only: bool = False,
+        status: Optional[Sequence[str]] = None,
+        vendor: Optional[str] = None,
+        device_type: Optional[str] = None,
+        seen_since: Optional[datetime] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream devices in device_id order, one page at a time.
+
+        Filters are applied in SQL. Pages are addressed by key rather than
+        offset: pass the last ``device_id`` of a page as ``after`` to get
+        the next one, which costs the same however deep the page is.
+
+        Args:
+            active_only: Only devices that are present or absent.
+            status: Only devices with one of these statuses.
+            vendor: Only devices of this vendor.
+            device_type: Only devices of this type.
+            seen_since: Only devices last seen at or after this time.
+            after: Start after this device_id.
+            limit: Maximum number of devices to yield.
+            chunk_size: Rows fetched per ``fetchmany`` call.
+        """
+        conditions = []
+        params: List[Any] = []
+        if active_only:
+            conditions.append("d.status IN ('present', 'absent')")
+        if status:
+            conditions.append(f"d.status IN ({', '.join('?' * len(status))})")
+            params.extend(status)
+        if vendor is not None:
+            conditions.append("di.vendor_name = ?")
+            params.append(vendor)
+        if device_type is not None:
+            conditions.append("di.device_type = ?")
+            params.append(device_type)
+        if seen_since is not None:
+            conditions.append("d.last_seen >= ?")
+            params.append(_sql_timestamp(seen_since))
+        if after is not None:
+            conditions.append("d.device_id > ?")
+            params.append(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT d.device_id, d.anonymous_id, d.status, d.last_seen,
+                   di.device_name, di.vendor_name, di.device_type
+            FROM devices d
+            LEFT JOIN device_info di ON d.device_id = di.device_id
+            {where}
+            ORDER BY d.device_id
+        """
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        cursor = self.db.conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield {
+                        "device_id": row[0],
+                        "anonymous_id": row[1],
+                        "status": row[2],
+                        "last_seen": row[3],
+                        "device_name": row[4],
+                        "vendor_name": row[5],
+                        "device_type": row[6],
+                    }
+        finally:
+            cursor.close()
+
+    @_cached
     def get_stats(self) -> Dict[str, Any]:
-        """Get detailed visitor statistics"""
-        stats = {}
-        with self.db.conn:
-            cursor = self.db.conn.cursor()
-
-            # Basic counts
-            cursor.execute("SELECT COUNT(DISTINCT device_id) FROM devices")
-            stats["total_devices"] = cursor.fetchone()[0]
-
-            cursor.execute("SELECT COUNT(*) FROM devices WHERE status = 'present'")
-            stats["present_devices"] = cursor.fetchone()[0]
-
-            cursor.execute(
-                """
-                SELECT COUNT(*) FROM presence_logs
-                WHERE timestamp > datetime('now', '-1 day')
+        """Get detailed visitor statistics from the materialized counters.
+
+        Reads the ``stats_counters`` rows maintained by the write path, so
+        the cost does not grow with the size of the raw tables. Recent
+        visits are summed over hourly buckets covering the last 24 hours.
+        """
+        cursor = self.db.conn.execute(
             """
-            )
-            stats["recent_visits"] = cursor.fetchone()[0]
-
-            # Vendor breakdown
-            cursor.execute(
-                """
-                SELECT vendor_name, COUNT(*) as count
-                FROM device_info
-                GROUP BY vendor_name
-                ORDER BY count DESC
+            SELECT scope, key, value FROM stats_counters
+            WHERE scope IN ('devices', 'status', 'vendor', 'type')
+            OR (scope = 'hourly' AND key >= strftime('%Y-%m-%d %H', 'now', '-1 day'))
+            ORDER BY value DESC
+        """
+        )
+        stats: Dict[str, Any] = {
+            "total_devices": 0,
+            "present_devices": 0,
+            "recent_visits": 0,
+            "vendor_breakdown": {},
+            "type_breakdown": {},
+        }
+        for scope, key, value in cursor.fetchall():
+            if scope == "devices":
+                stats["total_devices"] = value
+            elif scope == "status":
+                if key == "present":
+                    stats["present_devices"] = value
+            elif scope == "vendor":
+                stats["vendor_breakdown"][key or None] = value
+            elif scope == "type":
+                stats["type_breakdown"][key or None] = value
+            else:
+                stats["recent_visits"] += value
+        return stats
+
+    @_cached
+    def get_vendor_stats(
+        self, start_date: date, end_date: date
+    ) -> List[Dict[str, Any]]:
+        """Return vendor distribution statistics from the daily rollups.
+
+        Args:
+            start_date: First day included.
+            end_date: Last day included.
+
+        Returns:
+            One dict per vendor with ``device_days`` (sum of daily distinct
+            devices), ``days`` seen and the device-weighted
+            ``avg_presence_minutes``, busiest vendors first.
+        """
+        cursor = self.db.conn.execute(
             """
-            )
-            stats["vendor_breakdown"] = dict(cursor.fetchall())
-
-            # Device type breakdown
-            cursor.execute(
-                """
-                SELECT device_type, COUNT(*) as count
-                FROM device_info
-                GROUP BY device_type
-                ORDER BY count DESC
+            SELECT vendor_name, SUM(device_count), COUNT(*),
+                   SUM(device_count * avg_presence_minutes) * 1.0
+                       / SUM(device_count)
+            FROM vendor_stats
+            WHERE date >= ? AND date <= ?
+            GROUP BY vendor_name
+            ORDER BY 2 DESC
+        """,
+            (start_date.isoformat(), end_date.isoformat()),
+        )
+        return [
+            {
+                "vendor_name": vendor or None,
+                "device_days": device_days,
+                "days": days,
+                "avg_presence_minutes": round(minutes or 0, 1),
+            }
+            for vendor, device_days, days, minutes in cursor.fetchall()
+        ]
+
+    @_cached
+    def get_device_type_trends(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> Dict[Optional[str], List[Dict[str, Any]]]:
+        """Return device type trends over time from the daily rollups.
+
+        Returns:
+            Mapping of device type to its days in date order, each a dict
+            with ``date``, ``device_count`` and ``avg_presence_minutes``.
+        """
+        cursor = self.db.conn.execute(
             """
+            SELECT date, device_type, device_count, avg_presence_minutes
+            FROM device_type_stats
+            WHERE date >= ? AND date <= ?
+            ORDER BY device_type, date
+        """,
+            (
+                (start_date or date.min).isoformat(),
+                (end_date or date.max).isoformat(),
+            ),
+        )
+        trends: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for day, device_type, count, minutes in cursor.fetchall():
+            trends.setdefault(device_type or None, []).append(
+                {"date": day, "device_count": count, "avg_presence_minutes": minutes}
             )
-            stats["type_breakdown"] = dict(cursor.fetchall())
+        return trends
 
-        return stats
+    def _presence_export_query(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Tuple[str, List[Any]]:
+        """Build the presence export query, filtered on the timestamp index."""
+        conditions = []
+        params: List[Any] = []
+        if since is not None:
+            conditions.append("p.timestamp >= ?")
+            params.append(_sql_timestamp(since))
+        if until is not None:
+            conditions.append("p.timestamp < ?")
+            params.append(_sql_timestamp(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT
+                p.device_id,
+                p.timestamp,
+                p.status,
+                p.rssi,
+                d.device_name,
+                d.vendor_name,
+                d.device_type
+            FROM presence_logs p
+            LEFT JOIN device_info d ON p.device_id = d.device_id
+            {where}
+            ORDER BY p.timestamp DESC
+        """
+        return query, params
+
+    def export_csv(
+        self,
+        output_path: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """Stream presence logs to CSV in constant memory.
+
+        Rows are fetched from the cursor in chunks and written straight to
+        the file, which is gzip-compressed on the fly for ``.csv.gz`` paths.
+
+        Args:
+            output_path: Destination ending in ``.csv`` or ``.csv.gz``.
+            since: Only export rows at or after this time.
+            until: Only export rows before this time.
+            chunk_size: Rows fetched per ``fetchmany`` call.
+            progress: Called with the running row count after each chunk.
+
+        Returns:
+            Number of rows written.
+        """
+        if not output_path.endswith((".csv", ".csv.gz")):
+            raise ValueError("Output path must end with .csv or .csv.gz")
+
+        query, params = self._presence_export_query(since, until)
+        cursor = self.db.conn.execute(query, params)
+        total = 0
+        try:
+            with _open_csv(output_path, "w") as f:
+                writer = csv.writer(f)
+                writer.writerow(EXPORT_COLUMNS)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    total += len(rows)
+                    if progress is not None:
+                        progress(total)
+        finally:
+            cursor.close()
+        return total
+
+    def export_csv_incremental(
+        self,
+        output_path: str,
+        state_path: Optional[str] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """Append presence logs added since the previous run to a CSV file.
+
+        The highest exported ``log_id`` and the file size after the last
+        complete chunk are kept in a JSON sidecar (``<output>.state`` by
+        default) that is atomically replaced after every chunk. Each run is
+        a range scan on the ``log_id`` primary key starting after the
+        watermark, so its cost depends only on the rows added since. An
+        interrupted run is resumed by truncating the file back to the
+        recorded size, which drops any partially written chunk. For
+        ``.csv.gz`` paths every chunk is appended as its own gzip member,
+        which gzip readers decompress as one stream.
+
+        Returns:
+            Number of rows appended by this run.
+        """
+        if not output_path.endswith((".csv", ".csv.gz")):
+            raise ValueError("Output path must end with .csv or .csv.gz")
+        if state_path is None:
+            state_path = output_path + EXPORT_STATE_SUFFIX
+        state = _load_export_state(state_path)
+        compress = output_path.endswith(".gz")
+
+        cursor = self.db.conn.execute(
+            """
+            SELECT
+                p.log_id,
+                p.device_id,
+                p.timestamp,
+                p.status,
+                p.rssi,
+                d.device_name,
+                d.vendor_name,
+                d.device_type
+            FROM presence_logs p
+            LEFT JOIN device_info d ON p.device_id = d.device_id
+            WHERE p.log_id > ?
+            ORDER BY p.log_id
+        """,
+            (state["last_log_id"],),
+        )
+        total = 0
+        try:
+            with open(output_path, "ab") as f:
+                if f.seek(0, os.SEEK_END) > state["offset"]:
+                    # Discard a chunk written after the last saved watermark
+                    f.truncate(state["offset"])
+                    f.seek(0, os.SEEK_END)
+                write_header = f.tell() == 0
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows and not write_header:
+                        break
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    if write_header:
+                        writer.writerow(EXPORT_COLUMNS)
+                        write_header = False
+                    writer.writerows(row[1:] for row in rows)
+                    data = buffer.getvalue().encode()
+                    f.write(gzip.compress(data, compresslevel=6) if compress else data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    if rows:
+                        state["last_log_id"] = rows[-1][0]
+                        total += len(rows)
+                    state["offset"] = f.tell()
+                    _save_export_state(state_path, state)
+                    if rows and progress is not None:
+                        progress(total)
+        finally:
+            cursor.close()
+        return total
+
+    def export_columnar(
+        self,
+        output_path: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        chunk_size: int = COLUMNAR_ROW_GROUP_SIZE,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Tuple[str, int]:
+        """Export presence logs as typed columns for zero-parse loading.
+
+        Writes Parquet (one row group per chunk) for ``.parquet`` paths when
+        pyarrow is installed. Other paths, or ``.parquet`` paths without
+        pyarrow (minus the suffix), become a directory of memory-mappable
+        ``.npy`` files, one per column.
+
+        Returns:
+            Tuple of (path actually written, number of rows).
+        """
+        use_parquet = output_path.endswith(".parquet")
+        if use_parquet and not columnar.pyarrow_available():
+            output_path = output_path[: -len(".parquet")]
+            use_parquet = False
+
+        conditions = []
+        params: List[Any] = []
+        if since is not None:
+            conditions.append("p.timestamp >= ?")
+            params.append(_sql_timestamp(since))
+        if until is not None:
+            conditions.append("p.timestamp < ?")
+            params.append(_sql_timestamp(until))
+        where = " AND ".join(conditions) or "1"
+
+        # Rows logged while the export runs are left out
+        (max_log_id,) = self.db.conn.execute(
+            f"SELECT MAX(log_id) FROM presence_logs p WHERE {where}", params
+        ).fetchone()
+        cursor = self.db.conn.execute(
+            f"""
+            SELECT
+                CAST(strftime('%s', p.timestamp) AS INTEGER),
+                p.status,
+                p.rssi,
+                p.device_id,
+                d.vendor_name,
+                d.device_type
+            FROM presence_logs p
+            LEFT JOIN device_info d ON p.device_id = d.device_id
+            WHERE {where} AND p.log_id <= ?
+            ORDER BY p.timestamp
+        """,
+            params + [max_log_id or 0],
+        )
+
+        sink = (
+            columnar.ParquetSink(output_path)
+            if use_parquet
+            else columnar.NpyDirectorySink(output_path)
+        )
+        written = 0
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                sink.write_chunk(rows)
+                written += len(rows)
+                if progress is not None:
+                    progress(written)
+        finally:
+            sink.close()
+            cursor.close()
+        return output_path, written
 
-    def export_csv(self, output_path: str) -> None:
-        """Export all presence logs to CSV"""
-        if not output_path.endswith(".csv"):
-            raise ValueError("Output path must end with .csv")
-
-        data = []
-        with self.db.conn:
-            cursor = self.db.conn.cursor()
-            cursor.execute(
-                """
-                SELECT
-                    p.device_id,
-                    p.timestamp,
-                    p.status,
-                    p.rssi,
-                    d.device_name,
-                    d.vendor_name,
-                    d.device_type
-                FROM presence_logs p
-                LEFT JOIN device_info d ON p.device_id = d.device_id
-                ORDER BY p.timestamp DESC
+    def _presence_samples(
+        self, start: datetime, end: datetime, interval: Optional[int] = None
+    ) -> Tuple[Any, Any, Any, List[str]]:
+        """Fetch ``present`` samples as (device code, epoch seconds, seconds
+        covered) arrays.
+
+        Each part of the range is read from the tier holding it: raw logs
+        from the minutely watermark on, minutely summaries between the
+        hourly and minutely watermarks, and hourly summaries before. A
+        summary becomes one sample spanning its first to last scan plus
+        ``interval``; a raw log covers ``interval``. The fourth item lists
+        the device IDs, indexed by device code.
+        """
+        import numpy as np
+
+        interval = Config.SCAN_INTERVAL if interval is None else interval
+        start_epoch, end_epoch = analytics.to_epoch(start), analytics.to_epoch(end)
+        minutely_until, hourly_until = self.db.retention_watermarks()
+        raw_start = max(start, analytics.from_epoch(minutely_until))
+        cursor = self.db.conn.execute(
             """
+            SELECT device_id, CAST(strftime('%s', timestamp) AS INTEGER), :interval
+            FROM presence_logs
+            WHERE timestamp >= :raw_start AND timestamp < :end
+                AND status = 'present'
+            UNION ALL
+            SELECT device_id, first_seen, last_seen - first_seen + :interval
+            FROM presence_minutely
+            WHERE bucket >= MAX(:start_epoch, :hourly_until)
+                AND bucket < MIN(:end_epoch, :minutely_until)
+            UNION ALL
+            SELECT device_id, first_seen, last_seen - first_seen + :interval
+            FROM presence_hourly
+            WHERE bucket >= :start_epoch AND bucket < MIN(:end_epoch, :hourly_until)
+        """,
+            {
+                "interval": interval,
+                "raw_start": _sql_timestamp(raw_start),
+                "end": _sql_timestamp(end),
+                "start_epoch": start_epoch,
+                "end_epoch": end_epoch,
+                "minutely_until": minutely_until,
+                "hourly_until": hourly_until,
+            },
+        )
+        codes: Dict[str, int] = {}
+        device_chunks = []
+        time_chunks = []
+        cover_chunks = []
+        while True:
+            rows = cursor.fetchmany(COLUMNAR_ROW_GROUP_SIZE)
+            if not rows:
+                break
+            devices, timestamps, covers = zip(*rows)
+            device_chunks.append(
+                np.fromiter(
+                    (codes.setdefault(d, len(codes)) for d in devices),
+                    dtype=np.int32,
+                    count=len(rows),
+                )
             )
-            data = cursor.fetchall()
-
-        with open(output_path, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(
-                [
-                    "device_id",
-                    "timestamp",
-                    "status",
-                    "rssi",
-                    "device_name",
-                    "vendor_name",
-                    "device_type",
-                ]
+            time_chunks.append(np.array(timestamps, dtype=np.int64))
+            cover_chunks.append(np.array(covers, dtype=np.int64))
+        cursor.close()
+        if not time_chunks:
+            empty = np.empty(0, dtype=np.int64)
+            return np.empty(0, dtype=np.int32), empty, empty, []
+        return (
+            np.concatenate(device_chunks),
+            np.concatenate(time_chunks),
+            np.concatenate(cover_chunks),
+            list(codes),
+        )
+
+    @_cached
+    def occupancy_series(
+        self,
+        start: datetime,
+        end: datetime,
+        bucket: timedelta = timedelta(hours=1),
+    ) -> analytics.OccupancySeries:
+        """Concurrent occupancy per time bucket between start and end.
+
+        Presence samples are read in one range query per retention tier
+        and merged into visit sessions, which may be up to
+        ``PING_TIMEOUT`` scans apart. See :mod:`analytics` for details.
+        """
+        bucket_seconds = int(bucket.total_seconds())
+        if bucket_seconds <= 0:
+            raise ValueError("Bucket size must be positive")
+        devices, timestamps, covers, _ = self._presence_samples(start, end)
+        arrivals, departures = analytics.sessions_from_samples(
+            devices,
+            timestamps,
+            max_gap=Config.SCAN_INTERVAL * Config.PING_TIMEOUT,
+            interval=Config.SCAN_INTERVAL,
+            covers=covers,
+        )
+        return analytics.occupancy_sweep(
+            arrivals,
+            departures,
+            analytics.to_epoch(start),
+            analytics.to_epoch(end),
+            bucket_seconds,
+        )
+
+    @_cached
+    def occupancy_heatmap(self, start: datetime, end: datetime) -> Any:
+        """Mean occupancy as a 7x24 weekday (Monday=0) by hour matrix."""
+        return analytics.weekday_hour_heatmap(
+            self.occupancy_series(start, end, timedelta(hours=1))
+        )
+
+    @_cached
+    def zone_occupancy(self, at: Optional[datetime] = None) -> Dict[str, int]:
+        """Devices per zone at a point in time (default: now).
+
+        Each device counts in the zone of its latest zone event up to ``at``;
+        devices whose latest event is an exit are in no zone.
+        """
+        rows = self.db.conn.execute(
+            """
+            SELECT zone, COUNT(*) FROM (
+                -- SQLite takes the bare zone column from the MAX() row
+                SELECT zone, MAX(timestamp)
+                FROM zone_events
+                WHERE timestamp <= ?
+                GROUP BY device_id
             )
-            writer.writerows(data)
+            WHERE zone IS NOT NULL
+            GROUP BY zone
+            ORDER BY zone
+        """,
+            (_sql_timestamp(at or self.clock.now()),),
+        ).fetchall()
+        return dict(rows)
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="FabLab Visitor Logger Reporting Interface",
-        prog="fablab-report",
-    )
-    subparsers = parser.add_subparsers(dest="command", required=True)
+def _sql_timestamp(value: datetime) -> str:
+    """Format a datetime the way sqlite3 stores DATETIME parameters."""
+    return value.isoformat(" ")
+
+
+def _open_csv(path: str, mode: str) -> IO[str]:
+    """Open a CSV file for text I/O, gzip-compressed for ``.gz`` paths."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", newline="", compresslevel=6)
+    return open(path, mode, newline="")
+
+
+def _load_export_state(path: str) -> Dict[str, int]:
+    """Read an incremental export watermark, defaulting to a fresh export."""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {"last_log_id": 0, "offset": 0}
+    return {"last_log_id": int(state["last_log_id"]), "offset": int(state["offset"])}
+
 
+def _save_export_state(path: str, state: Dict[str, int]) -> None:
+    """Atomically replace the watermark file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def parse_datetime(value: str) -> datetime:
+    """argparse type for ISO dates and datetimes (``2025-03-27[T12:00]``)."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO date/datetime: {value!r}")
+
+
+def parse_date(value: str) -> date:
+    """argparse type for ISO dates (``2025-03-27``)."""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO date: {value!r}")
+
+
+def _print_progress(rows: int) -> None:
+    print(f"\rExported {rows} rows...", end="", file=sys.stderr, flush=True)
+
+
+def _print_occupancy(series: analytics.OccupancySeries, fmt: str) -> None:
+    rows = zip(series.bucket_starts, series.mean, series.peak)
+    if fmt == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["bucket_start", "mean_occupancy", "peak_occupancy"])
+        for start, mean, peak in rows:
+            writer.writerow([analytics.from_epoch(start), f"{mean:.3f}", peak])
+        return
+    print(f"{'Bucket start':<19}  {'Mean':>6}  {'Peak':>4}")
+    for start, mean, peak in rows:
+        print(f"{analytics.from_epoch(start)!s:<19}  {mean:>6.2f}  {peak:>4}")
+
+
+def _print_heatmap(heatmap: Any, fmt: str) -> None:
+    if fmt == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["weekday"] + [str(hour) for hour in range(24)])
+        for name, row in zip(analytics.WEEKDAY_NAMES, heatmap):
+            writer.writerow([name] + ["" if math.isnan(v) else f"{v:.3f}" for v in row])
+        return
+    print("     " + "".join(f"{hour:>5}" for hour in range(24)))
+    for name, row in zip(analytics.WEEKDAY_NAMES, heatmap):
+        print(
+            f"{name:<5}"
+            + "".join("    -" if math.isnan(v) else f"{v:>5.1f}" for v in row)
+        )
+
+
+def add_report_commands(subparsers) -> None:
+    """Register the reporting subcommands on an argparse subparsers object."""
     # List devices command
     list_parser = subparsers.add_parser(
         "list-devices", help="List all detected devices"
@@ -138,50 +747,384 @@ def main():
     list_parser.add_argument(
         "--active", action="store_true", help="Show only active devices"
     )
+    list_parser.add_argument(
+        "--status",
+        action="append",
+        choices=("present", "absent", "departed"),
+        help="Only devices with this status (repeatable)",
+    )
+    list_parser.add_argument("--vendor", help="Only devices of this vendor")
+    list_parser.add_argument("--type", dest="device_type", help="Only this type")
+    list_parser.add_argument(
+        "--seen-since",
+        type=parse_datetime,
+        help="Only devices last seen at/after this time",
+    )
+    list_parser.add_argument(
+        "--after", help="Start after this device ID (from the previous page)"
+    )
+    list_parser.add_argument("--limit", type=int, help="Maximum devices to list")
+    list_parser.add_argument(
+        "--format",
+        choices=("text", "ndjson"),
+        default="text",
+        help="Output format (ndjson: one JSON object per line)",
+    )
 
     # Stats command
-    stats_parser = subparsers.add_parser(  # noqa: F841
-        "stats", help="Show visitor statistics"
+    subparsers.add_parser("stats", help="Show visitor statistics")
+    check_parser = subparsers.add_parser(
+        "check-stats", help="Verify the stats counters against the raw tables"
+    )
+    check_parser.add_argument(
+        "--repair", action="store_true", help="Rebuild the counters if they differ"
+    )
+
+    db_health_parser = subparsers.add_parser(
+        "db-health", help="Show database size, free pages and fragmentation"
+    )
+    db_health_parser.add_argument(
+        "--top", type=int, default=10, help="Tables and indexes to list"
+    )
+    subparsers.add_parser(
+        "db-vacuum",
+        help="Rebuild the database file and enable incremental vacuum (locks it)",
+    )
+
+    # Daily rollups
+    subparsers.add_parser(
+        "rollup", help="Roll new or changed closed days into the daily stats"
+    )
+    rekey_parser = subparsers.add_parser(
+        "rekey", help="Rewrite stored device pseudonyms under the current key"
+    )
+    rekey_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=Config.REKEY_BATCH_SIZE,
+        help="Devices updated per transaction",
+    )
+    vendor_parser = subparsers.add_parser(
+        "vendor-stats", help="Show vendor statistics from the daily rollups"
+    )
+    vendor_parser.add_argument(
+        "--since", type=parse_date, help="First day (default: 30 days ago)"
+    )
+    vendor_parser.add_argument(
+        "--until", type=parse_date, help="Last day (default: yesterday)"
+    )
+    trends_parser = subparsers.add_parser(
+        "type-trends", help="Show daily device counts per device type"
+    )
+    trends_parser.add_argument("--since", type=parse_date, help="First day")
+    trends_parser.add_argument("--until", type=parse_date, help="Last day")
+
+    # Occupancy command
+    occupancy_parser = subparsers.add_parser(
+        "occupancy", help="Show concurrent occupancy over time or as a heatmap"
+    )
+    occupancy_parser.add_argument(
+        "--since", type=parse_datetime, help="Start of the period (default: 7 days ago)"
+    )
+    occupancy_parser.add_argument(
+        "--until", type=parse_datetime, help="End of the period (default: now)"
+    )
+    occupancy_parser.add_argument(
+        "--bucket", type=int, default=60, help="Bucket size in minutes (default: 60)"
+    )
+    occupancy_parser.add_argument(
+        "--heatmap",
+        action="store_true",
+        help="Show mean occupancy by weekday and hour instead of a time series",
+    )
+    occupancy_parser.add_argument(
+        "--format", choices=("text", "csv"), default="text", help="Output format"
+    )
+
+    zones_parser = subparsers.add_parser(
+        "zones", help="Show devices per zone (multi-sensor deployments)"
+    )
+    zones_parser.add_argument(
+        "--at", type=parse_datetime, help="Point in time (default: now)"
+    )
+
+    # Long-range summary computed in worker processes
+    summary_parser = subparsers.add_parser(
+        "summary",
+        help="Summarize a long period (visits, dwell times, occupancy) in parallel",
+    )
+    summary_parser.add_argument(
+        "--since", type=parse_datetime, help="Start of the period (default: 1 year ago)"
+    )
+    summary_parser.add_argument(
+        "--until", type=parse_datetime, help="End of the period (default: now)"
+    )
+    summary_parser.add_argument(
+        "--workers", type=int, help="Worker processes (default: CPU count)"
     )
 
     # Export command
-    export_parser = subparsers.add_parser("export-csv", help="Export data to CSV")
+    export_parser = subparsers.add_parser(
+        "export-csv", help="Export data to CSV (gzip-compressed for .csv.gz)"
+    )
     export_parser.add_argument("output_path", help="Path to output CSV file")
+    export_parser.add_argument(
+        "--since", type=parse_datetime, help="Only export rows at/after this time"
+    )
+    export_parser.add_argument(
+        "--until", type=parse_datetime, help="Only export rows before this time"
+    )
+    export_parser.add_argument(
+        "--progress", action="store_true", help="Show a row counter on stderr"
+    )
+    export_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Append only rows added since the last incremental run",
+    )
+    export_parser.add_argument(
+        "--state-file",
+        help="Watermark file for --incremental (default: <output_path>.state)",
+    )
+
+    # Columnar export command
+    columnar_parser = subparsers.add_parser(
+        "export-columnar",
+        help="Export typed columns to Parquet (needs pyarrow) or NumPy .npy files",
+    )
+    columnar_parser.add_argument(
+        "output_path", help="Parquet file (.parquet) or directory of .npy files"
+    )
+    columnar_parser.add_argument(
+        "--since", type=parse_datetime, help="Only export rows at/after this time"
+    )
+    columnar_parser.add_argument(
+        "--until", type=parse_datetime, help="Only export rows before this time"
+    )
+    columnar_parser.add_argument(
+        "--progress", action="store_true", help="Show a row counter on stderr"
+    )
+
+
+# Subcommands that write to the database; the others open it read-only, so
+# they never create the schema or run migrations
+WRITING_COMMANDS = frozenset({"db-vacuum", "rollup", "rekey"})
+
+
+def writes_database(args: argparse.Namespace) -> bool:
+    """Whether a parsed reporting subcommand needs a read-write database."""
+    return args.command in WRITING_COMMANDS or (
+        args.command == "check-stats" and args.repair
+    )
+
+
+def run_report_command(reporter: Reporter, args: argparse.Namespace) -> None:
+    """Execute a parsed reporting subcommand and print its output."""
+    if args.command == "list-devices":
+        devices = reporter.iter_devices(
+            active_only=args.active,
+            status=args.status,
+            vendor=args.vendor,
+            device_type=args.device_type,
+            seen_since=args.seen_since,
+            after=args.after,
+            limit=args.limit,
+        )
+        count = 0
+        last_id = None
+        for device in devices:
+            count += 1
+            last_id = device.get("device_id")
+            if args.format == "ndjson":
+                print(json.dumps(device))
+                continue
+            output = [
+                f"ID: {device.get('device_id') or 'N/A'}",
+                f"Status: {device.get('status') or 'N/A'}",
+                f"Name: {device.get('device_name') or 'Unknown'}",
+                f"Vendor: {device.get('vendor_name') or 'Unknown'}",
+                f"Type: {device.get('device_type') or 'Unknown'}",
+            ]
+            print(" | ".join(output))
+        if args.format == "text":
+            if not count:
+                print("No devices found.")
+            elif args.limit is not None and count == args.limit:
+                print(f"Next page: --after {last_id}", file=sys.stderr)
+
+    elif args.command == "stats":
+        stats = reporter.get_stats()
+        print(f"Total unique devices: {stats.get('total_devices', 0)}")
+        print(f"Currently present: {stats.get('present_devices', 0)}")
+        print(f"Visits in last 24h: {stats.get('recent_visits', 0)}\n")
+
+        print("Vendor Breakdown:")
+        for vendor, count in stats.get("vendor_breakdown", {}).items():
+            print(f"  {vendor or 'Unknown'}: {count}")
+
+        print("\nDevice Type Breakdown:")
+        for dev_type, count in stats.get("type_breakdown", {}).items():
+            print(f"  {dev_type or 'Unknown'}: {count}")
+
+    elif args.command == "check-stats":
+        mismatches = reporter.db.check_stats()
+        for scope, key, expected, stored in mismatches:
+            print(f"{scope}/{key or 'Unknown'}: expected {expected}, stored {stored}")
+        if not mismatches:
+            print("Stats counters are consistent.")
+        elif args.repair:
+            reporter.db.rebuild_stats()
+            print(f"Rebuilt stats counters ({len(mismatches)} mismatches fixed).")
+        else:
+            print(f"{len(mismatches)} mismatches found; run with --repair to fix.")
+
+    elif args.command == "db-health":
+        health = reporter.db.health()
+        page_size = health["page_size"]
+        print(
+            f"File: {health['page_count']} pages of {page_size} bytes "
+            f"({health['page_count'] * page_size / 2**20:.1f} MiB)"
+        )
+        print(
+            f"Free pages: {health['freelist_count']} "
+            f"({health['freelist_count'] * page_size / 2**20:.1f} MiB reclaimable)"
+        )
+        print(
+            f"Auto-vacuum: {health['auto_vacuum']}, "
+            f"journal mode: {health['journal_mode']}"
+        )
+        if health["auto_vacuum"] != "incremental":
+            print("Run 'report db-vacuum' to enable incremental vacuum.")
+        print(f"\n{'Table/index':<36}{'MiB':>8}{'Unused':>8}{'Fragmented':>12}")
+        for stats in health["objects"][: args.top]:
+            print(
+                f"{stats['name']:<36}{stats['bytes'] / 2**20:>8.2f}"
+                f"{stats['unused_bytes'] / max(stats['bytes'], 1):>8.0%}"
+                f"{stats['fragmentation']:>12.0%}"
+            )
+
+    elif args.command == "db-vacuum":
+        before, after = reporter.db.vacuum()
+        print(f"Vacuumed database: {before} -> {after} pages")
+
+    elif args.command == "rollup":
+        days = reporter.db.rollup_daily_stats()
+        print(
+            f"Rolled up {len(days)} day(s)" + (f": {', '.join(days)}" if days else "")
+        )
+
+    elif args.command == "rekey":
+        changed = sum(reporter.db.rekey_pseudonyms(args.batch_size))
+        print(f"Re-keyed {changed} device pseudonym(s)")
+
+    elif args.command == "vendor-stats":
+        until = args.until or date.today() - timedelta(days=1)
+        since = args.since or until - timedelta(days=29)
+        rows = reporter.get_vendor_stats(since, until)
+        if not rows:
+            print("No rollups found; run 'report rollup' first.")
+        for row in rows:
+            print(
+                f"{row['vendor_name'] or 'Unknown'}: {row['device_days']} device-days "
+                f"over {row['days']} days, "
+                f"avg {row['avg_presence_minutes']} min present"
+            )
+
+    elif args.command == "type-trends":
+        trends = reporter.get_device_type_trends(args.since, args.until)
+        if not trends:
+            print("No rollups found; run 'report rollup' first.")
+        for device_type, days in trends.items():
+            print(f"{device_type or 'Unknown'}:")
+            for day in days:
+                print(
+                    f"  {day['date']}: {day['device_count']} devices, "
+                    f"avg {day['avg_presence_minutes']} min"
+                )
+
+    elif args.command == "occupancy":
+        until = args.until or datetime.now()
+        since = args.since or until - timedelta(days=7)
+        if args.heatmap:
+            _print_heatmap(reporter.occupancy_heatmap(since, until), args.format)
+        else:
+            series = reporter.occupancy_series(
+                since, until, timedelta(minutes=args.bucket)
+            )
+            _print_occupancy(series, args.format)
+
+    elif args.command == "zones":
+        occupancy = reporter.zone_occupancy(args.at)
+        if not occupancy:
+            print("No devices in any zone.")
+        for zone, count in occupancy.items():
+            print(f"{zone}: {count}")
+
+    elif args.command == "summary":
+        # Imported here: only this command needs the process pool
+        from fablab_visitor_logger import parallel
+
+        until = args.until or datetime.now()
+        since = args.since or until - timedelta(days=365)
+        report = parallel.range_report(since, until, workers=args.workers)
+        print(f"Period: {since} to {until} ({report.shards} shards)")
+        print(f"Distinct devices (approx.): {report.distinct_devices}")
+        print(f"Visits: {report.visits}")
+        print(f"Total presence: {report.present_seconds / 3600:.1f} hours")
+        if len(report.occupancy.peak):
+            busiest = int(report.occupancy.mean.argmax())
+            start = analytics.from_epoch(report.occupancy.bucket_starts[busiest])
+            print(
+                f"Peak occupancy: {report.occupancy.peak.max()} "
+                f"(busiest hour: {start}, mean {report.occupancy.mean[busiest]:.1f})"
+            )
+        print("\nVisit durations:")
+        for label, count in zip(parallel.dwell_bin_labels(), report.dwell_counts):
+            print(f"  {label}: {count}")
+
+    elif args.command == "export-csv":
+        progress = _print_progress if args.progress else None
+        if args.incremental:
+            if args.since or args.until:
+                raise ValueError(
+                    "--incremental cannot be combined with --since/--until"
+                )
+            rows = reporter.export_csv_incremental(
+                args.output_path, state_path=args.state_file, progress=progress
+            )
+        else:
+            rows = reporter.export_csv(
+                args.output_path, since=args.since, until=args.until, progress=progress
+            )
+        if args.progress:
+            print(file=sys.stderr)
+        print(f"Data exported to {args.output_path} ({rows} rows)")
+
+    elif args.command == "export-columnar":
+        path, rows = reporter.export_columnar(
+            args.output_path,
+            since=args.since,
+            until=args.until,
+            progress=_print_progress if args.progress else None,
+        )
+        if args.progress:
+            print(file=sys.stderr)
+        print(f"Data exported to {path} ({rows} rows)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="FabLab Visitor Logger Reporting Interface",
+        prog="fablab-report",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_report_commands(subparsers)
 
     args = parser.parse_args()
-    reporter = Reporter()
+    reporter = Reporter(read_only=not writes_database(args))
 
     try:
-        if args.command == "list-devices":
-            devices = reporter.list_devices(args.active)
-            for device in devices:
-                output = [
-                    f"ID: {device['device_id']}",
-                    f"Status: {device['status']}",
-                    f"Name: {device['device_name'] or 'Unknown'}",
-                    f"Vendor: {device['vendor_name'] or 'Unknown'}",
-                    f"Type: {device['device_type'] or 'Unknown'}",
-                ]
-                print(" | ".join(output))
-
-        elif args.command == "stats":
-            stats = reporter.get_stats()
-            print(f"Total unique devices: {stats['total_devices']}")
-            print(f"Currently present: {stats['present_devices']}")
-            print(f"Visits in last 24h: {stats['recent_visits']}\n")
-
-            print("Vendor Breakdown:")
-            for vendor, count in stats["vendor_breakdown"].items():
-                print(f"  {vendor or 'Unknown'}: {count}")
-
-            print("\nDevice Type Breakdown:")
-            for dev_type, count in stats["type_breakdown"].items():
-                print(f"  {dev_type or 'Unknown'}: {count}")
-
-        elif args.command == "export-csv":
-            reporter.export_csv(args.output_path)
-            print(f"Data exported to {args.output_path}")
-
+        run_report_command(reporter, args)
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
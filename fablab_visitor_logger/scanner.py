@@ -1,8 +1,23 @@
 """Handles BLE scanning and presence tracking logic."""
 
+import json
 import logging
+import sqlite3
+import time
+import zlib
 from datetime import datetime
-from typing import Any, Dict, List, Optional, TypedDict, Union, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    NotRequired,
+    Optional,
+    TypedDict,
+    Union,
+    cast,
+)
 
 # Use bleak for BLE scanning
 from bleak import BleakScanner as BleakScannerClient
@@ -10,10 +25,24 @@ from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 from bleak.exc import BleakError
 
+from fablab_visitor_logger import asyncdb, metrics
+from fablab_visitor_logger.capture import (
+    SCAN_FAILED,
+    CaptureReader,
+    CaptureRecord,
+    CaptureWriter,
+    CorruptRecord,
+)
+from fablab_visitor_logger.clock import SYSTEM_CLOCK, Clock, ManualClock
 from fablab_visitor_logger.config import Config, DeviceStatus
 from fablab_visitor_logger.database import Database  # Needed for type hint
+from fablab_visitor_logger.spool import Spool
 from fablab_visitor_logger.vendor import get_vendor
 
+if TYPE_CHECKING:
+    # NumPy is only loaded by the aggregator, which creates the ZoneLocator
+    from fablab_visitor_logger.zones import ZoneLocator
+
 
 # Keep DeviceData TypedDict, adjust fields based on bleak availability
 class DeviceData(TypedDict):
@@ -29,16 +58,32 @@ class DeviceData(TypedDict):
     tx_power: Optional[int]
     # Appearance is not directly available in Bleak AdvertisementData
     service_data: Dict[Any, str]  # General key type (str expected from bleak)
+    sensor_rssi: NotRequired[Dict[str, int]]  # Per-sensor RSSI, from the aggregator
 
 
 class BLEScanner:
     """Handles scanning for BLE devices using Bleak."""
 
-    def __init__(self) -> None:
-        """Initialize the BLE Scanner."""
+    def __init__(
+        self, capture: Optional[CaptureWriter] = None, clock: Optional[Clock] = None
+    ) -> None:
+        """Initialize the BLE Scanner.
+
+        Args:
+            capture: Optional sink receiving every raw advertisement before
+                filtering. Defaults to a writer in Config.CAPTURE_DIR if set.
+            clock: Time source for scan timestamps; defaults to the system clock.
+        """
 
         self.logger = logging.getLogger(__name__)
+        self.clock = clock or SYSTEM_CLOCK
         # No scanner instance needed here, BleakScanner is used differently
+        if capture is None and Config.CAPTURE_DIR:
+            capture = CaptureWriter(Config.CAPTURE_DIR)
+        self.capture = capture
+        # Advertisements heard by the last scan, before RSSI filtering: an
+        # empty result with a non-zero count is a working scan, not a failure
+        self.heard = 0
 
     async def scan(self, duration: Optional[float] = None) -> List[DeviceData]:
         """Scan for BLE devices asynchronously and return their device data.
@@ -59,23 +104,20 @@ class BLEScanner:
         self.logger.debug(f"Starting BLE scan for {scan_duration:.1f} seconds...")
 
         devices_found: List[DeviceData] = []
+        scan_started = self.clock.time()
+        self.heard = 0
         try:
             # Use BleakScanner.discover(), requesting advertisement data
             # It returns a dictionary: {address: (BLEDevice, AdvertisementData)}
-            print("[DEBUG] scanner.py: Before BleakScannerClient.discover")  # DEBUG
-            discovered_results: Dict[
-                str, tuple[BLEDevice, AdvertisementData]
-            ] = await BleakScannerClient.discover(
-                timeout=scan_duration, return_adv=True
-            )
-            print(
-                "[DEBUG] scanner.py: After BleakScannerClient.discover, "
-                f"found {len(discovered_results)} results"
-            )  # DEBUG
+            discovered_results = await self._discover(scan_duration)
+            self.heard = len(discovered_results)
             self.logger.debug(
                 f"Bleak discovered {len(discovered_results)} devices raw."
             )
 
+            filter_start = time.perf_counter()
+            if self.capture is not None:
+                self._capture_raw(scan_started, discovered_results)
             # Iterate through the discovered devices and their advertisement data
             for _address, (device, ad_data) in discovered_results.items():
                 # Use RSSI from ad_data first, then device
@@ -97,6 +139,8 @@ class BLEScanner:
                         exc_info=True,
                     )
 
+            metrics.SCAN_FILTER_SECONDS.observe(time.perf_counter() - filter_start)
+            metrics.DEVICES_SEEN.observe(len(devices_found))
             self.logger.debug(
                 f"Processed {len(devices_found)} devices after filtering."
             )
@@ -104,6 +148,8 @@ class BLEScanner:
 
         except BleakError as e:
             self.logger.error(f"BLE scan failed with BleakError: {e}")
+            if self.capture is not None:
+                self._capture_failed(scan_started)
             # Re-raise Bleak specific error for potentially different handling upstream
             raise
         except Exception as e:
@@ -111,6 +157,61 @@ class BLEScanner:
             # Wrap unexpected errors
             raise Exception(f"Unexpected error during BLE scan: {e}") from e
 
+    async def _discover(
+        self, scan_duration: float
+    ) -> Dict[str, tuple[BLEDevice, AdvertisementData]]:
+        """Run Bleak discovery, retrying BleakErrors with exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                with metrics.SCAN_DISCOVERY_SECONDS.time():
+                    return await BleakScannerClient.discover(
+                        timeout=scan_duration, return_adv=True
+                    )
+            except BleakError as e:
+                metrics.SCAN_FAILURES_TOTAL.inc()
+                if attempt >= Config.SCAN_RETRIES:
+                    raise
+                delay = Config.SCAN_RETRY_BACKOFF * (2**attempt)
+                attempt += 1
+                self.logger.warning(
+                    f"BLE discovery failed ({e}); retry {attempt}/"
+                    f"{Config.SCAN_RETRIES} in {delay:.1f}s"
+                )
+                await self.clock.sleep(delay)
+
+    def _capture_raw(
+        self,
+        scan_started: float,
+        discovered_results: Dict[str, tuple[BLEDevice, AdvertisementData]],
+    ) -> None:
+        """Append the scan marker and every raw advertisement to the capture."""
+        assert self.capture is not None
+        try:
+            self.capture.mark_scan(scan_started, len(discovered_results))
+            for device, ad_data in discovered_results.values():
+                self.capture.append(
+                    scan_started,
+                    device.address,
+                    ad_data.rssi if ad_data.rssi is not None else device.rssi,
+                    ad_data.tx_power,
+                    ad_data.manufacturer_data,
+                    ad_data.service_data,
+                )
+            self.capture.flush()
+        except OSError as e:
+            # Capturing is best-effort and must never stop presence tracking
+            self.logger.error(f"Failed to write raw advertisement capture: {e}")
+
+    def _capture_failed(self, scan_started: float) -> None:
+        """Record a failed scan, so that replay freezes on it too."""
+        assert self.capture is not None
+        try:
+            self.capture.mark_scan(scan_started, SCAN_FAILED)
+            self.capture.flush()
+        except OSError as e:
+            self.logger.error(f"Failed to write raw advertisement capture: {e}")
+
     # Update signature to accept both device and ad_data
     def _create_device_data(
         self, device: BLEDevice, ad_data: AdvertisementData
@@ -129,7 +230,7 @@ class BLEScanner:
         return DeviceData(
             mac_address=device.address,
             rssi=rssi,
-            timestamp=datetime.now().isoformat(),
+            timestamp=self.clock.now().isoformat(),
             device_name=ad_data.local_name or device.name,
             vendor=get_vendor(device.address),
             service_uuids=ad_data.service_uuids or [],
@@ -158,33 +259,335 @@ class BLEScanner:
         return converted
 
 
+class ReplayScanner:
+    """Replays captured advertisements scan by scan in place of BLEScanner.
+
+    Each scan marker starts one scan, so empty scans replay as empty cycles
+    and failed ones raise BleakError as they did live. In segments written
+    before markers existed, records sharing a scan timestamp form one scan.
+    RSSI filtering is applied at replay time with the current Config, so
+    history can be re-run with different thresholds. ``clock`` is set to
+    each scan's capture time; give the same clock to the tracker and
+    Database so that the replayed history is stamped with the captured
+    times.
+    """
+
+    def __init__(
+        self, reader: CaptureReader, clock: Optional[ManualClock] = None
+    ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.reader = reader
+        self.clock = clock or ManualClock()
+        self.heard = 0  # As BLEScanner.heard
+        self._records: Iterator[CaptureRecord] = iter(reader)
+        self._pending: Optional[CaptureRecord] = None
+        self.exhausted = False
+
+    async def scan(self, duration: Optional[float] = None) -> List[DeviceData]:
+        """Return the next captured scan, filtered and converted.
+
+        Raises:
+            BleakError: If the captured scan failed.
+        """
+        record = self._pending or next(self._records, None)
+        self._pending = None
+        if record is None:
+            self.exhausted = True
+            return []
+        scan_time = record.timestamp
+        self.clock.set(scan_time)
+        failed = record.is_scan and record.devices == SCAN_FAILED
+        advertisements: List[CaptureRecord] = []
+        if record.is_scan:
+            # The advertisements up to the next marker
+            record = next(self._records, None)
+            while record is not None and not record.is_scan:
+                advertisements.append(record)
+                record = next(self._records, None)
+        else:
+            # Unmarked segment: the records sharing this scan timestamp
+            while (
+                record is not None
+                and not record.is_scan
+                and record.timestamp == scan_time
+            ):
+                advertisements.append(record)
+                record = next(self._records, None)
+        self._pending = record
+        self.exhausted = record is None
+        self.heard = len(advertisements)
+        if failed:
+            raise BleakError("Captured scan failed")
+        return self._convert(advertisements, scan_time)
+
+    def _convert(
+        self, advertisements: List[CaptureRecord], scan_time: float
+    ) -> List[DeviceData]:
+        timestamp = datetime.fromtimestamp(scan_time).isoformat()
+        devices: List[DeviceData] = []
+        for record in advertisements:
+            if record.rssi < Config.RSSI_THRESHOLD:
+                continue
+            try:
+                manufacturer, service = record.sections()
+                address = record.address
+            except CorruptRecord as e:
+                self.logger.error(f"Skipping corrupt capture record: {e}")
+                metrics.CAPTURE_CORRUPT_TOTAL.inc()
+                continue
+            devices.append(
+                DeviceData(
+                    mac_address=address,
+                    rssi=record.rssi,
+                    timestamp=timestamp,
+                    device_name=None,
+                    vendor=get_vendor(address),
+                    service_uuids=[],
+                    manufacturer_data={k: v.hex() for k, v in manufacturer.items()},
+                    tx_power=record.tx_power,
+                    service_data={k: v.hex() for k, v in service.items()},
+                )
+            )
+        return devices
+
+
+# Database batch writes the tracker spools while the database is failing
+SPOOLED_WRITES = ("log_presence_batch", "log_device_info_batch", "log_zone_events")
+SPOOL_DRAIN_CHUNK = 16  # spooled writes read per peek
+
+
+def _encode_write(method: str, rows: List[Any], timestamp: datetime) -> bytes:
+    if method == "log_presence_batch":
+        rows = [(mac, status.value, rssi) for mac, status, rssi in rows]
+    record = {"method": method, "timestamp": timestamp.isoformat(), "rows": rows}
+    return zlib.compress(json.dumps(record).encode())
+
+
+def _decode_write(payload: bytes) -> tuple:
+    record = json.loads(zlib.decompress(payload))
+    method, rows = record["method"], record["rows"]
+    if method not in SPOOLED_WRITES:
+        raise ValueError(f"Unknown spooled write {method!r}")
+    if method == "log_presence_batch":
+        rows = [(mac, DeviceStatus(status), rssi) for mac, status, rssi in rows]
+    return method, rows, datetime.fromisoformat(record["timestamp"])
+
+
 class PresenceTracker:
     """Tracks device presence based on scan results."""
 
     # Add type hints for dependencies
-    def __init__(self, scanner: BLEScanner, database: Database):
+    def __init__(
+        self,
+        scanner: BLEScanner,
+        database: Union[Database, asyncdb.AsyncDatabase],
+        zones: Optional["ZoneLocator"] = None,
+        spool: Optional[Spool] = None,
+        clock: Optional[Clock] = None,
+    ):
         self.scanner = scanner
         self.db = database
+        self.zones = zones
+        self.spool = spool
+        self.clock = clock or SYSTEM_CLOCK
         """Initialize the Presence Tracker.
 
         Args:
             scanner: The BLEScanner instance to use for scanning.
-            database: The Database instance for logging presence.
+            database: The Database for logging presence, or an AsyncDatabase
+                to run the writes off the event loop.
+            zones: Optional ZoneLocator fed with the per-sensor RSSI of
+                aggregated scans; zone changes are logged as zone events.
+            spool: Optional Spool journaling writes the database rejects;
+                they are replayed in order once it accepts writes again.
+            clock: Time source for the cycle timestamps; defaults to the
+                system clock.
         """
 
         self.logger = logging.getLogger(__name__)
         # Format: {mac: {'last_seen': datetime, 'missed_pings': int}}
         self.device_states: Dict[str, Dict[str, Any]] = {}
+        self._db_seconds = 0.0  # DB write time accumulated in the current cycle
+        # Scan health: devices seen in the last accepted scan, and cycles whose
+        # missed pings were frozen because the scan failed or came back empty
+        self.degraded = False
+        self._recent_population = 0
+        self._frozen_cycles = 0
+
+    def _log_summary(
+        self,
+        description: str,
+        macs: List[str],
+        stored_ids: Dict[str, str],
+        vendors: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Log one INFO line per cycle instead of one per device.
+
+        Devices are listed by the ID the presence write stored for them (their
+        pseudonym, keeping MAC addresses out of the log file, unless
+        anonymization is off). Devices whose write was spooled have no stored
+        ID yet and are only counted.
+        """
+        if not macs or not self.logger.isEnabledFor(logging.INFO):
+            return
+        shown = [mac for mac in macs if mac in stored_ids]
+        shown = shown[: Config.LOG_DEVICE_DETAIL_LIMIT]
+        listed = ", ".join(
+            f"{stored_ids[mac]} ({vendors[mac]})" if vendors else stored_ids[mac]
+            for mac in shown
+        )
+        extra = len(macs) - len(shown)
+        suffix = f" (+{extra} more)" if extra > 0 else ""
+        self.logger.info(f"{len(macs)} {description}: {listed}{suffix}")
+
+    async def _db_write(self, method: str, *args: Any) -> Any:
+        """Call a database write method, accounting its time to the cycle.
+
+        With an AsyncDatabase the write runs on its worker thread while the
+        event loop keeps serving other tasks.
+        """
+        start = time.perf_counter()
+        try:
+            return await asyncdb.call(self.db, method, *args)
+        finally:
+            self._db_seconds += time.perf_counter() - start
+
+    async def _write(self, method: str, rows: List[Any], timestamp: datetime) -> Any:
+        """Apply a batch write, or spool it behind earlier failed writes.
+
+        While the spool holds a backlog, new writes are queued after it so
+        that the database sees every batch in cycle order.
+
+        Returns:
+            The write method's result, or None if the write was spooled.
+        """
+        if self.spool is None:
+            return await self._db_write(method, rows, timestamp)
+        if not self.spool.records:
+            try:
+                return await self._db_write(method, rows, timestamp)
+            except (sqlite3.Error, OSError) as e:
+                self.logger.warning(f"Database write failed, spooling: {e}")
+        if rows:
+            self.spool.append(_encode_write(method, rows, timestamp))
+            metrics.SPOOLED_TOTAL.inc()
+        return None
+
+    async def _drain_spool(self) -> None:
+        """Replay spooled writes oldest first for up to SPOOL_DRAIN_SECONDS."""
+        assert self.spool is not None
+        spool = self.spool
+        dropped = spool.dropped
+        start = time.perf_counter()
+        drained = 0
+        try:
+            while (
+                spool.records
+                and time.perf_counter() - start < Config.SPOOL_DRAIN_SECONDS
+            ):
+                for payload in spool.peek(SPOOL_DRAIN_CHUNK):
+                    try:
+                        method, rows, timestamp = _decode_write(payload)
+                    except (ValueError, KeyError, TypeError, zlib.error) as e:
+                        # Skipped, or it would block every write behind it
+                        self.logger.error(f"Discarding undecodable spooled write: {e}")
+                        metrics.SPOOL_CORRUPT_TOTAL.inc()
+                        spool.consume(1)
+                        continue
+                    await self._db_write(method, rows, timestamp)
+                    spool.consume(1)
+                    drained += 1
+        except (sqlite3.Error, OSError) as e:
+            self.logger.warning(
+                f"Spool replay paused with {spool.records} writes pending: {e}"
+            )
+        finally:
+            metrics.SPOOL_DRAINED_TOTAL.inc(drained)
+            metrics.SPOOL_DROPPED_TOTAL.inc(spool.dropped - dropped)
+            metrics.SPOOL_RECORDS.set(spool.records)
+            metrics.SPOOL_BYTES.set(spool.bytes)
+        if drained:
+            self.logger.info(
+                f"Replayed {drained} spooled write(s), {spool.records} pending"
+            )
+
+    def _enter_degraded(self, reason: str) -> None:
+        """Freeze missed-ping counters for a cycle with no usable scan."""
+        self._frozen_cycles += 1
+        metrics.FROZEN_CYCLES_TOTAL.inc()
+        if not self.degraded:
+            self.degraded = True
+            metrics.SCAN_DEGRADED.set(1)
+            self.logger.warning(
+                f"Entering degraded mode ({reason}); freezing missed-ping "
+                f"counters for {len(self.device_states)} tracked devices."
+            )
+
+    def _is_suspicious_empty_scan(self, devices_seen: List[DeviceData]) -> bool:
+        """An empty scan right after a populated one is treated as a failure.
+
+        Unless the scanner reports advertisements it heard and filtered out
+        (``heard``): then the scan worked and nobody in range was seen.
+        """
+        return (
+            not devices_seen
+            and not getattr(self.scanner, "heard", 0)
+            and self._recent_population > 0
+            and self._frozen_cycles < Config.MAX_DEGRADED_CYCLES
+        )
+
+    async def _update_zones(
+        self,
+        devices_seen: List[DeviceData],
+        gone_macs: List[str],
+        current_time: datetime,
+    ) -> None:
+        """Assign seen devices to zones and log every zone change."""
+        assert self.zones is not None
+        start = time.perf_counter()
+        changes = self.zones.update(
+            {
+                d["mac_address"]: d["sensor_rssi"]
+                for d in devices_seen
+                if "sensor_rssi" in d
+            }
+        )
+        changes += self.zones.forget(gone_macs)
+        metrics.ZONE_SECONDS.observe(time.perf_counter() - start)
+        if changes:
+            metrics.ZONE_CHANGES_TOTAL.inc(len(changes))
+            await self._write("log_zone_events", changes, current_time)
 
     # Make method async as scanner.scan is now async
     async def update_presence(self) -> int:
-        """Perform async scan and update presence status for all devices."""
+        """Perform async scan and update presence status for all devices.
+
+        Failed scans, and empty scans while devices were recently present,
+        put the tracker in degraded mode: missed-ping counters are frozen
+        instead of pushing the whole room to ABSENT/DEPARTED. Frozen cycles
+        never count as misses: the first scan after recovery, often partial,
+        ages the devices it missed by a single ping like any other scan.
+        """
         self.logger.debug("Starting presence update cycle.")
         try:
             # Await the async scan
             devices_seen_data: List[DeviceData] = await self.scanner.scan()
-            current_time = datetime.now()
+            if self._is_suspicious_empty_scan(devices_seen_data):
+                self._enter_degraded("empty scan")
+                return 0
+
+            cycle_start = time.perf_counter()
+            self._db_seconds = 0.0
+            current_time = self.clock.now()
             seen_macs = set()  # Optimize lookup
+            new_devices: Dict[str, str] = {}  # MAC -> vendor
+            presence_entries: List[tuple] = []
+            device_infos: List[tuple] = []
+            if self.degraded:
+                self.logger.warning(
+                    f"Scan recovered after {self._frozen_cycles} degraded "
+                    "cycle(s); resuming missed-ping counting."
+                )
 
             # Update seen devices
             for device_data in devices_seen_data:
@@ -194,17 +597,18 @@ class PresenceTracker:
                 if mac in self.device_states:
                     self.device_states[mac]["missed_pings"] = 0
                 else:
-                    # New device detected
-                    self.logger.info(
-                        f"New device detected: {mac} "
-                        f"(Vendor: {device_data.get('vendor', 'Unknown')})"
-                    )
+                    # New device detected; reported in the cycle summary
+                    vendor = device_data.get("vendor", "Unknown")
+                    self.logger.debug(f"New device detected: {mac} (Vendor: {vendor})")
+                    new_devices[mac] = vendor
                     self.device_states[mac] = {"missed_pings": 0}
+                    metrics.NEW_DEVICES_TOTAL.inc()
                 self.device_states[mac]["last_seen"] = current_time
 
-                # Log presence and device info
-                # Use DeviceStatus enum correctly
-                self.db.log_presence(mac, DeviceStatus.PRESENT, device_data["rssi"])
+                # Presence rows are written in one batch at the end of the cycle
+                presence_entries.append(
+                    (mac, DeviceStatus.PRESENT, device_data["rssi"])
+                )
 
                 # Prepare device_info dict for logging
                 # Use vendor info obtained during scan
@@ -221,11 +625,11 @@ class PresenceTracker:
                     # "appearance": device_data.get("appearance"), # Not available
                     "service_data": device_data.get("service_data", {}),
                 }
-                # Log device info (consider logging less frequently)
-                self.db.log_device_info(mac, device_info_to_log)
+                device_infos.append((mac, device_info_to_log))
 
             # Check for absent/departed devices (Optimized)
             departed_macs = []
+            absent_macs: List[str] = []
             for mac, state in self.device_states.items():
                 if mac not in seen_macs:
                     state["missed_pings"] += 1
@@ -234,18 +638,52 @@ class PresenceTracker:
                     )
 
                     if state["missed_pings"] >= Config.DEPARTURE_THRESHOLD:
-                        self.logger.info(f"Device {mac} marked as DEPARTED.")
-                        self.db.log_presence(mac, DeviceStatus.DEPARTED)
+                        self.logger.debug(f"Device {mac} marked as DEPARTED.")
+                        presence_entries.append((mac, DeviceStatus.DEPARTED, None))
+                        metrics.TRANSITIONS_TOTAL.labels(status="departed").inc()
                         departed_macs.append(mac)  # Mark for removal
                     elif state["missed_pings"] >= Config.PING_TIMEOUT:
-                        self.logger.info(f"Device {mac} marked as ABSENT.")
-                        self.db.log_presence(mac, DeviceStatus.ABSENT)
+                        self.logger.debug(f"Device {mac} marked as ABSENT.")
+                        absent_macs.append(mac)
+                        presence_entries.append((mac, DeviceStatus.ABSENT, None))
+                        metrics.TRANSITIONS_TOTAL.labels(status="absent").inc()
                     # Else: still considered present until PING_TIMEOUT
 
+            stored_ids = (
+                await self._write("log_presence_batch", presence_entries, current_time)
+                or {}
+            )
+            # After the presence batch, which creates the devices rows
+            await self._write("log_device_info_batch", device_infos, current_time)
+            if self.zones is not None:
+                await self._update_zones(
+                    devices_seen_data, absent_macs + departed_macs, current_time
+                )
+            if self.spool is not None:
+                await self._drain_spool()
+
             # Remove departed devices from state tracking
             for mac in departed_macs:
                 del self.device_states[mac]
 
+            self._recent_population = len(devices_seen_data)
+            self._frozen_cycles = 0
+            if self.degraded:
+                self.degraded = False
+                metrics.SCAN_DEGRADED.set(0)
+
+            self._log_summary(
+                "new device(s) detected", list(new_devices), stored_ids, new_devices
+            )
+            self._log_summary("device(s) marked as ABSENT", absent_macs, stored_ids)
+            self._log_summary("device(s) marked as DEPARTED", departed_macs, stored_ids)
+
+            metrics.DB_WRITE_SECONDS.observe(self._db_seconds)
+            metrics.TRACKER_SECONDS.observe(
+                time.perf_counter() - cycle_start - self._db_seconds
+            )
+            metrics.TRACKED_DEVICES.set(len(self.device_states))
+
             self.logger.debug(
                 f"Presence update cycle finished. Active devices in state: "
                 f"{len(self.device_states)}"
@@ -254,8 +692,8 @@ class PresenceTracker:
 
         except BleakError as e:
             self.logger.error(f"BLE scan failed during presence update: {e}")
-            # Decide how to handle scan failures - maybe return 0 or re-raise?
-            # For now, log and return 0 to allow main loop to continue.
+            # Nothing is known about this cycle, so don't count it as a miss
+            self._enter_degraded("scan failed")
             return 0
         except Exception as e:
             self.logger.error(
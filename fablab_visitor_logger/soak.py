@@ -0,0 +1,381 @@
+"""Accelerated-time soak test of the scan loop.
+
+Runs ``PresenceMonitoringApp`` on a ``SimulatedClock`` against
+``FablabDayScanner``, a synthetic model of a fablab's traffic:
+
+- opening hours per weekday (closed on Sunday), with walk-in visitors
+  arriving at random, more of them after work;
+- recurring workshops where a group arrives together and leaves at the
+  end;
+- staff devices during opening hours and a few always-on devices
+  (printers, beacons);
+- visitor phones and watches rotating their random MAC address every
+  ``ROTATION_MINUTES``, as iOS and Android do, so the tracker keeps seeing
+  "new" devices.
+
+Every ``sample_minutes`` of simulated time, the harness records the
+Python heap (``tracemalloc``), the size of ``PresenceTracker.device_states``
+and of the database files, and the mean real time per scan cycle. After the
+warm-up, the run fails if the heap or the cycle latency trend upward: the
+median of the second half of the samples is compared with the median of the
+first half. Run whole weeks after the warm-up so both halves see the same
+mix of days, and make the warm-up long enough for bounded caches to fill:
+a full cache is a plateau, not a leak, but one still filling looks like
+growth. The command line shrinks the pseudonym cache to fill in about two
+days. On failure, the source lines whose allocations grew most since the
+warm-up are listed.
+
+Usage::
+
+    python -m fablab_visitor_logger.soak [--days 17] [--speed 1000]
+"""
+
+import argparse
+import asyncio
+import functools
+import hashlib
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from fablab_visitor_logger import metrics
+from fablab_visitor_logger.api import PresenceAPI
+from fablab_visitor_logger.asyncdb import AsyncDatabase
+from fablab_visitor_logger.clock import Clock, SimulatedClock
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.main import PresenceMonitoringApp
+from fablab_visitor_logger.scanner import DeviceData, PresenceTracker
+
+SOAK_START = datetime(2025, 1, 6)  # A Monday
+
+# Weekday (Monday=0) -> opening hours [open, close); closed on other days
+OPENING_HOURS = {0: (10, 22), 1: (10, 22), 2: (10, 22), 3: (10, 22), 4: (10, 22)}
+OPENING_HOURS[5] = (10, 18)
+# Weekday -> (start hour, end hour, attendees) of the recurring workshop
+WORKSHOPS = {1: (18, 21, 16), 3: (18, 21, 16), 5: (11, 14, 12)}
+WALK_INS_PER_HOUR = 5.0  # Doubled from 17:00 to 20:00
+STAFF_DEVICES = 3
+FIXED_DEVICES = 4
+ROTATION_MINUTES = 15
+DETECTION_PROBABILITY = 0.9  # Chance a present device is seen in a scan
+
+MEMORY_GROWTH_LIMIT = 0.10
+LATENCY_GROWTH_LIMIT = 0.50
+
+
+class Visit(NamedTuple):
+    visit_id: int
+    departure: datetime
+    devices: int
+    rssi: int
+    phase: float  # Seconds into the rotation period when the visit started
+
+
+class FablabDayScanner:
+    """Synthetic scanner returning the devices present at the clock's time."""
+
+    def __init__(self, clock: Clock, seed: int = 0) -> None:
+        self.clock = clock
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self._visits: List[Visit] = []
+        self._next_visit = 0
+        self._last_scan: Optional[datetime] = None
+        self._workshops_started: set = set()
+
+    async def scan(self, duration: Optional[float] = None) -> List[DeviceData]:
+        now = self.clock.now()
+        elapsed = (now - self._last_scan) if self._last_scan else timedelta(0)
+        self._last_scan = now
+        self._arrive(now, min(elapsed, timedelta(hours=1)))
+        self._visits = [v for v in self._visits if v.departure > now]
+
+        devices = [
+            self._device(f"fixed-{n}", -60, now, vendor="Unknown")
+            for n in range(FIXED_DEVICES)
+        ]
+        hours = OPENING_HOURS.get(now.weekday())
+        if hours and hours[0] - 0.5 <= now.hour + now.minute / 60 < hours[1] + 0.5:
+            devices += [
+                self._device(f"staff-{n}", -55, now, vendor="Samsung")
+                for n in range(STAFF_DEVICES)
+            ]
+        rotation = ROTATION_MINUTES * 60
+        for visit in self._visits:
+            period = int((now.timestamp() + visit.phase) // rotation)
+            for n in range(visit.devices):
+                devices.append(
+                    self._device(
+                        f"{visit.visit_id}-{n}-{period}",
+                        visit.rssi,
+                        now,
+                        vendor="Apple",
+                        random_address=True,
+                    )
+                )
+        return [d for d in devices if self.rng.random() < DETECTION_PROBABILITY]
+
+    def _arrive(self, now: datetime, elapsed: timedelta) -> None:
+        hours = OPENING_HOURS.get(now.weekday())
+        if hours is None:
+            return
+        closing = now.replace(hour=hours[1], minute=0, second=0, microsecond=0)
+        if hours[0] <= now.hour < hours[1] - 1:  # No walk-ins in the last hour
+            rate = WALK_INS_PER_HOUR * (2 if 17 <= now.hour < 20 else 1)
+            for _ in range(_poisson(self.rng, rate * elapsed.total_seconds() / 3600)):
+                stay = timedelta(minutes=min(360, self.rng.lognormvariate(4.5, 0.6)))
+                self._add_visit(min(now + stay, closing))
+        workshop = WORKSHOPS.get(now.weekday())
+        key = now.date()
+        if workshop and workshop[0] <= now.hour < workshop[1]:
+            if key not in self._workshops_started:
+                self._workshops_started.add(key)
+                end = now.replace(hour=workshop[1], minute=0, second=0)
+                for _ in range(workshop[2]):
+                    self._add_visit(end + timedelta(minutes=self.rng.uniform(0, 20)))
+
+    def _add_visit(self, departure: datetime) -> None:
+        self._visits.append(
+            Visit(
+                self._next_visit,
+                departure,
+                2 if self.rng.random() < 0.4 else 1,  # Phone, maybe a watch
+                self.rng.randint(-85, -50),
+                self.rng.uniform(0, ROTATION_MINUTES * 60),
+            )
+        )
+        self._next_visit += 1
+
+    def _device(
+        self,
+        name: str,
+        rssi: int,
+        now: datetime,
+        vendor: str,
+        random_address: bool = False,
+    ) -> DeviceData:
+        digest = bytearray(
+            hashlib.blake2b(f"{self.seed}:{name}".encode(), digest_size=6).digest()
+        )
+        if random_address:
+            digest[0] = digest[0] & 0x3F | 0x40  # Resolvable private address
+        else:
+            digest[0] &= 0xFC  # Public, unicast
+        return DeviceData(
+            mac_address=":".join(f"{b:02X}" for b in digest),
+            rssi=max(-100, min(-30, rssi + round(self.rng.gauss(0, 3)))),
+            timestamp=now.isoformat(),
+            device_name=None,
+            vendor=vendor,
+            service_uuids=[],
+            manufacturer_data={0x004C: "1005031c0e3d5a"} if random_address else {},
+            tx_power=None,
+            service_data={},
+        )
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    """Knuth's method; the means here are well below 1 per scan."""
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+class Sample(NamedTuple):
+    at: datetime  # Simulated time
+    traced_bytes: int  # Python heap traced by tracemalloc
+    device_states: int
+    db_bytes: int  # Database file plus write-ahead log
+    cycle_seconds: float  # Mean real seconds per cycle since the last sample
+    cycles: int
+
+
+class SoakReport(NamedTuple):
+    samples: List[Sample]  # After the warm-up
+    failures: List[str]
+    top_growth: List[str]  # Allocation sites that grew most after the warm-up
+
+
+def growth(values: Sequence[float]) -> float:
+    """Relative change of the median of the second half over the first."""
+    half = len(values) // 2
+    if half == 0:
+        return 0.0
+    first = statistics.median(values[:half])
+    second = statistics.median(values[-half:])
+    return (second - first) / first if first else 0.0
+
+
+def check_trends(
+    samples: Sequence[Sample],
+    memory_limit: float = MEMORY_GROWTH_LIMIT,
+    latency_limit: float = LATENCY_GROWTH_LIMIT,
+) -> List[str]:
+    """Failures for heap or cycle latency growing beyond the limits."""
+    failures = []
+    memory = growth([s.traced_bytes for s in samples])
+    if memory > memory_limit:
+        failures.append(f"Heap grew {memory:.0%} (limit {memory_limit:.0%})")
+    latency = growth([s.cycle_seconds for s in samples if s.cycles])
+    if latency > latency_limit:
+        failures.append(f"Cycle latency grew {latency:.0%} (limit {latency_limit:.0%})")
+    return failures
+
+
+def _db_bytes(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+async def run_soak(
+    days: float,
+    speed: float = 1000.0,
+    seed: int = 0,
+    start: datetime = SOAK_START,
+    sample_minutes: float = 60,
+    warmup_days: float = 3.0,
+) -> SoakReport:
+    """Run the scan loop for ``days`` of simulated time on Config's database."""
+    clock = SimulatedClock(start, speed)
+    scanner = FablabDayScanner(clock, seed)
+    tracemalloc.start()
+    db = AsyncDatabase(functools.partial(Database, clock=clock))
+    tracker = PresenceTracker(scanner, db, clock=clock)
+    app = PresenceMonitoringApp(
+        scanner=scanner,
+        db=db,
+        tracker=tracker,
+        metrics_exporter=metrics.MetricsExporter(),
+        api=PresenceAPI(tracker, clock=clock),
+        clock=clock,
+    )
+    end = start + timedelta(days=days)
+    warm_end = start + timedelta(days=warmup_days)
+    samples: List[Sample] = []
+    baseline = None
+    cycles, cycle_time = metrics.CYCLE_SECONDS.count, metrics.CYCLE_SECONDS.sum
+    run = asyncio.ensure_future(app.run())
+    try:
+        while clock.now() < end and not run.done():
+            await clock.sleep(sample_minutes * 60)
+            count = metrics.CYCLE_SECONDS.count - cycles
+            # Cycle times are measured on the clock: simulated seconds
+            seconds = (metrics.CYCLE_SECONDS.sum - cycle_time) / speed
+            cycles, cycle_time = metrics.CYCLE_SECONDS.count, metrics.CYCLE_SECONDS.sum
+            if clock.now() < warm_end:
+                continue
+            if baseline is None:
+                baseline = _snapshot()
+            samples.append(
+                Sample(
+                    clock.now(),
+                    tracemalloc.get_traced_memory()[0],
+                    len(tracker.device_states),
+                    _db_bytes(Config.DATABASE_PATH),
+                    seconds / count if count else 0.0,
+                    count,
+                )
+            )
+    finally:
+        app.stop()
+        await run
+        await db.close()
+        final = _snapshot()
+        tracemalloc.stop()
+    top_growth = (
+        [str(stat) for stat in final.compare_to(baseline, "lineno")[:10]]
+        if baseline is not None
+        else []
+    )
+    return SoakReport(samples, check_trends(samples), top_growth)
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),)
+    )
+
+
+def _print_report(report: SoakReport) -> None:
+    daily: Dict[str, Sample] = {}
+    for sample in report.samples:
+        day = sample.at.strftime("%a %Y-%m-%d")
+        peak = max(
+            sample.device_states, daily[day].device_states if day in daily else 0
+        )
+        daily[day] = sample._replace(device_states=peak)  # Last, with peak states
+    print(f"{'day':<15} {'heap MiB':>9} {'states':>7} {'db MiB':>7} {'ms/cycle':>9}")
+    for day, s in daily.items():
+        print(
+            f"{day:<15} {s.traced_bytes / 2**20:9.2f} {s.device_states:7d} "
+            f"{s.db_bytes / 2**20:7.2f} {s.cycle_seconds * 1000:9.2f}"
+        )
+    samples = report.samples
+    print(
+        f"Growth after warm-up: heap {growth([s.traced_bytes for s in samples]):+.1%}"
+        f", latency {growth([s.cycle_seconds for s in samples if s.cycles]):+.1%}"
+        f", device_states {growth([s.device_states for s in samples]):+.1%}"
+        f", database {growth([s.db_bytes for s in samples]):+.1%}"
+    )
+    for failure in report.failures:
+        print(f"FAIL: {failure}")
+    if report.failures:
+        print("Largest allocation growth since the warm-up:")
+        for line in report.top_growth:
+            print(f"  {line}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=float, default=17)
+    parser.add_argument("--speed", type=float, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warmup-days", type=float, default=3)
+    parser.add_argument("--sample-minutes", type=float, default=60)
+    parser.add_argument(
+        "--retention-days",
+        type=int,
+        default=2,
+        help="raw log retention; the minutely and hourly tiers keep 2x and 4x",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="pseudonym cache size; the default fills during the warm-up",
+    )
+    parser.add_argument("--database", help="keep the database at this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.DATABASE_PATH = args.database or os.path.join(tmp, "soak.db")
+        Config.PSEUDONYM_KEY_FILE = os.path.join(tmp, "soak.key")
+        Config.LOG_FILE = os.path.join(tmp, "soak.log")
+        Config.LOG_LEVEL = "WARNING"
+        Config.PSEUDONYM_CACHE_SIZE = args.cache_size
+        Config.DATA_RETENTION_DAYS = args.retention_days
+        Config.MINUTELY_RETENTION_DAYS = 2 * args.retention_days
+        Config.HOURLY_RETENTION_DAYS = 4 * args.retention_days
+        report = asyncio.run(
+            run_soak(
+                args.days,
+                speed=args.speed,
+                seed=args.seed,
+                sample_minutes=args.sample_minutes,
+                warmup_days=args.warmup_days,
+            )
+        )
+    _print_report(report)
+    sys.exit(1 if report.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
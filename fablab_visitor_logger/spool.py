@@ -0,0 +1,205 @@
+"""Durable on-disk spool for writes the database could not take.
+
+Records are opaque byte strings appended to numbered segment files
+(``<seq>.spool``) in a directory and read back oldest first. Each record is
+``length u32, crc32 u32, payload`` (little-endian) and is fsynced when
+appended, so a record survives a crash once ``append`` returns. The read
+position is kept in a small ``head`` file (``<seq> <offset>``); fully read
+segments are deleted.
+
+Delivery is at-least-once: a crash between applying a record and
+``consume`` replays it after a restart. A torn record at the end of a
+segment (crash during ``append``) is truncated on open.
+
+The spool holds at most ``max_bytes``; appending beyond that drops the
+oldest segments, keeping recent data, and counts the dropped records.
+"""
+
+import logging
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fablab_visitor_logger.config import Config
+
+SEGMENT_BYTES = 1024 * 1024
+SEGMENT_SUFFIX = ".spool"
+HEAD_FILE = "head"
+
+_RECORD = struct.Struct("<II")  # payload length, crc32 of the payload
+
+
+class Spool:
+    """Append-only journal of records, read and consumed oldest first."""
+
+    def __init__(
+        self, directory: str, max_bytes: int, segment_bytes: int = SEGMENT_BYTES
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.logger = logging.getLogger(__name__)
+        self.records = 0  # Records not yet consumed
+        self.bytes = 0  # Bytes on disk not yet consumed
+        self.dropped = 0  # Records dropped by the size cap
+        os.makedirs(directory, exist_ok=True)
+        self._segments: List[int] = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[: -len(SEGMENT_SUFFIX)].isdigit()
+        )
+        self._sizes: Dict[int, int] = {}
+        self._counts: Dict[int, int] = {}  # Unconsumed records per segment
+        self._head_seq, self._head_offset = self._read_head()
+        for seq in [s for s in self._segments if s < self._head_seq]:
+            self._remove_segment(seq)  # Consumed before a crash
+        if not self._segments or self._segments[0] != self._head_seq:
+            self._head_offset = 0
+        for seq in self._segments:
+            start = self._head_offset if seq == self._segments[0] else 0
+            count, end = self._scan(seq, start)
+            self._sizes[seq] = end
+            self._counts[seq] = count
+            self.records += count
+            self.bytes += end - start
+
+    def __len__(self) -> int:
+        return self.records
+
+    def append(self, payload: bytes) -> None:
+        """Durably append one record, dropping the oldest over the size cap."""
+        record = _RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+        while self._segments and self.bytes + len(record) > self.max_bytes:
+            self._drop_oldest()
+        if (
+            not self._segments
+            or self._sizes[self._segments[-1]] + len(record) > self.segment_bytes
+        ):
+            seq = self._segments[-1] + 1 if self._segments else self._head_seq
+            self._segments.append(seq)
+            self._sizes[seq] = 0
+            self._counts[seq] = 0
+        seq = self._segments[-1]
+        with open(self._path(seq), "ab") as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        self._sizes[seq] += len(record)
+        self._counts[seq] += 1
+        self.records += 1
+        self.bytes += len(record)
+
+    def peek(self, limit: int) -> List[bytes]:
+        """The oldest ``limit`` records, left in the spool."""
+        return [payload for _, _, payload in self._walk(limit, read=True)]
+
+    def consume(self, count: int) -> None:
+        """Remove the oldest ``count`` records once they have been applied."""
+        if count <= 0:
+            return
+        seq, offset = self._head_seq, self._head_offset
+        for seq, offset, _ in self._walk(count, read=False):
+            self._counts[seq] -= 1
+            self.records -= 1
+        for old in [s for s in self._segments if s < seq]:
+            self._remove_segment(old)
+        self.bytes = sum(self._sizes[s] for s in self._segments) - offset
+        if not self.records:
+            # Empty: start over in a fresh segment
+            for old in list(self._segments):
+                self._remove_segment(old)
+            seq, offset = seq + 1, 0
+            self.bytes = 0
+        self._head_seq, self._head_offset = seq, offset
+        self._write_head()
+
+    def _walk(self, limit: int, read: bool) -> Iterator[Tuple[int, int, bytes]]:
+        """Yield (segment, end offset, payload) of the oldest records."""
+        offset = self._head_offset
+        for seq in list(self._segments):
+            if limit <= 0:
+                return
+            if seq != self._segments[0]:
+                offset = 0
+            with open(self._path(seq), "rb") as f:
+                f.seek(offset)
+                while limit > 0 and offset < self._sizes[seq]:
+                    length, _ = _RECORD.unpack(f.read(_RECORD.size))
+                    if read:
+                        payload = f.read(length)
+                    else:
+                        f.seek(length, os.SEEK_CUR)
+                        payload = b""
+                    offset += _RECORD.size + length
+                    limit -= 1
+                    yield seq, offset, payload
+
+    def _scan(self, seq: int, start: int) -> Tuple[int, int]:
+        """Count valid records from start; truncate a torn or corrupt tail."""
+        path = self._path(seq)
+        count = 0
+        offset = start
+        with open(path, "rb") as f:
+            f.seek(start)
+            while True:
+                header = f.read(_RECORD.size)
+                if len(header) < _RECORD.size:
+                    break
+                length, crc = _RECORD.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                offset += _RECORD.size + length
+                count += 1
+        if offset < os.path.getsize(path):
+            self.logger.warning(f"Truncating damaged spool segment {path} at {offset}")
+            os.truncate(path, offset)
+        return count, offset
+
+    def _drop_oldest(self) -> None:
+        seq = self._segments[0]
+        dropped = self._counts[seq]
+        self.records -= dropped
+        self.bytes -= self._sizes[seq] - self._head_offset
+        self.dropped += dropped
+        self._remove_segment(seq)
+        self._head_seq = self._segments[0] if self._segments else seq + 1
+        self._head_offset = 0
+        self._write_head()
+        self.logger.error(
+            f"Spool over {self.max_bytes} bytes, dropped {dropped} records"
+        )
+
+    def _remove_segment(self, seq: int) -> None:
+        self._segments.remove(seq)
+        self._sizes.pop(seq, None)
+        self._counts.pop(seq, None)
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+
+    def _read_head(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, HEAD_FILE)) as f:
+                seq, offset = f.read().split()
+            return int(seq), int(offset)
+        except (FileNotFoundError, ValueError):
+            return (self._segments[0] if self._segments else 0), 0
+
+    def _write_head(self) -> None:
+        path = os.path.join(self.directory, HEAD_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{self._head_seq} {self._head_offset}\n")
+        os.replace(path + ".tmp", path)
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:012d}{SEGMENT_SUFFIX}")
+
+
+def from_config(name: str) -> Optional[Spool]:
+    """The spool ``name`` under ``Config.SPOOL_DIR``; None when spooling is off."""
+    if not Config.SPOOL_DIR:
+        return None
+    return Spool(os.path.join(Config.SPOOL_DIR, name), Config.SPOOL_MAX_BYTES)
@@ -0,0 +1,181 @@
+"""Zone assignment from per-sensor RSSI readings.
+
+With several sensors, the aggregator knows each device's RSSI at every
+sensor in a window. Every cycle, each device's readings are smoothed with an
+exponential moving average per sensor (after adding the sensor's calibrated
+offset), and the device is assigned to the zone whose best sensor has the
+strongest smoothed signal. A device only moves to another zone once that
+zone beats its current one by ``hysteresis`` dB, so a device halfway between
+two sensors does not flap.
+
+All state lives in NumPy arrays, one row per tracked device and one column
+per sensor, and a cycle's update runs as a handful of array operations over
+the devices seen in it. A sensor that did not see a device in a cycle it saw
+elsewhere counts as a ``missing_rssi`` reading, so its average decays.
+"""
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fablab_visitor_logger.config import Config, parse_pairs
+
+INITIAL_ROWS = 1024
+
+# (device ID, new zone); zone None when the device left every zone
+ZoneChange = Tuple[str, Optional[str]]
+
+
+class ZoneLocator:
+    """Assigns devices to zones from their smoothed per-sensor RSSI."""
+
+    def __init__(
+        self,
+        sensor_zones: Optional[Mapping[str, str]] = None,
+        offsets: Optional[Mapping[str, float]] = None,
+        smoothing: float = 0.3,
+        hysteresis: float = 4.0,
+        missing_rssi: float = -100.0,
+    ) -> None:
+        self.sensor_zones = dict(sensor_zones or {})
+        self.offsets = dict(offsets or {})
+        self.smoothing = smoothing
+        self.hysteresis = hysteresis
+        self.missing_rssi = missing_rssi
+        self.zones: List[str] = []  # Zone names by zone index
+        self._zone_index: Dict[str, int] = {}
+        self._sensors: Dict[str, int] = {}  # Column per sensor
+        self._zone_columns: List[List[int]] = []  # Sensor columns per zone
+        self._column_offsets = np.zeros(0, dtype=np.float32)
+        self._rows: Dict[str, int] = {}  # Row per device
+        self._free_rows: List[int] = []
+        # Smoothed RSSI per device and sensor; NaN until first reading
+        self._ema = np.full((INITIAL_ROWS, 0), np.nan, dtype=np.float32)
+        self._assigned = np.full(INITIAL_ROWS, -1, dtype=np.int32)  # Zone index
+
+    @classmethod
+    def from_config(cls) -> "ZoneLocator":
+        return cls(
+            parse_pairs(Config.SENSOR_ZONES),
+            parse_pairs(Config.SENSOR_RSSI_OFFSETS, float),
+            smoothing=Config.ZONE_SMOOTHING,
+            hysteresis=Config.ZONE_HYSTERESIS_DB,
+            missing_rssi=Config.ZONE_MISSING_RSSI,
+        )
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def zone_of(self, device_id: str) -> Optional[str]:
+        row = self._rows.get(device_id)
+        if row is None or self._assigned[row] < 0:
+            return None
+        return self.zones[self._assigned[row]]
+
+    def update(self, readings: Mapping[str, Mapping[str, int]]) -> List[ZoneChange]:
+        """Fold one cycle of readings in and return the zone changes.
+
+        Args:
+            readings: {device ID: {sensor: RSSI}} of the devices seen.
+        """
+        if not readings:
+            return []
+        devices = list(readings)
+        rows = np.fromiter(
+            (self._row(device) for device in devices), dtype=np.intp, count=len(devices)
+        )
+        positions: List[int] = []
+        columns: List[int] = []
+        values: List[int] = []
+        for position, per_sensor in enumerate(readings.values()):
+            for sensor, rssi in per_sensor.items():
+                positions.append(position)
+                columns.append(self._column(sensor))
+                values.append(rssi)
+
+        columns_array = np.array(columns, dtype=np.intp)
+        observed = np.full(
+            (len(devices), len(self._sensors)), self.missing_rssi, dtype=np.float32
+        )
+        observed[positions, columns_array] = (
+            np.array(values, dtype=np.float32) + self._column_offsets[columns_array]
+        )
+        previous = self._ema[rows]
+        smoothed = np.where(
+            np.isnan(previous),
+            observed,
+            previous + self.smoothing * (observed - previous),
+        )
+        self._ema[rows] = smoothed
+
+        # Strongest sensor per zone; zones are few, devices are many
+        scores = np.empty((len(devices), len(self.zones)), dtype=np.float32)
+        for zone, zone_columns in enumerate(self._zone_columns):
+            scores[:, zone] = smoothed[:, zone_columns].max(axis=1)
+        best = scores.argmax(axis=1)
+        everyone = np.arange(len(devices))
+        current = self._assigned[rows]
+        current_score = scores[everyone, np.maximum(current, 0)]
+        switch = (current < 0) | (
+            (best != current)
+            & (scores[everyone, best] >= current_score + self.hysteresis)
+        )
+        changed = np.flatnonzero(switch)
+        self._assigned[rows[changed]] = best[changed]
+        return [(devices[i], self.zones[best[i]]) for i in changed]
+
+    def forget(self, devices: Sequence[str]) -> List[ZoneChange]:
+        """Drop absent or departed devices; returns their exits from a zone."""
+        changes: List[ZoneChange] = []
+        for device in devices:
+            row = self._rows.pop(device, None)
+            if row is None:
+                continue
+            if self._assigned[row] >= 0:
+                changes.append((device, None))
+            self._ema[row] = np.nan
+            self._assigned[row] = -1
+            self._free_rows.append(row)
+        return changes
+
+    def _row(self, device: str) -> int:
+        row = self._rows.get(device)
+        if row is not None:
+            return row
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = len(self._rows)
+            if row == len(self._assigned):
+                self._grow_rows()
+        self._rows[device] = row
+        return row
+
+    def _grow_rows(self) -> None:
+        size = len(self._assigned)
+        self._ema = np.vstack(
+            [self._ema, np.full(self._ema.shape, np.nan, dtype=np.float32)]
+        )
+        self._assigned = np.concatenate(
+            [self._assigned, np.full(size, -1, dtype=np.int32)]
+        )
+
+    def _column(self, sensor: str) -> int:
+        column = self._sensors.get(sensor)
+        if column is not None:
+            return column
+        column = len(self._sensors)
+        self._sensors[sensor] = column
+        self._ema = np.hstack(
+            [self._ema, np.full((len(self._ema), 1), np.nan, dtype=np.float32)]
+        )
+        self._column_offsets = np.append(
+            self._column_offsets, np.float32(self.offsets.get(sensor, 0.0))
+        )
+        zone = self.sensor_zones.get(sensor, sensor)
+        if zone not in self._zone_index:
+            self._zone_index[zone] = len(self.zones)
+            self.zones.append(zone)
+            self._zone_columns.append([])
+        self._zone_columns[self._zone_index[zone]].append(column)
+        return column
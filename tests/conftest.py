@@ -0,0 +1,28 @@
+"""Shared test configuration."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from fablab_visitor_logger.config import ENV_PREFIX, Config
+
+
+@pytest.fixture(autouse=True, scope="session")
+def log_file(tmp_path_factory):
+    """Keep the log file out of the repo, also through Config.load() in main()."""
+    path = str(tmp_path_factory.mktemp("logs") / "presence_tracker.log")
+    with patch.dict(os.environ, {f"{ENV_PREFIX}LOG_FILE": path}), patch.object(
+        Config, "LOG_FILE", path
+    ):
+        yield path
+
+
+@pytest.fixture(autouse=True, scope="session")
+def pseudonym_key_file(tmp_path_factory):
+    """Keep the secret key out of the repo, wherever the test database is."""
+    path = str(tmp_path_factory.mktemp("keys") / "pseudonym.key")
+    with patch.dict(
+        os.environ, {f"{ENV_PREFIX}PSEUDONYM_KEY_FILE": path}
+    ), patch.object(Config, "PSEUDONYM_KEY_FILE", path):
+        yield path
@@ -0,0 +1,50 @@
+"""Tests for the vectorized occupancy analytics."""
+
+import numpy as np
+
+from fablab_visitor_logger.analytics import (
+    occupancy_sweep,
+    sessions_from_samples,
+    weekday_hour_heatmap,
+)
+
+
+def test_sessions_split_on_gap_and_device():
+    devices = np.array([0, 0, 1, 0, 0], dtype=np.int32)
+    times = np.array([0, 30, 30, 60, 600], dtype=np.int64)
+    arrivals, departures = sessions_from_samples(devices, times, 90, 30)
+    assert list(zip(arrivals, departures)) == [(0, 90), (600, 630), (30, 60)]
+
+
+def test_sweep_mean_and_peak_per_bucket():
+    arrivals = np.array([0, 900], dtype=np.int64)
+    departures = np.array([1800, 2700], dtype=np.int64)
+    series = occupancy_sweep(arrivals, departures, 0, 3600, 900)
+    assert list(series.bucket_starts) == [0, 900, 1800, 2700]
+    assert list(series.mean) == [1.0, 2.0, 1.0, 0.0]
+    assert list(series.peak) == [1, 2, 1, 0]
+
+
+def test_sweep_handoff_does_not_double_count():
+    arrivals = np.array([0, 600], dtype=np.int64)
+    departures = np.array([600, 1200], dtype=np.int64)
+    series = occupancy_sweep(arrivals, departures, 0, 1200, 1200)
+    assert list(series.peak) == [1]
+    assert list(series.mean) == [1.0]
+
+
+def test_heatmap_places_hours_by_weekday():
+    # 1970-01-05 was a Monday
+    monday_9am = 4 * 86400 + 9 * 3600
+    series = occupancy_sweep(
+        np.array([monday_9am]),
+        np.array([monday_9am + 1800]),
+        monday_9am,
+        monday_9am + 7200,
+        3600,
+    )
+    heatmap = weekday_hour_heatmap(series)
+    assert heatmap.shape == (7, 24)
+    assert heatmap[0, 9] == 0.5
+    assert heatmap[0, 10] == 0.0
+    assert np.isnan(heatmap[1, 9])
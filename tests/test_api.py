@@ -0,0 +1,134 @@
+"""Tests for the in-process JSON API."""
+
+import asyncio
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from fablab_visitor_logger.api import PresenceAPI
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.database import Database
+
+
+async def _get(port, path, headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    status = int(lines[0].split()[1])
+    header_map = dict(line.split(": ", 1) for line in lines[1:])
+    return status, header_map, body
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "api.db")
+    with patch.object(Config, "DATABASE_PATH", path):
+        Database().conn.close()
+        yield path
+
+
+@pytest.mark.asyncio
+async def test_current_is_served_from_tracker_state():
+    tracker = MagicMock()
+    tracker.degraded = False
+    tracker.device_states = {
+        "AA": {"missed_pings": 0},
+        "BB": {"missed_pings": 1},
+        "CC": {"missed_pings": Config.PING_TIMEOUT},
+    }
+    factory = MagicMock()
+    api = PresenceAPI(tracker, port=0, reporter_factory=factory)
+    await api.start()
+    try:
+        api.mark_cycle()
+        status, headers, body = await _get(api.port, "/api/presence/current")
+        assert status == 200
+        assert json.loads(body) == {
+            "cycle": 1,
+            "present": 2,
+            "absent": 1,
+            "degraded": False,
+        }
+
+        status, _, body = await _get(
+            api.port,
+            "/api/presence/current",
+            f"If-None-Match: {headers['ETag']}\r\n",
+        )
+        assert status == 304 and body == b""
+
+        api.mark_cycle()
+        status, _, _ = await _get(
+            api.port,
+            "/api/presence/current",
+            f"If-None-Match: {headers['ETag']}\r\n",
+        )
+        assert status == 200
+    finally:
+        await api.stop()
+    factory.assert_not_called()  # No database access
+
+
+@pytest.mark.asyncio
+async def test_history_uses_read_only_connection_once_per_cycle(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO devices VALUES ('AA', 'anon', NULL, NULL, 'present')")
+    start = datetime(2025, 3, 20, 10, 0)
+    conn.executemany(
+        "INSERT INTO presence_logs (device_id, timestamp, status, rssi) "
+        "VALUES ('AA', ?, 'present', -50)",
+        [(start + timedelta(seconds=s),) for s in range(0, 1800, 30)],
+    )
+    conn.commit()
+    conn.close()
+
+    from fablab_visitor_logger.reporting import Reporter
+
+    readers = []
+
+    def factory():
+        reporter = Reporter(read_only=True)
+        readers.append(reporter)
+        return reporter
+
+    api = PresenceAPI(MagicMock(), port=0, reporter_factory=factory)
+    path = "/api/presence/history?since=2025-03-20T10:00&until=2025-03-20T11:00"
+    with patch.object(Config, "DATABASE_PATH", db_path):
+        await api.start()
+        try:
+            status, _, body = await _get(api.port, path + "&bucket=30")
+            assert status == 200
+            assert [b["mean"] for b in json.loads(body)["buckets"]] == [1.0, 0.0]
+
+            with patch.object(Reporter, "occupancy_series") as series:
+                status, _, _ = await _get(api.port, path + "&bucket=30")
+                series.assert_not_called()  # Body cached for this cycle
+            assert status == 200
+
+            status, _, body = await _get(api.port, path + "&bucket=abc")
+            assert status == 400
+
+            with patch.object(Reporter, "occupancy_series") as series:
+                status, _, body = await _get(
+                    api.port, "/api/presence/history?since=1970-01-01&bucket=1"
+                )
+                series.assert_not_called()
+            assert status == 400
+            assert b"buckets" in body
+        finally:
+            await api.stop()
+
+    assert len(readers) == 1
+
+
+def test_read_only_database_rejects_writes(db_path):
+    db = Database(read_only=True)
+    with pytest.raises(sqlite3.OperationalError):
+        db.conn.execute("DELETE FROM presence_logs")
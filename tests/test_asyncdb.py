@@ -0,0 +1,97 @@
+"""Tests for the async database facade."""
+
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from fablab_visitor_logger.asyncdb import AsyncDatabase
+from fablab_visitor_logger.config import Config, DeviceStatus
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.pseudonym import Pseudonymizer
+from fablab_visitor_logger.scanner import PresenceTracker
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "async.db")
+    with patch.object(Config, "DATABASE_PATH", path):
+        yield path
+
+
+def _open():
+    return Database(pseudonymizer=Pseudonymizer(b"k" * 32))
+
+
+class FakeScanner:
+    async def scan(self):
+        return [{"mac_address": "AA:BB:CC:DD:EE:FF", "rssi": -50, "vendor": "X"}]
+
+
+@pytest.mark.asyncio
+async def test_tracker_writes_and_reports_run_on_the_database_thread(db_path):
+    db = AsyncDatabase(_open)
+    try:
+        assert await db.run(threading.get_ident) != threading.get_ident()
+        tracker = PresenceTracker(FakeScanner(), db)
+        assert await tracker.update_presence() == 1
+        stats = await db.report("get_stats")
+        assert stats["total_devices"] == 1 and stats["present_devices"] == 1
+    finally:
+        await db.close()
+    with pytest.raises(RuntimeError):
+        await db.cleanup_old_data()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_drop_a_queued_write(db_path):
+    db = AsyncDatabase(_open)
+    blocker = asyncio.ensure_future(db.run(time.sleep, 0.2))
+    write = asyncio.ensure_future(
+        db.log_presence_batch([("AA:BB:CC:DD:EE:FF", DeviceStatus.PRESENT, -50)])
+    )
+    await asyncio.sleep(0.01)
+    write.cancel()  # While still queued behind the blocker
+    await db.close()
+    assert blocker.done() and write.cancelled()
+
+    reader = _open()
+    assert reader.conn.execute("SELECT COUNT(*) FROM presence_logs").fetchone() == (1,)
+
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_during_slow_calls(db_path):
+    db = AsyncDatabase(_open)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.ensure_future(ticker())
+    try:
+        await db.run(time.sleep, 0.3)  # Stands in for a long cleanup
+    finally:
+        task.cancel()
+        await db.close()
+    assert ticks >= 10
+
+
+@pytest.mark.asyncio
+async def test_open_does_not_block_the_event_loop(db_path):
+    def slow_open():
+        time.sleep(0.2)  # Stands in for long migrations
+        return _open()
+
+    opening = asyncio.ensure_future(AsyncDatabase.open(slow_open))
+    await asyncio.sleep(0.01)
+    assert not opening.done()  # The loop kept running meanwhile
+    db = await opening
+    try:
+        assert await db.run(threading.get_ident) != threading.get_ident()
+    finally:
+        await db.close()
@@ -0,0 +1,202 @@
+"""Tests for the raw advertisement capture log and replay."""
+
+import sqlite3
+import time
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+from bleak.exc import BleakError
+
+from fablab_visitor_logger import metrics
+from fablab_visitor_logger.capture import (
+    MAGIC,
+    SCAN_FAILED,
+    CaptureReader,
+    CaptureWriter,
+    encode_record,
+    list_segments,
+)
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.scanner import BLEScanner, ReplayScanner
+
+HOUR_1 = time.mktime((2025, 3, 27, 10, 15, 0, 0, 0, -1))
+HOUR_2 = HOUR_1 + 3600
+
+
+def test_roundtrip_and_hourly_rotation(tmp_path):
+    writer = CaptureWriter(str(tmp_path))
+    writer.append(
+        HOUR_1, "AA:BB:CC:DD:EE:FF", -50, -20, {0x004C: b"\x01\x02"}, {"180d": b"x"}
+    )
+    writer.append(HOUR_1, "11:22:33:44:55:66", -90)
+    writer.append(HOUR_2, "AA:BB:CC:DD:EE:FF", -55)
+    writer.close()
+
+    segments = list_segments(str(tmp_path))
+    assert len(segments) == 2
+
+    with CaptureReader(str(tmp_path)) as reader:
+        records = list(reader)
+        assert [r.address for r in records] == [
+            "AA:BB:CC:DD:EE:FF",
+            "11:22:33:44:55:66",
+            "AA:BB:CC:DD:EE:FF",
+        ]
+        first = records[0]
+        assert first.timestamp == HOUR_1
+        assert first.rssi == -50
+        assert first.tx_power == -20
+        manufacturer = first.manufacturer_data
+        assert isinstance(manufacturer[0x004C], memoryview)  # Zero-copy slice
+        assert bytes(manufacturer[0x004C]) == b"\x01\x02"
+        assert bytes(first.service_data["180d"]) == b"x"
+        assert records[1].tx_power is None
+        assert records[1].manufacturer_data == {}
+        del records, first, manufacturer
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    path = tmp_path / "capture-20250327-10.seg"
+    good = encode_record(HOUR_1, "AA:BB:CC:DD:EE:FF", -40, None, None, None)
+    partial = encode_record(HOUR_1, "11:22:33:44:55:66", -40, None, None, None)
+    path.write_bytes(MAGIC + good + partial[:-3])
+
+    with CaptureReader(str(path)) as reader:
+        assert [r.address for r in reader] == ["AA:BB:CC:DD:EE:FF"]
+
+
+def test_record_shorter_than_its_header_is_skipped(tmp_path):
+    path = tmp_path / "capture-20250327-10.seg"
+    good = encode_record(HOUR_1, "AA:BB:CC:DD:EE:FF", -40, None, None, None)
+    short = (5).to_bytes(4, "little") + b"\x00" * 5  # Complete, but no header
+    path.write_bytes(MAGIC + short + good)
+    before = metrics.CAPTURE_CORRUPT_TOTAL.value()
+
+    with CaptureReader(str(path)) as reader:
+        assert [r.address for r in reader] == ["AA:BB:CC:DD:EE:FF"]
+    assert metrics.CAPTURE_CORRUPT_TOTAL.value() == before + 1
+
+
+@pytest.mark.asyncio
+@patch("fablab_visitor_logger.scanner.BleakScannerClient", new_callable=AsyncMock)
+async def test_scanner_captures_before_rssi_filter(mock_bleak, tmp_path):
+    strong = BLEDevice("AA:BB:CC:DD:EE:FF", "Strong", {}, rssi=-50)
+    weak = BLEDevice("11:22:33:44:55:66", "Weak", {}, rssi=-90)
+
+    def adv(rssi):
+        return AdvertisementData(
+            local_name=None,
+            manufacturer_data={0xFFFF: b"\xab"},
+            service_data={},
+            service_uuids=[],
+            rssi=rssi,
+            tx_power=None,
+            platform_data=(),
+        )
+
+    mock_bleak.discover.return_value = {
+        strong.address: (strong, adv(-50)),
+        weak.address: (weak, adv(Config.RSSI_THRESHOLD - 10)),
+    }
+    scanner = BLEScanner(capture=CaptureWriter(str(tmp_path)))
+    devices = await scanner.scan(duration=0.1)
+    scanner.capture.close()
+
+    assert [d["mac_address"] for d in devices] == ["AA:BB:CC:DD:EE:FF"]
+    assert scanner.heard == 2
+    with CaptureReader(str(tmp_path)) as reader:
+        marker, *advertisements = reader
+        assert marker.is_scan and marker.devices == 2
+        assert sorted(r.address for r in advertisements) == sorted(
+            [strong.address, weak.address]
+        )
+
+
+@pytest.mark.asyncio
+async def test_replay_scanner_groups_scans_and_applies_threshold(tmp_path):
+    writer = CaptureWriter(str(tmp_path))
+    writer.append(HOUR_1, "AA:BB:CC:DD:EE:FF", -50, None, {0x004C: b"\x01"})
+    writer.append(HOUR_1, "11:22:33:44:55:66", -95)
+    writer.append(HOUR_1 + 30, "AA:BB:CC:DD:EE:FF", -52)
+    writer.close()
+
+    with CaptureReader(str(tmp_path)) as reader:
+        scanner = ReplayScanner(reader)
+        first = await scanner.scan()
+        assert [d["mac_address"] for d in first] == ["AA:BB:CC:DD:EE:FF"]
+        assert first[0]["manufacturer_data"] == {0x004C: "01"}
+        assert not scanner.exhausted
+
+        second = await scanner.scan()
+        assert [d["rssi"] for d in second] == [-52]
+        assert scanner.exhausted
+
+
+@pytest.mark.asyncio
+async def test_replay_scanner_reproduces_empty_and_failed_scans(tmp_path):
+    writer = CaptureWriter(str(tmp_path))
+    writer.mark_scan(HOUR_1, 1)
+    writer.append(HOUR_1, "AA:BB:CC:DD:EE:FF", -50)
+    writer.mark_scan(HOUR_1 + 30, 0)  # Nothing heard
+    writer.mark_scan(HOUR_1 + 60, SCAN_FAILED)
+    writer.mark_scan(HOUR_1 + 90, 1)
+    writer.append(HOUR_1 + 90, "11:22:33:44:55:66", Config.RSSI_THRESHOLD - 10)
+    writer.close()
+
+    with CaptureReader(str(tmp_path)) as reader:
+        scanner = ReplayScanner(reader)
+        assert len(await scanner.scan()) == 1
+        assert await scanner.scan() == []
+        assert scanner.heard == 0
+        with pytest.raises(BleakError):
+            await scanner.scan()
+        assert scanner.clock.time() == HOUR_1 + 60
+        # Heard, but filtered out: a working scan in which nobody was seen
+        assert await scanner.scan() == []
+        assert scanner.heard == 1
+        assert scanner.exhausted
+
+
+@pytest.mark.asyncio
+async def test_replay_captures_writes_presence(tmp_path):
+    from fablab_visitor_logger import main
+
+    writer = CaptureWriter(str(tmp_path / "captures"))
+    for i in range(3):
+        writer.append(HOUR_1 + 30 * i, "AA:BB:CC:DD:EE:FF", -50)
+    writer.close()
+
+    db = MagicMock()
+    with patch.object(main, "Database", return_value=db), patch.object(
+        Config, "DATABASE_PATH", Config.DATABASE_PATH
+    ):
+        scans = await main.replay_captures([str(tmp_path / "captures")], "x.db")
+
+    assert scans == 3
+    assert db.log_presence_batch.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_replay_stamps_rows_with_the_capture_times(tmp_path):
+    from fablab_visitor_logger import main
+
+    writer = CaptureWriter(str(tmp_path / "captures"))
+    for i in range(3):
+        writer.append(HOUR_1 + 30 * i, "AA:BB:CC:DD:EE:FF", -50)
+    writer.close()
+
+    path = str(tmp_path / "replay.db")
+    with patch.multiple(
+        Config, DATABASE_PATH=path, PSEUDONYM_KEY_FILE=str(tmp_path / "key")
+    ):
+        await main.replay_captures([str(tmp_path / "captures")], path)
+        conn = sqlite3.connect(path)
+    captured = [datetime.fromtimestamp(HOUR_1 + 30 * i) for i in range(3)]
+    rows = conn.execute("SELECT timestamp FROM presence_logs ORDER BY log_id")
+    assert [datetime.fromisoformat(t) for (t,) in rows] == captured
+    first, last = conn.execute("SELECT first_seen, last_seen FROM devices").fetchone()
+    assert datetime.fromisoformat(first) == captured[0]
+    assert datetime.fromisoformat(last) == captured[-1]
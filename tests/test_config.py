@@ -1,6 +1,20 @@
+import logging
+from logging.handlers import QueueHandler
 from unittest.mock import patch
 
-from fablab_visitor_logger.config import Config, DeviceStatus
+import pytest
+
+from fablab_visitor_logger.config import Config, ConfigError, DeviceStatus
+
+
+@pytest.fixture
+def restore_config():
+    """Undo Config.load()/reload() changes after the test."""
+    saved = Config.settings()
+    yield
+    for name, value in saved.items():
+        setattr(Config, name, value)
+    Config._config_file = Config._environ = None
 
 
 class TestConfig:
@@ -19,10 +33,85 @@ class TestConfig:
         assert Config.DATA_RETENTION_DAYS == 90
         assert Config.ANONYMIZE_DEVICES is True
 
-    @patch("logging.FileHandler")
+    @patch("logging.handlers.RotatingFileHandler")
     @patch("logging.StreamHandler")
     def test_setup_logging(self, mock_stream, mock_file):
-        """Test logging configuration setup"""
-        Config.setup_logging()
-        mock_file.assert_called_once_with("presence_tracker.log")
-        mock_stream.assert_called_once()
+        """Test logging goes through a queue to a rotating file handler"""
+        mock_file.return_value.level = logging.NOTSET
+        mock_stream.return_value.level = logging.NOTSET
+        try:
+            Config.setup_logging()
+            Config.setup_logging()  # Second call must not add handlers again
+            mock_file.assert_called_once_with(
+                Config.LOG_FILE,
+                maxBytes=Config.LOG_MAX_BYTES,
+                backupCount=Config.LOG_BACKUP_COUNT,
+            )
+            mock_stream.assert_called_once()
+            queue_handlers = [
+                h for h in logging.getLogger().handlers if isinstance(h, QueueHandler)
+            ]
+            assert len(queue_handlers) == 1
+
+            logging.getLogger("test").warning("queued record")
+            Config.shutdown_logging()  # Stops the listener after draining
+            handled = mock_file.return_value.handle.call_args_list
+            assert any(c[0][0].getMessage() == "queued record" for c in handled)
+        finally:
+            Config.shutdown_logging()
+        assert not any(
+            isinstance(h, QueueHandler) for h in logging.getLogger().handlers
+        )
+
+
+def test_layers_defaults_file_and_environment(tmp_path, restore_config):
+    config_file = tmp_path / "fablab.env"
+    config_file.write_text(
+        "FABLAB_SCAN_INTERVAL=20\nRSSI_THRESHOLD=-70\nAPI_PORT=\nLOG_LEVEL=debug\n"
+    )
+    values = Config.resolve(
+        environ={"FABLAB_CONFIG": str(config_file), "FABLAB_SCAN_INTERVAL": "15"}
+    )
+    assert values["SCAN_INTERVAL"] == 15  # Environment beats the file
+    assert values["RSSI_THRESHOLD"] == -70  # File beats the default
+    assert values["PING_TIMEOUT"] == 3  # Default
+    assert values["API_PORT"] is None
+    assert values["LOG_LEVEL"] == "DEBUG"
+
+
+def test_invalid_settings_are_all_reported(restore_config):
+    with pytest.raises(ConfigError) as excinfo:
+        Config.resolve(
+            environ={
+                "FABLAB_SCAN_INTERVAL": "soon",
+                "FABLAB_RSSI_THRESHOLD": "10",
+                "FABLAB_ANONYMIZE_DEVICES": "maybe",
+                "FABLAB_SCAN_INTERVL": "5",
+            }
+        )
+    message = str(excinfo.value)
+    for fragment in (
+        "SCAN_INTERVAL: expected int",
+        "RSSI_THRESHOLD must be in [-127, 0]",
+        "ANONYMIZE_DEVICES: expected a boolean",
+        "FABLAB_SCAN_INTERVL",
+    ):
+        assert fragment in message
+
+
+def test_reload_applies_live_settings_only(tmp_path, restore_config):
+    config_file = tmp_path / "fablab.env"
+    config_file.write_text("SCAN_INTERVAL=20\n")
+    Config.load(str(config_file), environ={})
+    assert Config.SCAN_INTERVAL == 20
+
+    config_file.write_text("SCAN_INTERVAL=10\nPING_TIMEOUT=2\nDATABASE_PATH=x.db\n")
+    applied, pending = Config.reload()
+    assert applied == {"SCAN_INTERVAL": (20, 10), "PING_TIMEOUT": (3, 2)}
+    assert pending == ["DATABASE_PATH"]
+    assert Config.DATABASE_PATH != "x.db"
+
+    config_file.write_text("SCAN_INTERVAL=0\n")
+    with pytest.raises(ConfigError):
+        Config.reload()
+    assert Config.SCAN_INTERVAL == 10  # Nothing applied on failure
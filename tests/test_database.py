@@ -3,6 +3,7 @@ from unittest.mock import MagicMock, patch
 
 from fablab_visitor_logger.config import DeviceStatus
 from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.migrations import SCHEMA_VERSION
 
 
 class TestDatabase:
@@ -11,13 +12,16 @@ class TestDatabase:
         """Test database initialization creates all required tables"""
         mock_conn = MagicMock()
         mock_connect.return_value = mock_conn
+        # A new, empty database (PRAGMA user_version = 0)
+        mock_conn.cursor.return_value.execute.return_value.fetchone.return_value = (0,)
+        mock_conn.execute.return_value.fetchone.return_value = (0,)  # Empty tables
 
         # Create real database instance to test schema initialization
         db = Database()
         assert db.conn is not None  # Verify connection was established
 
         # Verify all tables were created
-        calls = mock_conn.executescript.call_args[0][0]
+        calls = "".join(c[0][0] for c in mock_conn.executescript.call_args_list)
         required_tables = [
             "devices",
             "presence_logs",
@@ -34,19 +38,22 @@ class TestDatabase:
         # assert "CREATE INDEX IF NOT EXISTS" in calls
 
     @patch("sqlite3.connect")
-    @patch("fablab_visitor_logger.database.datetime")
     @patch("fablab_visitor_logger.database.Config")
-    def test_log_presence(self, mock_config, mock_datetime, mock_connect):
+    def test_log_presence(self, mock_config, mock_connect):
         """Test logging presence updates device and creates log entry"""
         mock_conn = MagicMock()
         mock_connect.return_value = mock_conn
+        # A current database: no migrations pending
+        version = mock_conn.cursor.return_value.execute.return_value
+        version.fetchone.return_value = (SCHEMA_VERSION,)
 
         test_time = datetime(2025, 3, 27, 12, 0, 0)
-        mock_datetime.now.return_value = test_time
+        clock = MagicMock()
+        clock.now.return_value = test_time
 
         # Test with anonymization on
         mock_config.ANONYMIZE_DEVICES = True
-        db = Database()
+        db = Database(clock=clock)
         db.log_presence("AA:BB:CC:DD:EE:FF", DeviceStatus.PRESENT, -70)
 
         # Test with anonymization off
@@ -71,6 +78,9 @@ class TestDatabase:
         """Test old data is properly cleaned up"""
         mock_conn = MagicMock()
         mock_connect.return_value = mock_conn
+        # A current database: no migrations pending
+        version = mock_conn.cursor.return_value.execute.return_value
+        version.fetchone.return_value = (SCHEMA_VERSION,)
 
         db = Database()
         db.cleanup_old_data()
@@ -91,16 +101,19 @@ class TestDatabase:
         )
 
     @patch("sqlite3.connect")
-    @patch("fablab_visitor_logger.database.datetime")
-    def test_log_device_info(self, mock_datetime, mock_connect):
+    def test_log_device_info(self, mock_connect):
         """Test logging device information with BLE characteristics"""
         mock_conn = MagicMock()
         mock_connect.return_value = mock_conn
+        # A current database: no migrations pending
+        version = mock_conn.cursor.return_value.execute.return_value
+        version.fetchone.return_value = (SCHEMA_VERSION,)
 
         test_time = datetime(2025, 3, 27, 12, 0, 0)
-        mock_datetime.now.return_value = test_time
+        clock = MagicMock()
+        clock.now.return_value = test_time
 
-        db = Database()
+        db = Database(clock=clock)
         device_info = {
             "device_name": "Test Device",
             "device_type": "Test Type",
@@ -141,3 +154,34 @@ class TestDatabase:
         )  # service_data (hex encoded)
         assert isinstance(args[11], datetime)  # first_detected
         assert isinstance(args[12], datetime)  # last_detected
+
+    @patch("sqlite3.connect")
+    def test_log_presence_batch(self, mock_connect):
+        """Test batched presence logging uses one executemany per table"""
+        mock_conn = MagicMock()
+        mock_connect.return_value = mock_conn
+        # A current database: no migrations pending
+        version = mock_conn.cursor.return_value.execute.return_value
+        version.fetchone.return_value = (SCHEMA_VERSION,)
+
+        test_time = datetime(2025, 3, 27, 12, 0, 0)
+        db = Database()
+        db.log_presence_batch(
+            [
+                ("AA:BB:CC:DD:EE:FF", DeviceStatus.PRESENT, -60),
+                ("11:22:33:44:55:66", DeviceStatus.DEPARTED, None),
+            ],
+            test_time,
+        )
+
+        assert mock_conn.executemany.call_count == 2
+        device_rows = mock_conn.executemany.call_args_list[0][0][1]
+        log_rows = mock_conn.executemany.call_args_list[1][0][1]
+        assert [r[4] for r in device_rows] == ["present", "departed"]
+        assert log_rows[0] == ("AA:BB:CC:DD:EE:FF", test_time, "present", -60)
+        assert log_rows[1] == ("11:22:33:44:55:66", test_time, "departed", None)
+
+        # Empty batches are a no-op
+        mock_conn.executemany.reset_mock()
+        db.log_presence_batch([])
+        mock_conn.executemany.assert_not_called()
@@ -4,6 +4,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.migrations import SCHEMA_VERSION
 
 
 class TestDatabaseDeviceInfo:
@@ -12,6 +13,9 @@ class TestDatabaseDeviceInfo:
         with patch("sqlite3.connect") as mock_connect:
             mock_conn = MagicMock()
             mock_connect.return_value = mock_conn
+            # A current database: no migrations pending
+            version = mock_conn.cursor.return_value.execute.return_value
+            version.fetchone.return_value = (SCHEMA_VERSION,)
             db = Database()
             db.conn = mock_conn
             return db
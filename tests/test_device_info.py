@@ -2,6 +2,7 @@ import json
 from unittest.mock import MagicMock, patch
 
 from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.migrations import SCHEMA_VERSION
 
 
 class TestDeviceInfo:
@@ -10,6 +11,9 @@ class TestDeviceInfo:
         """Test logging device info with BLE characteristics"""
         mock_conn = MagicMock()
         mock_connect.return_value = mock_conn
+        # A current database: no migrations pending
+        version = mock_conn.cursor.return_value.execute.return_value
+        version.fetchone.return_value = (SCHEMA_VERSION,)
 
         db = Database()
         device_info = {
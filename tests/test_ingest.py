@@ -0,0 +1,187 @@
+"""Tests for the sensor to aggregator ingestion protocol."""
+
+import asyncio
+import struct
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from fablab_visitor_logger.clock import SimulatedClock
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.ingest import (
+    Aggregator,
+    Frame,
+    SensorClient,
+    decode_frame,
+    encode_frame,
+    parse_address,
+)
+from fablab_visitor_logger.pseudonym import Pseudonymizer
+from fablab_visitor_logger.scanner import PresenceTracker
+
+SCAN_TIME = 1743070500.0
+
+
+def device(mac, rssi, **extra):
+    data = {"mac_address": mac, "rssi": rssi, "tx_power": None}
+    data.update(extra)
+    return data
+
+
+async def wait_for_frames(aggregator, count):
+    for _ in range(200):
+        if aggregator.frames >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"received {aggregator.frames} of {count} frames")
+
+
+def test_frame_roundtrip():
+    frame = encode_frame(
+        "room-1",
+        SCAN_TIME,
+        [
+            device(
+                "AA:BB:CC:DD:EE:FF",
+                -50,
+                tx_power=-20,
+                device_name="Phone",
+                service_uuids=["180d"],
+                manufacturer_data={0x004C: "0102"},
+                service_data={"180d": "ff"},
+            ),
+            device("11:22:33:44:55:66", -90),
+        ],
+    )
+    (length,) = struct.unpack_from("<I", frame)
+    assert length == len(frame) - 4
+
+    decoded = decode_frame(frame[4:])
+    assert decoded.sensor == "room-1"
+    assert decoded.scan_time == SCAN_TIME
+    first, second = decoded.devices
+    assert first["mac_address"] == "AA:BB:CC:DD:EE:FF"
+    assert (first["rssi"], first["tx_power"]) == (-50, -20)
+    assert first["device_name"] == "Phone"
+    assert first["service_uuids"] == ["180d"]
+    assert first["manufacturer_data"] == {0x004C: "0102"}
+    assert first["service_data"] == {"180d": "ff"}
+    assert second["device_name"] is None and second["tx_power"] is None
+
+
+def test_corrupt_frame_is_rejected():
+    with pytest.raises(ValueError):
+        decode_frame(b"not a frame")
+    with pytest.raises(ValueError):
+        parse_address("no-port")
+
+
+@pytest.mark.asyncio
+async def test_aggregator_merges_sensors_over_unix_socket(tmp_path):
+    aggregator = Aggregator(f"unix:{tmp_path / 'ingest.sock'}")
+    await aggregator.start()
+    sensors = [SensorClient(aggregator.address, f"room-{i}") for i in range(3)]
+    try:
+        for i, sensor in enumerate(sensors):
+            devices = [device("AA:BB:CC:DD:EE:FF", -80 + 10 * i)]
+            devices.append(device(f"11:22:33:44:55:6{i}", -60))
+            assert await sensor.send(encode_frame(sensor.sensor, SCAN_TIME, devices))
+        await wait_for_frames(aggregator, 3)
+    finally:
+        for sensor in sensors:
+            await sensor.close()
+        await aggregator.stop()
+
+    devices = {d["mac_address"]: d for d in aggregator.take_window()}
+    assert devices["AA:BB:CC:DD:EE:FF"]["sensor_rssi"] == {
+        "room-0": -80,
+        "room-1": -70,
+        "room-2": -60,
+    }
+    window = {mac: d["rssi"] for mac, d in devices.items()}
+    assert window == {
+        "AA:BB:CC:DD:EE:FF": -60,  # Strongest of the three sightings
+        "11:22:33:44:55:60": -60,
+        "11:22:33:44:55:61": -60,
+        "11:22:33:44:55:62": -60,
+    }
+    assert set(aggregator.sensors) == {"room-0", "room-1", "room-2"}
+    assert aggregator.take_window() == []  # A new window starts empty
+
+
+@pytest.mark.asyncio
+async def test_aggregated_window_is_tracked_once(tmp_path):
+    aggregator = Aggregator("127.0.0.1:0")
+    await aggregator.start()
+    sensors = [SensorClient(aggregator.address, f"room-{i}") for i in range(2)]
+    try:
+        for sensor in sensors:
+            frame = encode_frame(
+                sensor.sensor, SCAN_TIME, [device("AA:BB:CC:DD:EE:FF", -50)]
+            )
+            assert await sensor.send(frame)
+        await wait_for_frames(aggregator, 2)
+
+        with patch.object(Config, "DATABASE_PATH", str(tmp_path / "agg.db")):
+            db = Database(pseudonymizer=Pseudonymizer(b"k" * 32))
+            tracker = PresenceTracker(aggregator, db)
+            with patch.multiple(Config, SCAN_INTERVAL=0, AGGREGATOR_GRACE_SECONDS=0):
+                assert await tracker.update_presence() == 1
+    finally:
+        for sensor in sensors:
+            await sensor.close()
+        await aggregator.stop()
+
+    assert db.conn.execute("SELECT COUNT(*) FROM presence_logs").fetchone() == (1,)
+    assert db.conn.execute("SELECT COUNT(*) FROM device_info").fetchone() == (1,)
+
+
+@pytest.mark.asyncio
+async def test_garbage_drops_only_that_connection():
+    aggregator = Aggregator("127.0.0.1:0")
+    await aggregator.start()
+    host, port = parse_address(aggregator.address)[1]
+    try:
+        _, writer = await asyncio.open_connection(host, port)
+        writer.write(struct.pack("<I", 5) + b"junk!")
+        await writer.drain()
+        writer.close()
+
+        sensor = SensorClient(aggregator.address, "room-1")
+        frame = encode_frame("room-1", SCAN_TIME, [device("AA:BB:CC:DD:EE:FF", -50)])
+        assert await sensor.send(frame)
+        await wait_for_frames(aggregator, 1)
+        await sensor.close()
+    finally:
+        await aggregator.stop()
+    assert [d["mac_address"] for d in aggregator.take_window()] == ["AA:BB:CC:DD:EE:FF"]
+
+
+def _frame(sensor, mac="AA:BB:CC:DD:EE:FF", rssi=-50):
+    return Frame(sensor, SCAN_TIME, [device(mac, rssi)])
+
+
+@pytest.mark.asyncio
+async def test_windows_close_on_frames_from_every_active_sensor():
+    aggregator = Aggregator("127.0.0.1:0", clock=SimulatedClock(datetime.now(), 1e6))
+    # Until the sensors are known, a repeated sensor closes the window
+    aggregator.add_frame(_frame("room-0"))
+    aggregator.add_frame(_frame("room-1", "11:22:33:44:55:66"))
+    aggregator.add_frame(_frame("room-0"))
+    assert len(await aggregator.scan()) == 2
+
+    # The repeated frame opened the next window, which closes as soon as
+    # both sensors have reported
+    aggregator.add_frame(_frame("room-1", rssi=-40))
+    aggregator.add_frame(_frame("room-0", rssi=-60))  # Already the next window
+    first = await aggregator.scan()
+    assert [d["sensor_rssi"] for d in first] == [{"room-0": -50, "room-1": -40}]
+    assert first[0]["rssi"] == -40
+
+    # A silent sensor only delays the window by the grace period
+    with patch.object(Config, "AGGREGATOR_GRACE_SECONDS", 1):
+        second = await aggregator.scan()
+    assert [d["sensor_rssi"] for d in second] == [{"room-0": -60}]
+    assert aggregator.frames == 5
@@ -26,6 +26,7 @@ def mock_dependencies():
         mock_scanner.return_value = mock_scanner_instance
 
         mock_db_instance = MagicMock()
+        mock_db_instance.compact_presence.return_value = (0, 0, 0)
         mock_db.return_value = mock_db_instance
 
         # Configure the mock class to return the desired instance when called
@@ -58,6 +59,40 @@ def test_signal_handling(mock_dependencies):
     assert app.running is False
 
 
+def test_rekey_runs_one_batch_per_cycle(mock_dependencies):
+    """Test stored pseudonyms are re-keyed a batch per cycle after rotation."""
+    app = PresenceMonitoringApp()
+    db = mock_dependencies["db_instance"]
+    db.pseudonymizer.period = 1
+    db.rekey_pseudonyms.return_value = iter([2, 0])
+    for _ in range(4):
+        app._rekey_pseudonyms()
+    db.rekey_pseudonyms.assert_called_once()
+    assert app._rekey_job is None and app._rekeyed == 2
+
+    db.pseudonymizer.period = 2  # Rotated
+    db.rekey_pseudonyms.return_value = iter([])
+    app._rekey_pseudonyms()
+    assert db.rekey_pseudonyms.call_count == 2
+
+
+def test_sighup_reload_keeps_tracker(mock_dependencies):
+    """Test SIGHUP reloads config without recreating the tracker."""
+    from fablab_visitor_logger.config import ConfigError
+
+    app = PresenceMonitoringApp()
+    tracker = app.tracker
+    mock_config = mock_dependencies["config"]
+    mock_config.reload.return_value = ({"SCAN_INTERVAL": (30, 10)}, [])
+    app._reload_config()
+    mock_config.reload.assert_called_once()
+    assert app.tracker is tracker
+
+    mock_config.reload.side_effect = ConfigError("SCAN_INTERVAL must be >= 1")
+    app._reload_config()  # Logged, not raised
+    assert app.tracker is tracker
+
+
 @pytest.mark.asyncio
 @patch("asyncio.sleep")
 async def test_run_loop_single_iteration(mock_asyncio_sleep, mock_dependencies):
@@ -188,11 +223,18 @@ def test_report_mode_list(mock_reporter, mock_parse_args, mock_sys, capsys):
     mock_args.mode = "report"
     mock_args.command = "list-devices"
     mock_args.active = False
+    mock_args.status = None
+    mock_args.vendor = None
+    mock_args.device_type = None
+    mock_args.seen_since = None
+    mock_args.after = None
+    mock_args.limit = None
+    mock_args.format = "text"
     mock_parse_args.return_value = mock_args
 
     mock_reporter_instance = MagicMock()
     mock_reporter.return_value = mock_reporter_instance
-    mock_reporter_instance.list_devices.return_value = [
+    mock_reporter_instance.iter_devices.return_value = [
         {
             "device_id": "test1",
             "status": "present",
@@ -208,7 +250,15 @@ def test_report_mode_list(mock_reporter, mock_parse_args, mock_sys, capsys):
     main()
 
     # Verify
-    mock_reporter_instance.list_devices.assert_called_once_with(False)
+    mock_reporter_instance.iter_devices.assert_called_once_with(
+        active_only=False,
+        status=None,
+        vendor=None,
+        device_type=None,
+        seen_since=None,
+        after=None,
+        limit=None,
+    )
     captured = capsys.readouterr()
     assert (
         "ID: test1 | Status: present | Name: Dev1 | Vendor: VendorA | Type: TypeX"
@@ -0,0 +1,92 @@
+"""Tests for database space reclamation and storage maintenance."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from fablab_visitor_logger.config import Config, DeviceStatus
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.maintenance import DatabaseMaintenance, in_quiet_hours
+from fablab_visitor_logger.pseudonym import Pseudonymizer
+
+
+def test_incremental_vacuum_reclaims_cleaned_up_pages(tmp_path):
+    with patch.object(Config, "DATABASE_PATH", str(tmp_path / "vacuum.db")):
+        db = Database(pseudonymizer=Pseudonymizer(b"k" * 32))
+        old = datetime.now() - timedelta(days=Config.DATA_RETENTION_DAYS + 1)
+        for batch in range(20):
+            db.log_presence_batch(
+                [
+                    (f"AA:BB:CC:{batch:02X}:{i // 256:02X}:{i % 256:02X}", status, -50)
+                    for i in range(200)
+                    for status in (DeviceStatus.PRESENT, DeviceStatus.DEPARTED)
+                ],
+                old,
+            )
+        health = db.health()
+        assert health["auto_vacuum"] == "incremental"
+        assert health["journal_mode"] == "wal"
+        names = [stats["name"] for stats in health["objects"]]
+        assert "presence_logs" in names
+        assert all(0 <= stats["fragmentation"] <= 1 for stats in health["objects"])
+
+        db.compact_presence()  # Logs are only deleted once rolled up
+        db.cleanup_old_data()
+        free = db.health()["freelist_count"]
+        assert free > 10
+        assert db.incremental_vacuum(10) == 10
+        assert db.incremental_vacuum(free) == free - 10
+        assert db.health()["freelist_count"] == 0
+
+
+def test_vacuum_converts_existing_database(tmp_path):
+    with patch.object(Config, "DATABASE_PATH", str(tmp_path / "legacy.db")):
+        db = Database()
+        db.conn.execute("PRAGMA auto_vacuum = NONE")
+        db.conn.execute("VACUUM")
+        assert db.health()["auto_vacuum"] == "none"
+        assert db.incremental_vacuum(100) == 0
+        db.vacuum()
+        assert db.health()["auto_vacuum"] == "incremental"
+
+
+def test_maintenance_runs_vacuum_and_optimize_in_quiet_hours():
+    db = MagicMock()
+    db.compact_presence.return_value = (0, 0, 0)
+    db.incremental_vacuum.return_value = 0
+    clock = MagicMock()
+    clock.now.return_value = datetime(2025, 3, 27, 14, 0)
+    maintenance = DatabaseMaintenance(db, clock=clock)
+    with patch.multiple(
+        Config, MAINTENANCE_START_HOUR=2, MAINTENANCE_END_HOUR=5, CHECKPOINT_INTERVAL=0
+    ):
+        maintenance.run()
+        db.incremental_vacuum.assert_not_called()
+
+        clock.now.return_value = datetime(2025, 3, 28, 3, 0)
+        maintenance.run()
+        maintenance.run()
+        assert db.incremental_vacuum.call_count == 2
+        db.optimize.assert_called_once()  # Once per day
+        db.checkpoint.assert_not_called()
+
+
+def test_checkpoints_follow_interval():
+    db = MagicMock()
+    db.compact_presence.return_value = (0, 0, 0)
+    db.checkpoint.return_value = (0, 0, 0)
+    clock = MagicMock()
+    clock.now.return_value = datetime(2025, 3, 27, 14)
+    clock.monotonic.return_value = 1000.0
+    maintenance = DatabaseMaintenance(db, clock=clock)
+    with patch.object(Config, "CHECKPOINT_INTERVAL", 60):
+        clock.monotonic.return_value += 30
+        maintenance.run()
+        db.checkpoint.assert_not_called()
+        clock.monotonic.return_value += 31
+        maintenance.run()
+        db.checkpoint.assert_called_once()
+
+
+def test_quiet_hours_wrap_past_midnight():
+    with patch.multiple(Config, MAINTENANCE_START_HOUR=23, MAINTENANCE_END_HOUR=4):
+        assert [h for h in range(24) if in_quiet_hours(h)] == [0, 1, 2, 3, 23]
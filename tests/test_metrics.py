@@ -0,0 +1,114 @@
+"""Tests for the in-process metrics registry and exporters."""
+
+import asyncio
+
+import pytest
+
+from fablab_visitor_logger.metrics import (
+    LoopLagMonitor,
+    MetricsExporter,
+    MetricsRegistry,
+    write_textfile,
+)
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_histogram_renders_cumulative_buckets(registry):
+    hist = registry.histogram("test_seconds", "Test durations.", buckets=(0.1, 1.0))
+    hist.observe(0.05)
+    hist.observe(0.5)
+    hist.observe(5)
+
+    text = registry.render()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_seconds_bucket{le="1"} 2' in text
+    assert 'test_seconds_bucket{le="+Inf"} 3' in text
+    assert "test_seconds_sum 5.55" in text
+    assert "test_seconds_count 3" in text
+
+
+def test_histogram_time_context_manager(registry):
+    hist = registry.histogram("timed_seconds", "Timed block.")
+    with hist.time():
+        pass
+    assert hist.count == 1
+    assert hist.sum >= 0
+
+
+def test_counter_labels_and_gauge(registry):
+    counter = registry.counter("events_total", "Events.", labelnames=("status",))
+    counter.labels(status="absent").inc()
+    counter.labels(status="absent").inc(2)
+    counter.labels(status="departed").inc()
+    gauge = registry.gauge("tracked", "Tracked devices.")
+    gauge.set(42)
+
+    text = registry.render()
+    assert 'events_total{status="absent"} 3' in text
+    assert 'events_total{status="departed"} 1' in text
+    assert "tracked 42" in text
+    assert counter.value(status="absent") == 3
+
+
+def test_duplicate_registration_rejected(registry):
+    registry.counter("dup_total", "First.")
+    with pytest.raises(ValueError):
+        registry.counter("dup_total", "Second.")
+
+
+def test_write_textfile(registry, tmp_path):
+    registry.counter("cycles_total", "Cycles.").inc()
+    path = tmp_path / "fablab.prom"
+    write_textfile(str(path), registry)
+    assert "cycles_total 1" in path.read_text()
+    assert list(tmp_path.iterdir()) == [path]  # No temp files left behind
+
+
+@pytest.mark.asyncio
+async def test_exporter_serves_metrics_over_http(registry):
+    registry.gauge("up", "Exporter is up.").set(1)
+    exporter = MetricsExporter(registry, port=0)
+    await exporter.start()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", exporter.port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    finally:
+        await exporter.stop()
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert b"text/plain; version=0.0.4" in head
+    assert b"up 1" in body
+
+
+@pytest.mark.asyncio
+async def test_exporter_unknown_path_returns_404(registry):
+    exporter = MetricsExporter(registry, port=0)
+    await exporter.start()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", exporter.port)
+        writer.write(b"GET /nope HTTP/1.1\r\n\r\n")
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    finally:
+        await exporter.stop()
+    assert response.startswith(b"HTTP/1.1 404")
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_records_samples(registry):
+    hist = registry.histogram("lag_seconds", "Lag.")
+    monitor = LoopLagMonitor(hist, interval=0.01)
+    monitor.start(asyncio.get_running_loop())
+    await asyncio.sleep(0.05)
+    monitor.stop()
+    assert hist.count >= 2
@@ -0,0 +1,175 @@
+"""Tests for versioned schema migrations."""
+
+import sqlite3
+
+import pytest
+
+from fablab_visitor_logger.database import STATS_MISMATCH_SQL
+from fablab_visitor_logger.migrations import (
+    MIGRATIONS,
+    SCHEMA_VERSION,
+    Migration,
+    migrate,
+    schema_version,
+)
+
+
+def test_unversioned_database_is_migrated(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    conn.executescript(
+        """
+        CREATE TABLE devices (device_id TEXT PRIMARY KEY, anonymous_id TEXT,
+            first_seen DATETIME, last_seen DATETIME, status TEXT);
+        CREATE TABLE presence_logs (log_id INTEGER PRIMARY KEY, device_id TEXT,
+            timestamp DATETIME, status TEXT, rssi INTEGER);
+        INSERT INTO devices VALUES ('d1', 'a1', NULL, NULL, 'present');
+        INSERT INTO presence_logs VALUES (1, 'd1', '2025-03-27 10:00', 'present', -50);
+        """
+    )
+
+    assert migrate(conn) == [m.version for m in MIGRATIONS]
+    assert schema_version(conn) == SCHEMA_VERSION
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert "idx_presence_logs_device" in indexes
+    counters = dict(
+        conn.execute("SELECT key, value FROM stats_counters WHERE scope = 'hourly'")
+    )
+    assert counters == {"2025-03-27 10": 1}  # Existing rows were counted
+
+    assert migrate(conn) == []  # Current: nothing to do
+
+
+def _legacy_database(path, devices):
+    """A database from before versioning, with rows in the counted tables."""
+    conn = sqlite3.connect(str(path))
+    conn.executescript(
+        """
+        CREATE TABLE devices (device_id TEXT PRIMARY KEY, anonymous_id TEXT,
+            first_seen DATETIME, last_seen DATETIME, status TEXT);
+        CREATE TABLE presence_logs (log_id INTEGER PRIMARY KEY, device_id TEXT,
+            timestamp DATETIME, status TEXT, rssi INTEGER);
+        CREATE TABLE device_info (device_id TEXT PRIMARY KEY, device_name TEXT,
+            device_type TEXT, vendor_id INTEGER, vendor_name TEXT,
+            model_number TEXT, service_uuids TEXT, manufacturer_data TEXT,
+            tx_power INTEGER, appearance INTEGER, service_data TEXT,
+            first_detected DATETIME, last_detected DATETIME);
+        """
+    )
+    for i in range(devices):
+        device = f"d{i}"
+        conn.execute(
+            "INSERT INTO devices VALUES (?, ?, NULL, NULL, ?)",
+            (device, device, ("present", "absent", None)[i % 3]),
+        )
+        conn.execute(
+            "INSERT INTO device_info (device_id, device_type, vendor_name) "
+            "VALUES (?, 'BLE', ?)",
+            (device, ("Apple", None)[i % 2]),
+        )
+        conn.executemany(
+            "INSERT INTO presence_logs (device_id, timestamp, status) "
+            "VALUES (?, ?, 'present')",
+            [(device, f"2025-03-27 {hour:02}:00") for hour in range(i % 4 + 1)],
+        )
+    conn.commit()
+    return conn
+
+
+def test_stats_of_legacy_database_are_counted_in_batches(tmp_path):
+    conn = _legacy_database(tmp_path / "legacy.db", devices=20)
+    steps = [m._replace(batch_size=7) if m.backfill else m for m in MIGRATIONS]
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    migrate(conn, steps)
+
+    assert conn.execute(STATS_MISMATCH_SQL).fetchall() == []
+    assert ("meta", "initialized", 1) in conn.execute("SELECT * FROM stats_counters")
+    batches = [s for s in statements if s.lstrip().startswith("INSERT INTO stats")]
+    assert len(batches) == 3 + 3 + 8  # 20 devices, 20 infos, 50 logs by 7
+    # The counters keep up with writes made after the walk
+    conn.execute("UPDATE devices SET status = 'departed' WHERE device_id = 'd0'")
+    conn.execute("DELETE FROM presence_logs WHERE device_id = 'd3'")
+    assert conn.execute(STATS_MISMATCH_SQL).fetchall() == []
+
+
+def test_counters_populated_by_earlier_versions_are_kept(tmp_path):
+    conn = _legacy_database(tmp_path / "populated.db", devices=5)
+    # Counters filled in one statement, as migration 1 used to do
+    migrate(conn, MIGRATIONS[:4])
+    conn.executescript(
+        """
+        INSERT INTO stats_counters SELECT * FROM stats_counters_expected;
+        INSERT INTO stats_counters VALUES ('meta', 'initialized', 1);
+        """
+    )
+
+    migrate(conn)
+
+    assert conn.execute(STATS_MISMATCH_SQL).fetchall() == []  # Not counted twice
+
+
+def test_legacy_database_is_rebuilt_for_incremental_vacuum(tmp_path):
+    conn = _legacy_database(tmp_path / "legacy.db", devices=5)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone() == (0,)  # None
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    migrate(conn)
+
+    assert conn.execute("PRAGMA auto_vacuum").fetchone() == (2,)  # Incremental
+    assert statements.count("VACUUM") == 1
+    assert schema_version(conn) == SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM presence_logs").fetchone() == (
+        11,
+    )  # Rows kept
+
+
+def test_failed_step_keeps_previous_version(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "failed.db"))
+    steps = [
+        Migration(1, "Table", "CREATE TABLE t (x INTEGER);"),
+        Migration(2, "Broken", "CREATE TABLE u (y INTEGER); SELECT * FROM missing;"),
+    ]
+    migrate(conn, steps[:1])
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn, steps)
+    assert schema_version(conn) == 1
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert "u" not in tables  # Rolled back with the failed step
+
+
+def test_backfill_runs_in_batches_and_resumes(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "backfill.db"))
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.commit()
+    steps = [
+        Migration(
+            1,
+            "Double x",
+            "",  # The interrupted run below already added the column
+            backfill="UPDATE t SET doubled = x * 2 WHERE rowid > :start "
+            "AND rowid <= :end",
+            table="t",
+            batch_size=3,
+        )
+    ]
+    statements = []
+    conn.set_trace_callback(statements.append)
+    # Pretend an earlier run stopped after rowid 4 (x = 0..3)
+    conn.executescript(
+        """
+        ALTER TABLE t ADD COLUMN doubled INTEGER;
+        CREATE TABLE schema_migration_progress (
+            version INTEGER PRIMARY KEY, last_rowid INTEGER NOT NULL);
+        INSERT INTO schema_migration_progress VALUES (1, 4);
+        """
+    )
+
+    assert migrate(conn, steps) == [1]
+    assert schema_version(conn) == 1
+    rows = conn.execute("SELECT x, doubled FROM t ORDER BY x").fetchall()
+    assert rows == [(x, None if x < 4 else x * 2) for x in range(10)]
+    assert sum(s.startswith("UPDATE t") for s in statements) == 2  # 5-7, 8-10
+    assert conn.execute("SELECT * FROM schema_migration_progress").fetchall() == []
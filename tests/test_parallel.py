@@ -0,0 +1,78 @@
+"""Tests for sharded multi-process reports."""
+
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.parallel import HyperLogLog, range_report, shard_ranges
+from fablab_visitor_logger.reporting import Reporter
+
+START = datetime(2025, 3, 17)
+END = START + timedelta(days=2)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "parallel.db")
+    with patch.object(Config, "DATABASE_PATH", path):
+        Database().conn.close()
+        conn = sqlite3.connect(path)
+        samples = []
+        for device, (hour, minutes) in enumerate([(9, 90), (10, 30), (23, 120)]):
+            conn.execute(
+                "INSERT INTO devices VALUES (?, '', NULL, NULL, 'present')",
+                (f"device{device}",),
+            )
+            first = START + timedelta(hours=hour)
+            samples += [
+                (f"device{device}", first + timedelta(seconds=s))
+                for s in range(0, minutes * 60, Config.SCAN_INTERVAL)
+            ]
+        conn.executemany(
+            "INSERT INTO presence_logs (device_id, timestamp, status, rssi) "
+            "VALUES (?, ?, 'present', -50)",
+            samples,
+        )
+        conn.commit()
+        conn.close()
+        yield path
+
+
+def test_hyperloglog_estimate_and_merge():
+    left, right = HyperLogLog(), HyperLogLog()
+    for i in range(6000):
+        left.add(f"device{i}")
+    for i in range(4000, 10000):
+        right.add(f"device{i}")
+    left.merge(right)
+    assert abs(left.estimate() - 10000) < 500
+
+
+def test_shard_ranges_are_contiguous_and_bucket_aligned():
+    ranges = shard_ranges(START, END + timedelta(minutes=30), timedelta(hours=1), 4)
+    assert ranges[0][0] == START
+    assert ranges[-1][1] == END + timedelta(minutes=30)
+    for (_, previous_end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert previous_end == next_start
+        assert next_start.minute == 0
+
+
+def test_parallel_report_matches_single_process(db_path):
+    single = range_report(START, END, workers=1, shards=1)
+    parallel = range_report(START, END, workers=2, shards=4)
+
+    assert parallel.shards == 4
+    assert list(parallel.occupancy.mean) == list(single.occupancy.mean)
+    assert list(parallel.occupancy.peak) == list(single.occupancy.peak)
+    assert parallel.present_seconds == single.present_seconds == 240 * 60
+    assert parallel.distinct_devices == single.distinct_devices == 3
+    assert single.visits == 3
+    assert single.dwell_counts[3] == 1  # 30-60 min bin
+    assert sum(single.dwell_counts) == 3
+
+    series = Reporter().occupancy_series(START, END)
+    assert list(series.mean) == list(single.occupancy.mean)
@@ -0,0 +1,92 @@
+"""Tests for keyed device pseudonyms and re-keying."""
+
+import hashlib
+import os
+import stat
+from unittest.mock import patch
+
+import pytest
+
+from fablab_visitor_logger.config import Config, DeviceStatus
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.pseudonym import (
+    SECONDS_PER_DAY,
+    Pseudonymizer,
+    key_file,
+    load_key,
+)
+
+MAC = "AA:BB:CC:DD:EE:FF"
+
+
+def test_key_file_is_created_once_and_private(tmp_path):
+    path = str(tmp_path / "pseudonym.key")
+    key = load_key(path)
+    assert len(key) == 32
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert load_key(path) == key
+
+
+def test_key_file_defaults_to_the_database_directory(tmp_path):
+    database = str(tmp_path / "data" / "fablab_presence.db")
+    with patch.multiple(Config, DATABASE_PATH=database, PSEUDONYM_KEY_FILE=""):
+        assert key_file() == str(tmp_path / "data" / "pseudonym.key")
+    with patch.object(Config, "PSEUDONYM_KEY_FILE", "/etc/fablab/key"):
+        assert key_file() == "/etc/fablab/key"
+
+
+def test_pseudonyms_are_keyed_and_cached():
+    pseudonymizer = Pseudonymizer(b"k" * 32, cache_size=2)
+    first = pseudonymizer.pseudonym(MAC)
+    assert first == pseudonymizer.pseudonym(MAC)
+    assert first != Pseudonymizer(b"x" * 32).pseudonym(MAC)
+    assert first != hashlib.sha256(MAC.encode()).hexdigest()
+
+    for device in ("11:22:33:44:55:66", "22:33:44:55:66:77"):
+        pseudonymizer.pseudonym(device)
+    assert list(pseudonymizer._cache) == ["11:22:33:44:55:66", "22:33:44:55:66:77"]
+
+
+def test_rotation_changes_pseudonyms_per_period():
+    now = [10 * SECONDS_PER_DAY]
+    pseudonymizer = Pseudonymizer(b"k" * 32, rotation_days=7, clock=lambda: now[0])
+    before = pseudonymizer.pseudonym(MAC)
+    now[0] += SECONDS_PER_DAY
+    assert not pseudonymizer.refresh()  # Same 7-day period
+    now[0] += 7 * SECONDS_PER_DAY
+    assert pseudonymizer.refresh()
+    assert pseudonymizer.pseudonym(MAC) != before
+
+
+def test_rekey_rewrites_old_pseudonyms_in_batches(tmp_path):
+    with patch.object(Config, "DATABASE_PATH", str(tmp_path / "rekey.db")):
+        db = Database(pseudonymizer=Pseudonymizer(b"k" * 32))
+        macs = [f"AA:BB:CC:DD:EE:{i:02X}" for i in range(5)]
+        db.log_presence_batch([(mac, DeviceStatus.PRESENT, -50) for mac in macs])
+        # Pseudonyms left by the old unsalted hash
+        db.conn.executemany(
+            "UPDATE devices SET anonymous_id = ? WHERE device_id = ?",
+            [(hashlib.sha256(mac.encode()).hexdigest(), mac) for mac in macs[:3]],
+        )
+        db.conn.commit()
+
+        assert list(db.rekey_pseudonyms(batch_size=2)) == [2, 1, 0]
+        stored = dict(db.conn.execute("SELECT device_id, anonymous_id FROM devices"))
+        assert stored == {mac: db.pseudonymizer.compute(mac) for mac in macs}
+        assert sum(db.rekey_pseudonyms(batch_size=2)) == 0
+
+
+def test_presence_batch_returns_the_stored_ids(tmp_path):
+    with patch.object(Config, "DATABASE_PATH", str(tmp_path / "ids.db")):
+        db = Database(pseudonymizer=Pseudonymizer(b"k" * 32))
+        entries = [(MAC, DeviceStatus.PRESENT, -50)]
+        assert db.log_presence_batch(entries) == {MAC: db.pseudonymizer.compute(MAC)}
+        with patch.object(Config, "ANONYMIZE_DEVICES", False):
+            assert db.log_presence_batch(entries) == {MAC: MAC}
+
+
+def test_invalid_key_file_is_rejected(tmp_path):
+    path = tmp_path / "pseudonym.key"
+    path.write_text("not hex")
+    with pytest.raises(ValueError):
+        load_key(str(path))
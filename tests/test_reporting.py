@@ -1,12 +1,18 @@
+import csv
+import gzip
+import json
 import os
 import sqlite3
 import tempfile
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
+from fablab_visitor_logger.clock import ManualClock
 from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.database import Database
 from fablab_visitor_logger.reporting import Reporter
 
 
@@ -46,6 +52,7 @@ def test_db():
     conn.close()
 
     with patch.object(Config, "DATABASE_PATH", db_path):
+        Database().conn.close()  # Migrated, as the scanner would on startup
         yield
 
     os.close(db_fd)
@@ -88,6 +95,82 @@ def test_export_csv(test_db):
         assert "device3,2025-03-27 13:00,departed,-65" in content
 
 
+def test_export_csv_gzip_streams_in_chunks(test_db, tmp_path):
+    reporter = Reporter()
+    output = tmp_path / "export.csv.gz"
+    progress = []
+    rows = reporter.export_csv(str(output), chunk_size=3, progress=progress.append)
+
+    assert rows == 4
+    assert progress == [3, 4]
+    with gzip.open(output, "rt", newline="") as f:
+        lines = list(csv.reader(f))
+    assert lines[0][:4] == ["device_id", "timestamp", "status", "rssi"]
+    assert len(lines) == 5
+
+
+def test_export_csv_since_until(test_db, tmp_path):
+    reporter = Reporter()
+    output = tmp_path / "range.csv"
+    rows = reporter.export_csv(
+        str(output),
+        since=datetime(2025, 3, 26),
+        until=datetime(2025, 3, 27, 12, 0),
+    )
+    assert rows == 1
+    assert "device2,2025-03-26 12:00,absent,-60" in output.read_text()
+
+
+def test_export_columnar_npy(test_db, tmp_path):
+    np = pytest.importorskip("numpy")
+    reporter = Reporter()
+    path, rows = reporter.export_columnar(str(tmp_path / "logs"), chunk_size=2)
+
+    assert rows == 4
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+    timestamps = load("timestamp")
+    assert isinstance(timestamps, np.memmap)
+    assert timestamps.dtype == np.int64
+    assert load("status").dtype == np.int8
+    assert load("rssi").dtype == np.int16
+    # Sorted by time: device2 (2025-03-26 12:00) comes first
+    devices = load("device_dictionary")[load("device_code")]
+    assert devices[0] == "device2"
+    # Naive stored timestamps are exported as epoch seconds of that wall time
+    assert (
+        timestamps[0] == datetime(2025, 3, 26, 12, 0, tzinfo=timezone.utc).timestamp()
+    )
+    labels = load("status_labels")
+    assert list(labels[load("status") - 1]) == [
+        "absent",
+        "departed",
+        "present",
+        "present",
+    ]
+    assert (load("vendor_code") == -1).all()  # No device_info rows
+
+
+def test_export_columnar_parquet_falls_back_without_pyarrow(test_db, tmp_path):
+    reporter = Reporter()
+    with patch("fablab_visitor_logger.columnar.pyarrow_available", return_value=False):
+        path, rows = reporter.export_columnar(str(tmp_path / "logs.parquet"))
+    assert path.endswith("logs")
+    assert os.path.isdir(path)
+    assert rows == 4
+
+
+def test_export_columnar_parquet(test_db, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    reporter = Reporter()
+    path, rows = reporter.export_columnar(str(tmp_path / "logs.parquet"))
+    table = pq.read_table(path)
+    assert table.num_rows == rows == 4
+    assert str(table.schema.field("status").type) == "int8"
+
+
 def test_export_csv_invalid_path(test_db):
     reporter = Reporter()
     with pytest.raises(ValueError):
@@ -96,7 +179,7 @@ def test_export_csv_invalid_path(test_db):
 
 @patch("fablab_visitor_logger.reporting.Reporter")
 def test_cli_list_devices(mock_reporter, capsys):
-    mock_reporter.return_value.list_devices.return_value = [
+    mock_reporter.return_value.iter_devices.return_value = [
         {
             "device_id": "test1",
             "status": "present",
@@ -138,6 +221,27 @@ def test_cli_stats(mock_reporter, capsys):
     captured = capsys.readouterr()
     assert "Total unique devices: 5" in captured.out
     assert "Currently present: 2" in captured.out
+    mock_reporter.assert_called_once_with(read_only=True)
+
+
+@pytest.mark.parametrize(
+    "argv, read_only",
+    [
+        (["rollup"], False),
+        (["check-stats"], True),
+        (["check-stats", "--repair"], False),
+    ],
+)
+@patch("fablab_visitor_logger.reporting.Reporter")
+def test_cli_opens_database_read_write_only_to_write(mock_reporter, argv, read_only):
+    mock_reporter.return_value.db.rollup_daily_stats.return_value = []
+    mock_reporter.return_value.db.check_stats.return_value = []
+    from fablab_visitor_logger import reporting
+
+    with patch("sys.argv", ["reporting.py", *argv]):
+        reporting.main()
+
+    mock_reporter.assert_called_once_with(read_only=read_only)
 
 
 @patch("fablab_visitor_logger.reporting.Reporter")
@@ -158,3 +262,230 @@ def test_cli_error_handling(capsys):
     with patch("sys.argv", ["reporting.py", "invalid-command"]):
         with pytest.raises(SystemExit):
             reporting.main()
+
+
+def test_export_csv_incremental_appends_new_rows(test_db, tmp_path):
+    reporter = Reporter()
+    output = tmp_path / "nightly.csv.gz"
+    assert reporter.export_csv_incremental(str(output), chunk_size=3) == 4
+    assert reporter.export_csv_incremental(str(output)) == 0
+
+    reporter.db.conn.execute(
+        "INSERT INTO presence_logs VALUES "
+        "(5, 'device1', '2025-03-28 09:00', 'present', -40)"
+    )
+    reporter.db.conn.commit()
+    assert reporter.export_csv_incremental(str(output)) == 1
+
+    with gzip.open(output, "rt", newline="") as f:
+        lines = list(csv.reader(f))
+    assert lines[0] == ["device_id", "timestamp", "status", "rssi"] + lines[0][4:]
+    assert len(lines) == 6  # Header written once, no duplicate rows
+    assert lines[-1][:4] == ["device1", "2025-03-28 09:00", "present", "-40"]
+
+
+def test_export_csv_incremental_resumes_after_interruption(test_db, tmp_path):
+    reporter = Reporter()
+    output = tmp_path / "nightly.csv"
+    reporter.export_csv_incremental(str(output))
+    committed = output.read_text()
+
+    # A run killed mid-chunk leaves bytes past the saved watermark
+    with open(output, "a") as f:
+        f.write("device2,2025-03-2")
+    assert reporter.export_csv_incremental(str(output)) == 0
+    assert output.read_text() == committed
+
+
+def test_stats_counters_follow_write_path(test_db):
+    from fablab_visitor_logger.config import DeviceStatus
+
+    reporter = Reporter()
+    db = reporter.db
+    db.log_presence_batch(
+        [
+            ("device2", DeviceStatus.PRESENT, -50),
+            ("device4", DeviceStatus.PRESENT, -60),
+        ]
+    )
+    db.log_device_info("device4", {"vendor_name": "Apple", "device_type": "Phone"})
+    db.log_device_info("device4", {"vendor_name": "Apple", "device_type": "Watch"})
+    db.conn.execute("DELETE FROM presence_logs WHERE log_id = 1")
+    db.conn.commit()
+
+    stats = reporter.get_stats()
+    assert stats["total_devices"] == 4
+    assert stats["present_devices"] == 3
+    assert stats["vendor_breakdown"] == {"Apple": 1}
+    assert stats["type_breakdown"] == {"Watch": 1}
+    assert db.check_stats() == []
+
+
+def test_check_stats_detects_and_repairs_drift(test_db):
+    reporter = Reporter()
+    db = reporter.db
+    db.conn.execute(
+        "UPDATE stats_counters SET value = 7 WHERE scope = 'devices' AND key = 'total'"
+    )
+    db.conn.commit()
+
+    assert db.check_stats() == [("devices", "total", 3, 7)]
+    db.rebuild_stats()
+    assert db.check_stats() == []
+    assert reporter.get_stats()["total_devices"] == 3
+
+
+def test_occupancy_series_and_heatmap(test_db):
+    reporter = Reporter()
+    start = datetime(2025, 3, 20, 10, 0)  # A Thursday
+    samples = [
+        ("device1", start + timedelta(seconds=s), "present", -50)
+        for s in range(0, 1800, 30)
+    ] + [
+        ("device2", start + timedelta(seconds=s), "present", -50)
+        for s in range(900, 2700, 30)
+    ]
+    reporter.db.conn.executemany(
+        "INSERT INTO presence_logs (device_id, timestamp, status, rssi) "
+        "VALUES (?, ?, ?, ?)",
+        samples,
+    )
+    reporter.db.conn.commit()
+
+    series = reporter.occupancy_series(
+        start, start + timedelta(hours=1), timedelta(minutes=15)
+    )
+    assert list(series.mean) == [1.0, 2.0, 1.0, 0.0]
+    assert list(series.peak) == [1, 2, 1, 0]
+
+    heatmap = reporter.occupancy_heatmap(start, start + timedelta(hours=1))
+    assert heatmap[3, 10] == 1.0
+
+
+def test_daily_rollups_process_only_new_or_changed_days(test_db):
+    reporter = Reporter()
+    db = reporter.db
+    db.log_device_info("device1", {"vendor_name": "Apple", "device_type": "Phone"})
+    db.log_device_info("device2", {"vendor_name": "Apple", "device_type": "Watch"})
+    samples = [
+        ("device1", datetime(2025, 3, 20, 10, 0, s), "present", -50) for s in (0, 30)
+    ] + [
+        ("device2", datetime(2025, 3, 20, 11, 0), "present", -50),
+        ("device1", datetime(2025, 3, 21, 9, 0), "present", -50),
+    ]
+    insert = (
+        "INSERT INTO presence_logs (device_id, timestamp, status, rssi) "
+        "VALUES (?, ?, ?, ?)"
+    )
+    db.conn.executemany(insert, samples)
+    db.conn.commit()
+
+    today = date(2025, 3, 22)
+    assert db.rollup_daily_stats(today) == ["2025-03-20", "2025-03-21"]
+    assert db.rollup_daily_stats(today) == []
+
+    db.conn.execute(insert, ("device2", datetime(2025, 3, 21, 9, 0), "present", -50))
+    db.conn.commit()
+    assert db.rollup_daily_stats(today) == ["2025-03-21"]
+
+    stats = reporter.get_vendor_stats(date(2025, 3, 20), date(2025, 3, 21))
+    assert stats == [
+        {
+            "vendor_name": "Apple",
+            "device_days": 4,
+            "days": 2,
+            "avg_presence_minutes": 1.0,
+        }
+    ]
+    trends = reporter.get_device_type_trends()
+    assert [d["device_count"] for d in trends["Phone"]] == [1, 1]
+    assert trends["Watch"][0] == {
+        "date": "2025-03-20",
+        "device_count": 1,
+        "avg_presence_minutes": 1,
+    }
+
+
+def test_result_cache_invalidated_by_writes(test_db):
+    reporter = Reporter()
+    assert reporter.get_stats()["total_devices"] == 3
+    assert reporter.get_stats()["total_devices"] == 3
+    assert reporter.cache_info()["hits"] == 1
+
+    # A commit from another connection (the scanner) bumps data_version
+    other = sqlite3.connect(Config.DATABASE_PATH)
+    other.execute("INSERT INTO devices VALUES ('device4', 'anon4', '', '', 'present')")
+    other.commit()
+    other.close()
+    assert reporter.get_stats()["total_devices"] == 4
+
+    # So does a write on the reporter's own connection
+    reporter.db.conn.execute("DELETE FROM devices WHERE device_id = 'device4'")
+    reporter.db.conn.commit()
+    assert reporter.get_stats()["total_devices"] == 3
+    assert reporter.cache_info()["misses"] == 3
+
+
+def test_result_cache_expires_on_the_reporter_clock(test_db):
+    clock = ManualClock(datetime(2025, 3, 26, 12, 0).timestamp())
+    reporter = Reporter(clock=clock)
+    reporter.get_stats()
+    clock.set(datetime(2025, 3, 26, 12, 59).timestamp())
+    reporter.get_stats()
+    assert reporter.cache_info()["hits"] == 1
+
+    clock.set(datetime(2025, 3, 26, 13, 0).timestamp())
+    reporter.get_stats()
+    assert reporter.cache_info()["misses"] == 2
+
+
+def test_result_cache_evicts_least_recently_used(test_db):
+    reporter = Reporter(cache_size=2)
+    reporter.list_devices()
+    reporter.list_devices(active_only=True)
+    reporter.list_devices()  # Refresh, so active_only=True is now oldest
+    reporter.get_stats()
+
+    info = reporter.cache_info()
+    assert info["size"] == 2
+    reporter.list_devices()
+    assert reporter.cache_info()["hits"] == info["hits"] + 1
+    reporter.list_devices(active_only=True)
+    assert reporter.cache_info()["misses"] == info["misses"] + 1
+
+    # Callers get copies, so mutating a result doesn't poison the cache
+    reporter.list_devices().clear()
+    assert len(reporter.list_devices()) == 3
+
+
+def test_iter_devices_keyset_pages_and_filters(test_db):
+    reporter = Reporter()
+    first = list(reporter.iter_devices(limit=2))
+    assert [d["device_id"] for d in first] == ["device1", "device2"]
+    rest = list(reporter.iter_devices(after=first[-1]["device_id"], limit=2))
+    assert [d["device_id"] for d in rest] == ["device3"]
+
+    assert [d["device_id"] for d in reporter.iter_devices(status=["absent"])] == [
+        "device2"
+    ]
+    seen = reporter.iter_devices(seen_since=datetime(2025, 3, 26, 12))
+    assert [d["device_id"] for d in seen] == ["device1", "device3"]
+
+    reporter.db.log_device_info("device3", {"vendor_name": "Apple"})
+    assert [d["device_id"] for d in reporter.iter_devices(vendor="Apple")] == [
+        "device3"
+    ]
+
+
+def test_cli_list_devices_ndjson(test_db, capsys):
+    from fablab_visitor_logger import reporting
+
+    argv = ["reporting.py", "list-devices", "--format", "ndjson", "--limit", "2"]
+    with patch("sys.argv", argv):
+        reporting.main()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["device_id"] for line in lines] == [
+        "device1",
+        "device2",
+    ]
@@ -0,0 +1,121 @@
+"""Tests for downsampling presence logs into the minutely and hourly tiers."""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from fablab_visitor_logger.analytics import to_epoch
+from fablab_visitor_logger.config import Config, ConfigError, DeviceStatus
+from fablab_visitor_logger.pseudonym import Pseudonymizer
+from fablab_visitor_logger.reporting import Reporter
+
+TIERS = {"DATA_RETENTION_DAYS": 2, "MINUTELY_RETENTION_DAYS": 4}
+
+
+@pytest.fixture
+def reporter(tmp_path):
+    with patch.object(Config, "DATABASE_PATH", str(tmp_path / "tiers.db")):
+        reporter = Reporter(cache_size=0)
+        reporter.db._pseudonymizer = Pseudonymizer(b"k" * 32)
+        yield reporter
+
+
+def _visit(db, mac, start, minutes=30):
+    for seconds in range(0, minutes * 60, Config.SCAN_INTERVAL):
+        db.log_presence_batch(
+            [(mac, DeviceStatus.PRESENT, -60)], start + timedelta(seconds=seconds)
+        )
+
+
+def test_reports_read_compacted_tiers_transparently(reporter):
+    db = reporter.db
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    _visit(db, "AA:00:00:00:00:01", now - timedelta(days=5))  # Hourly tier
+    _visit(db, "AA:00:00:00:00:02", now - timedelta(days=3))  # Minutely tier
+    _visit(db, "AA:00:00:00:00:03", now - timedelta(hours=2))  # Stays raw
+    start = now - timedelta(days=6)
+    before = reporter.occupancy_series(start, now, timedelta(hours=1))
+
+    with patch.multiple(Config, **TIERS):
+        for _ in range(10):
+            db.compact_presence(hours=24, now=now)
+        db.cleanup_old_data()
+
+    count = db.conn.execute
+    assert count("SELECT COUNT(*) FROM presence_hourly").fetchone() == (1,)
+    assert count("SELECT COUNT(*) FROM presence_minutely").fetchone() == (30,)
+    assert count("SELECT COUNT(*) FROM presence_logs").fetchone() == (60,)
+    after = reporter.occupancy_series(start, now, timedelta(hours=1))
+    np.testing.assert_allclose(after.mean, before.mean)
+    assert list(after.peak) == list(before.peak)
+
+
+def test_cleanup_keeps_logs_not_yet_compacted(reporter):
+    db = reporter.db
+    old = datetime.now().replace(second=0, microsecond=0) - timedelta(
+        days=Config.DATA_RETENTION_DAYS + 1
+    )
+    _visit(db, "AA:00:00:00:00:01", old, minutes=1)
+    db.cleanup_old_data()
+    assert db.conn.execute("SELECT COUNT(*) FROM presence_logs").fetchone() == (2,)
+
+    db.compact_presence()
+    db.cleanup_old_data()
+    assert db.conn.execute("SELECT COUNT(*) FROM presence_logs").fetchone() == (0,)
+    rows = db.conn.execute(
+        "SELECT samples, last_seen - first_seen, rssi_max FROM presence_minutely"
+    ).fetchall()
+    assert rows == [(2, Config.SCAN_INTERVAL, -60)]
+
+
+def test_hourly_tier_expires(reporter):
+    db = reporter.db
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    _visit(db, "AA:00:00:00:00:01", now - timedelta(days=5))
+    with patch.multiple(Config, HOURLY_RETENTION_DAYS=6, **TIERS):
+        for _ in range(3):
+            db.compact_presence(hours=24, now=now)
+        assert db.compact_presence(now=now + timedelta(days=2))[2] == 1
+    assert db.conn.execute("SELECT COUNT(*) FROM presence_hourly").fetchone() == (0,)
+
+
+def test_tiers_must_be_ordered():
+    with pytest.raises(ConfigError) as excinfo:
+        Config.resolve(
+            environ={
+                "FABLAB_MINUTELY_RETENTION_DAYS": "30",
+                "FABLAB_HOURLY_RETENTION_DAYS": "10",
+            }
+        )
+    message = str(excinfo.value)
+    assert "MINUTELY_RETENTION_DAYS must not be below" in message
+    assert "HOURLY_RETENTION_DAYS must be 0 or" in message
+
+
+def test_cleanup_keeps_departed_devices_while_compaction_lags(reporter):
+    db = reporter.db
+    old = datetime.now().replace(second=0, microsecond=0) - timedelta(
+        days=Config.DATA_RETENTION_DAYS + 3
+    )
+    mac = "AA:00:00:00:00:01"
+    _visit(db, mac, old, minutes=1)
+    db.log_presence_batch([(mac, DeviceStatus.DEPARTED, None)], old)
+    db.log_device_info(mac, {"device_name": "Phone"})
+    db.conn.execute(
+        "UPDATE device_info SET last_detected = ?", (old + timedelta(minutes=1),)
+    )
+    # Compaction is three days behind the retention cutoff
+    db._set_watermark("minutely", to_epoch(old) - 3600)
+
+    db.cleanup_old_data()  # Must not trip the presence_logs foreign key
+    count = db.conn.execute
+    assert count("SELECT COUNT(*) FROM devices").fetchone() == (1,)
+    assert count("SELECT COUNT(*) FROM device_info").fetchone() == (1,)
+
+    for _ in range(30):
+        db.compact_presence(hours=24)
+    db.cleanup_old_data()
+    assert count("SELECT COUNT(*) FROM devices").fetchone() == (0,)
+    assert count("SELECT COUNT(*) FROM presence_logs").fetchone() == (0,)
@@ -1,13 +1,17 @@
-"""Tests for the BLEScanner class."""
+"""Tests for the BLEScanner and PresenceTracker classes."""
 
-from unittest.mock import AsyncMock, patch
+import logging
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
+from bleak.exc import BleakError
 
-from fablab_visitor_logger.config import Config
-from fablab_visitor_logger.scanner import BLEScanner
+from fablab_visitor_logger.clock import SYSTEM_CLOCK
+from fablab_visitor_logger.config import Config, DeviceStatus
+from fablab_visitor_logger.pseudonym import Pseudonymizer
+from fablab_visitor_logger.scanner import BLEScanner, PresenceTracker
 
 # --- Test Data Fixtures ---
 
@@ -266,3 +270,171 @@ class TestBLEScanner:
 
         assert len(devices) == 0
         mock_bleak_scanner.discover.assert_called_once()
+
+
+def _device_data(mac, rssi=-50, vendor="Mock Vendor"):
+    """Build a minimal DeviceData dict as returned by BLEScanner.scan."""
+    return {
+        "mac_address": mac,
+        "rssi": rssi,
+        "timestamp": "2025-03-27T12:00:00",
+        "device_name": None,
+        "vendor": vendor,
+        "service_uuids": [],
+        "manufacturer_data": {},
+        "tx_power": None,
+        "service_data": {},
+    }
+
+
+class TestPresenceTracker:
+    @pytest.fixture
+    def tracker(self):
+        scanner = MagicMock()
+        scanner.scan = AsyncMock(return_value=[])
+        scanner.heard = 0
+        db = MagicMock()
+        pseudonymizer = Pseudonymizer(b"k" * 32)
+        db.log_presence_batch.side_effect = lambda entries, timestamp: {
+            mac: pseudonymizer.compute(mac) for mac, _status, _rssi in entries
+        }
+        db.pseudonymizer = pseudonymizer
+        return PresenceTracker(scanner, db)
+
+    @pytest.mark.asyncio
+    async def test_new_devices_summarised_per_cycle(self, tracker, caplog):
+        """Many new devices produce one capped INFO summary line."""
+        macs = [f"AA:BB:CC:DD:EE:{i:02X}" for i in range(8)]
+        tracker.scanner.scan.return_value = [_device_data(m) for m in macs]
+
+        with caplog.at_level(logging.INFO, logger="fablab_visitor_logger.scanner"):
+            assert await tracker.update_presence() == 8
+
+        info_lines = [
+            r.getMessage() for r in caplog.records if r.levelno == logging.INFO
+        ]
+        assert len(info_lines) == 1
+        assert info_lines[0].startswith("8 new device(s) detected: ")
+        assert info_lines[0].endswith(f"(+{8 - Config.LOG_DEVICE_DETAIL_LIMIT} more)")
+        # Listed by pseudonym, never by MAC address
+        assert tracker.db.pseudonymizer.compute(macs[0]) in info_lines[0]
+        assert not any(mac in info_lines[0] for mac in macs)
+
+    @staticmethod
+    def _written(tracker):
+        """Flatten (mac, status) pairs from all log_presence_batch calls."""
+        return [
+            (mac, status)
+            for call in tracker.db.log_presence_batch.call_args_list
+            for mac, status, _rssi in call[0][0]
+        ]
+
+    @pytest.mark.asyncio
+    async def test_absent_and_departed_transitions(self, tracker, caplog):
+        """Unseen devices become ABSENT then DEPARTED and leave the state."""
+        mac, other = "AA:BB:CC:DD:EE:FF", "11:22:33:44:55:66"
+        tracker.scanner.scan.return_value = [_device_data(mac), _device_data(other)]
+        await tracker.update_presence()
+
+        tracker.scanner.scan.return_value = [_device_data(other)]
+        with caplog.at_level(logging.INFO, logger="fablab_visitor_logger.scanner"):
+            for _ in range(Config.DEPARTURE_THRESHOLD):
+                await tracker.update_presence()
+
+        statuses = [status for m, status in self._written(tracker) if m == mac]
+        assert statuses[0] == DeviceStatus.PRESENT
+        assert DeviceStatus.ABSENT in statuses
+        assert statuses[-1] == DeviceStatus.DEPARTED
+        assert mac not in tracker.device_states
+        assert other in tracker.device_states
+        messages = [r.getMessage() for r in caplog.records]
+        pseudonym = tracker.db.pseudonymizer.compute(mac)
+        assert f"1 device(s) marked as DEPARTED: {pseudonym}" in messages
+        # One batched write per cycle
+        assert (
+            tracker.db.log_presence_batch.call_count == 1 + Config.DEPARTURE_THRESHOLD
+        )
+        tracker.db.log_presence.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_failed_and_empty_scans_freeze_missed_pings(self, tracker):
+        """Scan failures and sudden empty scans do not age tracked devices."""
+        macs = [f"AA:BB:CC:DD:EE:{i:02X}" for i in range(20)]
+        tracker.scanner.scan.return_value = [_device_data(m) for m in macs]
+        await tracker.update_presence()
+        tracker.db.log_presence_batch.reset_mock()
+
+        tracker.scanner.scan.side_effect = BleakError("adapter reset")
+        assert await tracker.update_presence() == 0
+        tracker.scanner.scan.side_effect = None
+        tracker.scanner.scan.return_value = []
+        for _ in range(Config.DEPARTURE_THRESHOLD):
+            assert await tracker.update_presence() == 0
+
+        assert tracker.degraded
+        assert all(s["missed_pings"] == 0 for s in tracker.device_states.values())
+        tracker.db.log_presence_batch.assert_not_called()
+
+        # Recovery with a partial scan: the frozen cycles are not counted as
+        # misses, so nobody departs
+        tracker.scanner.scan.return_value = [_device_data(macs[0])]
+        assert await tracker.update_presence() == 1
+        assert not tracker.degraded
+        written = self._written(tracker)
+        assert (macs[0], DeviceStatus.PRESENT) in written
+        assert all(status != DeviceStatus.DEPARTED for _, status in written)
+        assert len(tracker.device_states) == len(macs)
+        assert all(tracker.device_states[m]["missed_pings"] == 1 for m in macs[1:])
+
+    @pytest.mark.asyncio
+    async def test_scan_heard_but_filtered_is_not_a_failure(self, tracker):
+        """Advertisements all below the RSSI threshold count as misses."""
+        tracker.scanner.scan.return_value = [_device_data("AA:BB:CC:DD:EE:FF")]
+        await tracker.update_presence()
+
+        tracker.scanner.scan.return_value = []
+        tracker.scanner.heard = 3
+        await tracker.update_presence()
+
+        assert not tracker.degraded
+        assert tracker.device_states["AA:BB:CC:DD:EE:FF"]["missed_pings"] == 1
+
+    @pytest.mark.asyncio
+    async def test_persistent_empty_scans_eventually_accepted(self, tracker):
+        """After MAX_DEGRADED_CYCLES empty scans, the room is considered empty."""
+        tracker.scanner.scan.return_value = [_device_data("AA:BB:CC:DD:EE:FF")]
+        await tracker.update_presence()
+
+        tracker.scanner.scan.return_value = []
+        for _ in range(Config.MAX_DEGRADED_CYCLES):
+            await tracker.update_presence()
+        assert tracker.degraded
+        # Then every empty scan counts as one miss
+        for _ in range(Config.DEPARTURE_THRESHOLD):
+            await tracker.update_presence()
+
+        assert not tracker.degraded
+        assert tracker.device_states == {}
+        assert self._written(tracker)[-1] == (
+            "AA:BB:CC:DD:EE:FF",
+            DeviceStatus.DEPARTED,
+        )
+
+    @pytest.mark.asyncio
+    @patch.object(SYSTEM_CLOCK, "sleep", new_callable=AsyncMock)
+    @patch("fablab_visitor_logger.scanner.BleakScannerClient", new_callable=AsyncMock)
+    async def test_scanner_retries_bleak_errors_with_backoff(
+        self, mock_bleak, mock_sleep
+    ):
+        """BleakErrors are retried with exponential backoff before giving up."""
+        mock_bleak.discover.side_effect = [BleakError("busy"), BleakError("busy"), {}]
+        assert await BLEScanner().scan(duration=0.1) == []
+        assert mock_bleak.discover.call_count == 3
+        delays = [c[0][0] for c in mock_sleep.await_args_list]
+        assert delays == [Config.SCAN_RETRY_BACKOFF, Config.SCAN_RETRY_BACKOFF * 2]
+
+        mock_bleak.discover.reset_mock()
+        mock_bleak.discover.side_effect = BleakError("down")
+        with pytest.raises(BleakError):
+            await BLEScanner().scan(duration=0.1)
+        assert mock_bleak.discover.call_count == Config.SCAN_RETRIES + 1
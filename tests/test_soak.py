@@ -0,0 +1,79 @@
+"""Tests for the simulated clock and the accelerated soak harness."""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from fablab_visitor_logger.clock import Clock, SimulatedClock
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.soak import (
+    FablabDayScanner,
+    Sample,
+    check_trends,
+    run_soak,
+)
+
+TUESDAY = datetime(2025, 1, 7)
+
+
+async def _macs_over(scanner, clock, hours, step_minutes=5):
+    """MACs seen per scan while advancing the clock through ``hours``."""
+    scans = []
+    for _ in range(int(hours * 60 / step_minutes)):
+        clock.advance(step_minutes * 60)
+        scans.append({d["mac_address"] for d in await scanner.scan()})
+    return scans
+
+
+def test_simulated_clock_runs_faster_and_advances():
+    clock = SimulatedClock(TUESDAY, speed=1_000_000)
+    clock.advance(3600)
+    assert clock.now() >= TUESDAY + timedelta(hours=1)
+    assert clock.time() == pytest.approx(clock.now().timestamp(), abs=60)
+    with pytest.raises(ValueError):
+        SimulatedClock(TUESDAY, speed=0)
+    with pytest.raises(TypeError):
+        Clock()  # type: ignore[abstract]
+
+
+@pytest.mark.asyncio
+async def test_traffic_model_follows_opening_hours_and_workshops():
+    clock = SimulatedClock(TUESDAY, speed=1e-9)  # Effectively stopped
+    scanner = FablabDayScanner(clock, seed=1)
+    night = await _macs_over(scanner, clock, hours=9)  # Until 09:00
+    day = await _macs_over(scanner, clock, hours=8)  # Until 17:00
+    workshop = await _macs_over(scanner, clock, hours=3)  # Tuesday workshop
+
+    assert max(len(scan) for scan in night) <= 4  # Only the fixed devices
+    assert max(map(len, workshop)) > max(map(len, day)) > 4
+    # Visitors' random addresses rotate, so far more MACs appear than devices
+    assert len(set().union(*workshop)) > 2 * max(map(len, workshop))
+
+
+def test_check_trends_flags_growing_memory_and_latency():
+    def samples(heap, latency):
+        return [Sample(TUESDAY, h, 10, 1000, s, 100) for h, s in zip(heap, latency)]
+
+    flat = samples([1000, 1010, 990, 1000], [0.01, 0.012, 0.011, 0.01])
+    assert check_trends(flat) == []
+    leaking = samples([1000, 1100, 1200, 1300], [0.01, 0.01, 0.03, 0.03])
+    failures = check_trends(leaking)
+    assert len(failures) == 2
+    assert "Heap" in failures[0] and "latency" in failures[1]
+
+
+@pytest.mark.asyncio
+async def test_short_soak_records_samples(tmp_path):
+    with patch.multiple(
+        Config,
+        DATABASE_PATH=str(tmp_path / "soak.db"),
+        PSEUDONYM_KEY_FILE=str(tmp_path / "soak.key"),
+    ):
+        report = await run_soak(
+            0.25, speed=20000, start=TUESDAY + timedelta(hours=10), warmup_days=0
+        )
+    assert len(report.samples) >= 4
+    assert report.samples[-1].db_bytes > 0
+    assert sum(s.cycles for s in report.samples) > 0
+    assert max(s.device_states for s in report.samples) > 4
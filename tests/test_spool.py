@@ -0,0 +1,104 @@
+"""Tests for the on-disk write spool."""
+
+import os
+import sqlite3
+import zlib
+from unittest.mock import patch
+
+import pytest
+
+from fablab_visitor_logger import metrics
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.pseudonym import Pseudonymizer
+from fablab_visitor_logger.scanner import PresenceTracker
+from fablab_visitor_logger.spool import Spool
+
+
+def test_records_are_read_in_order_across_segments_and_restarts(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=10_000, segment_bytes=40)
+    for i in range(10):
+        spool.append(b"record-%d" % i)
+    assert len(os.listdir(tmp_path)) > 2  # Several segments
+    assert spool.peek(3) == [b"record-0", b"record-1", b"record-2"]
+    spool.consume(4)
+
+    reopened = Spool(str(tmp_path), max_bytes=10_000, segment_bytes=40)
+    assert len(reopened) == 6
+    assert reopened.bytes == spool.bytes
+    assert reopened.peek(100) == [b"record-%d" % i for i in range(4, 10)]
+    reopened.consume(6)
+    assert len(reopened) == 0 and reopened.bytes == 0
+    assert os.listdir(tmp_path) == ["head"]
+    reopened.append(b"again")
+    assert reopened.peek(5) == [b"again"]
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=10_000)
+    spool.append(b"complete")
+    (segment,) = [name for name in os.listdir(tmp_path) if name.endswith(".spool")]
+    with open(tmp_path / segment, "ab") as f:
+        f.write(b"\x10\x00\x00\x00torn")
+
+    reopened = Spool(str(tmp_path), max_bytes=10_000)
+    assert reopened.peek(5) == [b"complete"]
+    reopened.append(b"next")
+    assert reopened.peek(5) == [b"complete", b"next"]
+
+
+def test_size_cap_drops_oldest_segments(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=100, segment_bytes=30)
+    for i in range(20):
+        spool.append(b"record-%02d" % i)
+    assert spool.bytes <= 100
+    assert spool.dropped == 20 - len(spool)
+    assert spool.peek(100)[-1] == b"record-19"
+
+
+class FakeScanner:
+    async def scan(self):
+        return [{"mac_address": "AA:BB:CC:DD:EE:FF", "rssi": -50, "vendor": "X"}]
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_are_spooled_and_replayed_in_order(tmp_path):
+    with patch.object(Config, "DATABASE_PATH", str(tmp_path / "spool.db")):
+        db = Database(pseudonymizer=Pseudonymizer(b"k" * 32))
+        spool = Spool(str(tmp_path / "spool"), max_bytes=1_000_000)
+        tracker = PresenceTracker(FakeScanner(), db, spool=spool)
+
+        locked = sqlite3.OperationalError("database is locked")
+        with patch.object(db, "log_presence_batch", side_effect=locked):
+            for _ in range(2):
+                await tracker.update_presence()
+        # The presence batch failed; the device info write queued behind it
+        assert len(spool) == 4
+
+        await tracker.update_presence()
+    assert len(spool) == 0
+    rows = db.conn.execute(
+        "SELECT timestamp FROM presence_logs ORDER BY log_id"
+    ).fetchall()
+    assert len(rows) == 3
+    assert rows == sorted(rows)  # Replayed before the live cycle
+    assert db.conn.execute("SELECT COUNT(*) FROM device_info").fetchone() == (1,)
+
+
+@pytest.mark.asyncio
+async def test_undecodable_spooled_write_is_skipped(tmp_path):
+    with patch.object(Config, "DATABASE_PATH", str(tmp_path / "spool.db")):
+        db = Database(pseudonymizer=Pseudonymizer(b"k" * 32))
+        spool = Spool(str(tmp_path / "spool"), max_bytes=1_000_000)
+        tracker = PresenceTracker(FakeScanner(), db, spool=spool)
+        locked = sqlite3.OperationalError("database is locked")
+        with patch.object(db, "log_presence_batch", side_effect=locked):
+            await tracker.update_presence()
+        spool.append(b"not zlib")  # Corrupt, but with a valid record CRC
+        spool.append(zlib.compress(b'{"method": "drop_table"}'))
+        corrupt = metrics.SPOOL_CORRUPT_TOTAL.value()
+
+        await tracker.update_presence()
+    assert len(spool) == 0
+    assert metrics.SPOOL_CORRUPT_TOTAL.value() == corrupt + 2
+    assert db.conn.execute("SELECT COUNT(*) FROM presence_logs").fetchone() == (2,)
@@ -0,0 +1,105 @@
+"""Tests for RSSI-based zone assignment."""
+
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from fablab_visitor_logger.config import Config
+from fablab_visitor_logger.database import Database
+from fablab_visitor_logger.pseudonym import Pseudonymizer
+from fablab_visitor_logger.reporting import Reporter
+from fablab_visitor_logger.scanner import PresenceTracker
+from fablab_visitor_logger.zones import ZoneLocator
+
+MAC = "AA:BB:CC:DD:EE:FF"
+
+
+def test_hysteresis_keeps_device_until_clearly_closer():
+    locator = ZoneLocator(smoothing=0.5, hysteresis=4.0)
+    assert locator.update({MAC: {"lab": -60, "office": -70}}) == [(MAC, "lab")]
+    # Slightly stronger in the office: not enough to move
+    for _ in range(5):
+        assert locator.update({MAC: {"lab": -62, "office": -60}}) == []
+    assert locator.zone_of(MAC) == "lab"
+
+    changes = []
+    for _ in range(5):
+        changes += locator.update({MAC: {"lab": -80, "office": -55}})
+    assert changes == [(MAC, "office")]
+
+
+def test_offsets_and_shared_zones():
+    locator = ZoneLocator(
+        sensor_zones={"door": "workshop", "bench": "workshop"},
+        offsets={"desk": -10},
+    )
+    changes = locator.update(
+        {
+            "11:11:11:11:11:11": {"door": -70, "desk": -65},  # desk reads hot
+            "22:22:22:22:22:22": {"bench": -50},
+        }
+    )
+    assert changes == [
+        ("11:11:11:11:11:11", "workshop"),
+        ("22:22:22:22:22:22", "workshop"),
+    ]
+    assert locator.forget(["22:22:22:22:22:22", "33:33:33:33:33:33"]) == [
+        ("22:22:22:22:22:22", None)
+    ]
+    assert len(locator) == 1
+
+
+def test_thousands_of_devices_per_cycle():
+    locator = ZoneLocator()
+    sensors = [f"sensor-{i}" for i in range(4)]
+    readings = {
+        f"02:00:00:00:{i // 256:02X}:{i % 256:02X}": {
+            sensor: -40 - (i + j) % 50 for j, sensor in enumerate(sensors)
+        }
+        for i in range(5000)
+    }
+    assert len(locator.update(readings)) == 5000
+    start = time.perf_counter()
+    locator.update(readings)
+    assert time.perf_counter() - start < 0.25
+
+
+class FakeAggregator:
+    def __init__(self, windows):
+        self.windows = list(windows)
+
+    async def scan(self):
+        return self.windows.pop(0)
+
+
+def window(**sensor_rssi):
+    return [
+        {
+            "mac_address": MAC,
+            "rssi": max(sensor_rssi.values()),
+            "vendor": "Unknown",
+            "sensor_rssi": sensor_rssi,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_zone_changes_are_logged_and_reported(tmp_path):
+    windows = [window(lab=-50, office=-80), window(lab=-90, office=-40)]
+    with patch.object(Config, "DATABASE_PATH", str(tmp_path / "zones.db")):
+        db = Database(pseudonymizer=Pseudonymizer(b"k" * 32))
+        tracker = PresenceTracker(
+            FakeAggregator(windows), db, zones=ZoneLocator(smoothing=1.0)
+        )
+        await tracker.update_presence()
+        moved_at = datetime.now() + timedelta(seconds=1)
+        with patch.object(tracker.clock, "now", return_value=moved_at):
+            await tracker.update_presence()
+
+        reporter = Reporter()
+        assert reporter.zone_occupancy(moved_at - timedelta(microseconds=1)) == {
+            "lab": 1
+        }
+        assert reporter.zone_occupancy(moved_at) == {"office": 1}